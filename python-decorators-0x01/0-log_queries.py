@@ -1,22 +1,39 @@
 import sqlite3
 import functools
 import os
-from datetime import datetime
+from query_logger import AsyncQueryLogger
+from query_profiler import QueryProfiler, profile_queries
 
 LOG_FILE_NAME = "query_log.txt"
+
+# One logger for the whole process. Its path is resolved once here instead
+# of on every query, and a background thread does the file writes in batches.
+query_logger = AsyncQueryLogger(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), LOG_FILE_NAME),
+    policy=os.getenv('QUERY_LOG_POLICY', 'drop')
+)
+
+# Timing statistics of every @profile_queries(profiler) call (see
+# query_profiler.py). Calls slower than SLOW_QUERY_SECONDS are written to the
+# query log with their parameters.
+profiler = QueryProfiler(
+    slow_threshold=float(os.getenv('SLOW_QUERY_SECONDS', '0.1')),
+    slow_log=query_logger.log
+)
+
 #### decorator to log SQL queries
 def log_queries(func):
     """
     A decorator that logs the SQL query executed by the decorated function
     to a text file named 'query_log.txt' in the same directory.
     Assumes the decorated function takes 'query' as one of its arguments.
+
+    Logging only queues the query in memory (see query_logger.py); the file
+    is written in batches by a background thread, so the query itself is
+    not slowed down by file I/O. Call query_logger.flush() to wait for it.
     """
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        # Determine the path to the log file
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        log_file_path = os.path.join(script_dir, LOG_FILE_NAME)
-
         # Extract the query from arguments
         query = kwargs.get('query')
         if not query and args:
@@ -24,22 +41,17 @@ def log_queries(func):
             # This might need adjustment if 'query' is not always the first arg
             query = args[0]
 
-        # Log the query to the file
+        # Queue the query for the log file
         if query:
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            log_message = f"[{timestamp}] Executing SQL Query: {query}\n"
-            try:
-                with open(log_file_path, 'a') as f:
-                    f.write(log_message)
-                print(f"Logged query to {LOG_FILE_NAME}: {query}") # Also print to console for immediate feedback
-            except IOError as e:
-                print(f"Error writing to log file {LOG_FILE_NAME}: {e}")
+            query_logger.log(f"Executing SQL Query: {query}")
         else:
             print("No SQL query found in function arguments to log.")
 
         return func(*args, **kwargs)
     return wrapper
+
 @log_queries
+@profile_queries(profiler)
 def fetch_all_users(query):
     conn = sqlite3.connect('users.db')
     cursor = conn.cursor()
@@ -1,25 +1,21 @@
 import sqlite3 
 import functools
+import db_pool
 
 def with_db_connection(func):
    
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        conn = None  # Initialize conn to None
         try:
-            # Establish a connection to the SQLite database
-            conn = sqlite3.connect('users.db')
-            
-            result = func(conn, *args, **kwargs)
+            # Borrow an open connection from the shared pool instead of
+            # connecting to the SQLite database on every call; it goes back
+            # to the pool (not closed) even if an error occurred
+            with db_pool.connection() as conn:
+                result = func(conn, *args, **kwargs)
             return result
         except sqlite3.Error as e:
             print(f"Database error occurred: {e}")
             return None # Or re-raise the exception, depending on desired error handling
-        finally:
-            # Ensure the connection is closed, even if an error occurred
-            if conn:
-                conn.close()
-                # print("Database connection closed.") # Uncomment for debugging
     return wrapper
 
 @with_db_connection 
@@ -1,26 +1,27 @@
 import sqlite3
 import functools
+import db_pool
+from query_cache import shared_cache
+
+# Authorizer actions that modify a table; for each, the table is arg1.
+_WRITE_ACTIONS = frozenset((sqlite3.SQLITE_INSERT, sqlite3.SQLITE_UPDATE,
+                            sqlite3.SQLITE_DELETE))
 
 
 def with_db_connection(func):
    
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        conn = None  # Initialize conn to None
         try:
-            # Establish a connection to the SQLite database
-            conn = sqlite3.connect('users.db')
-            
-            result = func(conn, *args, **kwargs)
+            # Borrow an open connection from the shared pool instead of
+            # connecting to the SQLite database on every call; it goes back
+            # to the pool (not closed) even if an error occurred
+            with db_pool.connection() as conn:
+                result = func(conn, *args, **kwargs)
             return result
         except sqlite3.Error as e:
             print(f"Database error occurred: {e}")
             return None # Or re-raise the exception, depending on desired error handling
-        finally:
-            # Ensure the connection is closed, even if an error occurred
-            if conn:
-                conn.close()
-                # print("Database connection closed.") # Uncomment for debugging
     return wrapper
 
 def transactional(func):
@@ -36,7 +37,17 @@ def transactional(func):
 
         connection = args[0] # Assuming connection is the first argument
 
+        # Record every table the transaction writes to, so the cached
+        # results that read them can be dropped once it commits
+        written_tables = set()
+
+        def authorizer(action, arg1, arg2, db_name, trigger):
+            if action in _WRITE_ACTIONS and arg1:
+                written_tables.add(arg1)
+            return sqlite3.SQLITE_OK
+
         result = None
+        connection.set_authorizer(authorizer)
         try:
             # print(f"\n--- Starting transaction for '{func.__name__}' ---") # Optional: for debugging
             result = func(*args, **kwargs)
@@ -46,6 +57,10 @@ def transactional(func):
             connection.rollback()
             # print(f"--- Transaction for '{func.__name__}' rolled back due to error: {e} ---") # Optional: for debugging
             raise  # Re-raise the exception after rollback
+        finally:
+            connection.set_authorizer(None)
+        if written_tables:
+            shared_cache.invalidate_tables(written_tables)
         return result
     return wrapper
 
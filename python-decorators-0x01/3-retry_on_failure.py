@@ -1,51 +1,175 @@
 import time
 import sqlite3 
 import functools
+import logging
+import random
+import threading
+from circuit_breaker import guarded_db_connection
 
-def with_db_connection(func):
-   
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        conn = None  # Initialize conn to None
-        try:
-            # Establish a connection to the SQLite database
-            conn = sqlite3.connect('users.db')
-            
-            result = func(conn, *args, **kwargs)
-            return result
-        except sqlite3.Error as e:
-            print(f"Database error occurred: {e}")
-            return None # Or re-raise the exception, depending on desired error handling
-        finally:
-            # Ensure the connection is closed, even if an error occurred
-            if conn:
-                conn.close()
-                # print("Database connection closed.") # Uncomment for debugging
-    return wrapper
-
-def retry_on_failure(retries=3, delay=2):
+# Messages of sqlite3.OperationalError that mean "try again later": another
+# connection holds a lock. Other errors (syntax, missing table, ...) fail
+# the same way every time, so retrying them only adds load.
+TRANSIENT_MESSAGES = ("database is locked", "database table is locked",
+                      "database is busy", "database schema has changed")
 
+
+def is_transient(error):
+    """Returns True for errors worth retrying, such as a locked database."""
+    if isinstance(error, sqlite3.OperationalError):
+        message = str(error).lower()
+        return any(text in message for text in TRANSIENT_MESSAGES)
+    return False
+
+
+class RetryBudget:
+    """
+    A token bucket that caps retries at a fraction of all calls.
+
+    Every call deposits `ratio` tokens and every retry withdraws one, so
+    over time retries stay below ratio * calls. The bucket starts full and
+    holds at most `capacity` tokens, which allows short bursts of retries
+    when traffic is low. During an outage the bucket drains and calls fail
+    after their first attempt instead of multiplying the load.
+
+    Args:
+        ratio (float): Retries allowed per call, e.g. 0.1 for 10%.
+        capacity (float): The most tokens the bucket holds.
+    """
+
+    def __init__(self, ratio=0.1, capacity=10.0):
+        self.ratio = ratio
+        self.capacity = capacity
+        self._tokens = capacity
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        """Records one call."""
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + self.ratio)
+
+    def withdraw(self):
+        """Takes a token for one retry; returns False if none are left."""
+        with self._lock:
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+    @property
+    def tokens(self):
+        """The tokens currently available."""
+        with self._lock:
+            return self._tokens
+
+
+class RetryMetrics:
+    """Thread-safe counters for retry_on_failure."""
+
+    FIELDS = ("calls", "attempts", "retries", "recovered", "exhausted",
+              "budget_exhausted", "not_retryable")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(self.FIELDS, 0)
+
+    def add(self, field, amount=1):
+        """Increments one counter."""
+        with self._lock:
+            self._counts[field] += amount
+
+    def snapshot(self):
+        """
+        Returns the counters: calls, attempts, retries, recovered (calls
+        that succeeded after a retry), exhausted (gave up after the last
+        retry), budget_exhausted (gave up because the retry budget was
+        empty) and not_retryable (failed with a non-transient error).
+        """
+        with self._lock:
+            return dict(self._counts)
+
+
+# Shared by every function decorated with retry_on_failure in this process.
+retry_budget = RetryBudget()
+retry_metrics = RetryMetrics()
+logger = logging.getLogger("retry_on_failure")
+
+
+def backoff_delay(attempt, delay, max_delay):
+    """
+    Returns the sleep before retry number `attempt` (0-based): a random
+    duration between 0 and min(max_delay, delay * 2**attempt). The
+    randomness ("full jitter") spreads clients out so they do not all
+    retry at the same moment.
+    """
+    return random.uniform(0, min(max_delay, delay * 2 ** attempt))
+
+
+def retry_on_failure(retries=3, delay=2, max_delay=30, retry_if=is_transient,
+                     budget=None, metrics=None):
+    """
+    A decorator that retries transient failures with exponential backoff.
+
+    Args:
+        retries (int): The most retries after the first attempt.
+        delay (float): The base delay in seconds; the cap on the sleep
+            doubles with every retry.
+        max_delay (float): The largest sleep between two attempts.
+        retry_if (callable): Decides whether an exception is worth
+            retrying. Defaults to is_transient (a locked/busy database).
+        budget (RetryBudget): Limits retries across calls. Defaults to the
+            process-wide retry_budget.
+        metrics (RetryMetrics): Where to count attempts. Defaults to the
+            process-wide retry_metrics.
+    """
     def decorator(func):
         @functools.wraps(func)
-        def wrapper(*args, **kwargs): #
-            attempts_left = retries
-            while attempts_left >= 0:
+        def wrapper(*args, **kwargs):
+            retry_budget_ = budget or retry_budget
+            retry_metrics_ = metrics or retry_metrics
+            retry_budget_.deposit()
+            retry_metrics_.add("calls")
+            attempt = 0
+            while True:
+                retry_metrics_.add("attempts")
                 try:
-                    print(f"Attempting '{func.__name__}' (Attempts left: {attempts_left + 1})")
-                    return func(*args, **kwargs)
+                    result = func(*args, **kwargs)
                 except Exception as e:
-                    print(f"Error in '{func.__name__}': {e}")
-                    if attempts_left > 0:
-                        print(f"Retrying in {delay} seconds...")
-                        time.sleep(delay)
-                        attempts_left -= 1
-                    else:
-                        print(f"All {retries + 1} attempts failed for '{func.__name__}'. Re-raising last error.")
+                    if not retry_if(e):
+                        retry_metrics_.add("not_retryable")
+                        raise
+                    if attempt >= retries:
+                        retry_metrics_.add("exhausted")
+                        logger.warning("All %d attempts failed for '%s': %s",
+                                       retries + 1, func.__name__, e)
                         raise # Re-raise the last exception if no retries left
+                    if not retry_budget_.withdraw():
+                        retry_metrics_.add("budget_exhausted")
+                        logger.warning("Retry budget exhausted; not retrying "
+                                       "'%s': %s", func.__name__, e)
+                        raise
+                    sleep = backoff_delay(attempt, delay, max_delay)
+                    logger.info("Error in '%s': %s. Retry %d/%d in %.2fs",
+                                func.__name__, e, attempt + 1, retries, sleep)
+                    retry_metrics_.add("retries")
+                    # Start the next attempt from a clean transaction rather
+                    # than on top of a half-applied one
+                    conn = args[0] if args else None
+                    if isinstance(conn, sqlite3.Connection) and conn.in_transaction:
+                        conn.rollback()
+                    time.sleep(sleep)
+                    attempt += 1
+                else:
+                    if attempt:
+                        retry_metrics_.add("recovered")
+                    return result
         return wrapper
     return decorator
 
-@with_db_connection
+# guarded_db_connection is with_db_connection behind a circuit breaker: the
+# breaker also sees failures to get a connection, and while the database
+# keeps failing it answers with the fallback at once, without borrowing a
+# connection or retrying
+@guarded_db_connection(fallback=lambda: [])
 @retry_on_failure(retries=3, delay=1)
 def fetch_users_with_retry(conn):
     cursor = conn.cursor()
@@ -1,29 +1,28 @@
 import time
 import sqlite3 
 import functools
+import db_pool
+from query_cache import shared_cache
 
 
-query_cache = {}
+# Bounded LRU/TTL cache of query results, shared with transactional so that
+# writes invalidate the tables they touch (see query_cache.py).
+query_cache = shared_cache
 
 def with_db_connection(func):
    
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        conn = None  # Initialize conn to None
         try:
-            # Establish a connection to the SQLite database
-            conn = sqlite3.connect('users.db')
-            
-            result = func(conn, *args, **kwargs)
+            # Borrow an open connection from the shared pool instead of
+            # connecting to the SQLite database on every call; it goes back
+            # to the pool (not closed) even if an error occurred
+            with db_pool.connection() as conn:
+                result = func(conn, *args, **kwargs)
             return result
         except sqlite3.Error as e:
             print(f"Database error occurred: {e}")
             return None # Or re-raise the exception, depending on desired error handling
-        finally:
-            # Ensure the connection is closed, even if an error occurred
-            if conn:
-                conn.close()
-                # print("Database connection closed.") # Uncomment for debugging
     return wrapper
 
 def cache_query(func):
@@ -43,18 +42,29 @@ def cache_query(func):
             print("Warning: No 'query' argument found for caching. Executing directly.")
             return func(*args, **kwargs)
 
-        # Check if the query result is already in the cache
-        if query in query_cache:
-            print(f"Cache hit for query: '{query}'")
-            return query_cache[query]
-        else:
-            print(f"Cache miss for query: '{query}'. Executing query...")
-            # If not in cache, execute the original function
-            result = func(*args, **kwargs)
-            # Store the result in the cache
-            query_cache[query] = result
-            print(f"Query result cached for: '{query}'")
-            return result
+        # Parameters are part of the key: the same SQL with different
+        # parameters is a different result.
+        params = kwargs.get('params')
+        if params is None and len(args) > 2:
+            params = args[2]
+
+        def compute():
+            # Record the tables SQLite actually reads (joins, views, ...),
+            # so writes to any of them invalidate this result
+            with query_cache.record_reads(args[0]):
+                return func(*args, **kwargs)
+
+        def refresh():
+            # A background refresh runs after this call has returned the
+            # caller's connection to the pool, so it borrows its own
+            with db_pool.connection() as conn:
+                with query_cache.record_reads(conn):
+                    return func(conn, *args[1:], **kwargs)
+
+        # Return the cached result, or execute the original function and
+        # cache its result; concurrent misses on one query run it only once
+        return query_cache.get_or_compute(query, params, compute,
+                                          refresh=refresh)
     return wrapper
 
 @with_db_connection
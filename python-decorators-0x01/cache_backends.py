@@ -0,0 +1,563 @@
+#!/usr/bin/python3
+"""
+Storage backends for query_cache.QueryCache.
+
+- MemoryBackend: an LRU dict in this process. Values are stored as Python
+  objects, so nothing is serialized; every process has its own copy.
+- MmapBackend: a fixed-size hash table in a memory-mapped file, shared by
+  every process that opens the same path. Each key maps to one slot
+  (direct-mapped, like a CPU cache): a new entry replaces whatever was in
+  its slot, and values larger than a slot are not cached.
+- SQLiteBackend: a local SQLite file (WAL mode) shared by every process
+  that opens it, with approximate LRU eviction within an entry count and
+  byte budget. Hits are plain reads; their recency is batched in memory and
+  written now and then, so readers never queue for SQLite's write lock.
+
+The shared backends store bytes (the cache serializes values for them) and
+keep the invalidation generation in the file, so a write in one process
+invalidates the cached results of all of them. Their fill_lock_path is used
+by QueryCache to make concurrent misses in different processes wait for a
+single fill.
+
+Every backend implements:
+    get(key) -> (value, expires_at) or None
+    set(key, value, size, expires_at, tables, generation=None)
+    delete(key) -> bool
+    invalidate_tables(tables) -> int
+    generation() -> int
+    clear()
+    stats() -> dict
+"""
+import fcntl
+import hashlib
+import mmap
+import os
+import pickle
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+
+def digest(key):
+    """Returns a 16-byte hash of a cache key, for the shared backends."""
+    return hashlib.blake2b(pickle.dumps(key, protocol=5), digest_size=16).digest()
+
+
+class MemoryBackend:
+    """
+    An in-process LRU store within an entry count and a byte budget.
+
+    Args:
+        max_entries (int): The most entries kept at once.
+        max_bytes (int): The most (estimated) bytes kept at once.
+    """
+
+    shared = False
+    fill_lock_path = None
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 2**20):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # key -> (value, expires_at, size, tables), least recently used first.
+        self._entries = OrderedDict()
+        # table -> keys of the entries that read it.
+        self._by_table = {}
+        self._bytes = 0
+        self._generation = 0
+        self._evictions = 0
+
+    def get(self, key):
+        """Returns (value, expires_at) and marks the entry recently used."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0], entry[1]
+
+    def set(self, key, value, size, expires_at, tables, generation=None):
+        """
+        Stores an entry, evicting least recently used ones if needed. With
+        a generation, nothing is stored if tables were invalidated since.
+        """
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, expires_at, size, tables)
+            self._bytes += size
+            for table in tables:
+                self._by_table.setdefault(table, set()).add(key)
+            while (len(self._entries) > self.max_entries
+                   or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self._evictions += 1
+
+    def _remove(self, key):
+        """Drops one entry; call with the lock held."""
+        _, _, size, tables = self._entries.pop(key)
+        self._bytes -= size
+        for table in tables:
+            keys = self._by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[table]
+
+    def delete(self, key):
+        """Drops one entry; returns True if it existed."""
+        with self._lock:
+            if key not in self._entries:
+                return False
+            self._remove(key)
+            return True
+
+    def invalidate_tables(self, tables):
+        """Drops the entries that read any of the tables."""
+        dropped = 0
+        with self._lock:
+            self._generation += 1
+            for table in tables:
+                for key in list(self._by_table.get(table, ())):
+                    self._remove(key)
+                    dropped += 1
+        return dropped
+
+    def generation(self):
+        """Returns the number of table invalidations so far."""
+        with self._lock:
+            return self._generation
+
+    def clear(self):
+        """Drops every entry."""
+        with self._lock:
+            self._entries.clear()
+            self._by_table.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Returns the number of entries and bytes, and evictions."""
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes,
+                    "evictions": self._evictions}
+
+
+class StripedFileLock:
+    """
+    Locks byte ranges of a lock file with fcntl.lockf, so processes that
+    share the file exclude each other per stripe. fcntl locks are held by a
+    process, not a thread, so a threading lock per stripe excludes the
+    threads of this process as well.
+
+    Args:
+        path (str): The lock file. It is created if needed.
+        stripes (int): The number of independent locks.
+    """
+
+    def __init__(self, path, stripes):
+        self.path = path
+        self.stripes = stripes
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._thread_locks = [threading.Lock() for _ in range(stripes)]
+
+    def acquire(self, stripe):
+        """Locks one stripe."""
+        self._thread_locks[stripe].acquire()
+        try:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, stripe)
+        except BaseException:
+            self._thread_locks[stripe].release()
+            raise
+
+    def release(self, stripe):
+        """Unlocks one stripe."""
+        try:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, stripe)
+        finally:
+            self._thread_locks[stripe].release()
+
+    def acquire_all(self):
+        """Locks every stripe, in order."""
+        for lock in self._thread_locks:
+            lock.acquire()
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, self.stripes, 0)
+
+    def release_all(self):
+        """Unlocks every stripe."""
+        try:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, self.stripes, 0)
+        finally:
+            for lock in self._thread_locks:
+                lock.release()
+
+
+class MmapBackend:
+    """
+    A cross-process store in a memory-mapped file of fixed-size slots.
+
+    Args:
+        path (str): The cache file; processes opening the same path share it.
+        slots (int): The number of entries the file holds.
+        slot_size (int): Bytes per slot, including a 48-byte header.
+        stripes (int): Independent locks over the slots.
+    """
+
+    shared = True
+    MAGIC = b"QCACHE01"
+    # magic, slots, slot_size, generation
+    _FILE_HEADER = struct.Struct("<8sIIQ")
+    _FILE_HEADER_SIZE = 64
+    # key digest, expires_at (NaN for never), table mask, length, used flag
+    _SLOT_HEADER = struct.Struct("<16sdQII8x")
+
+    def __init__(self, path="query_cache.mmap", slots=4096, slot_size=16384,
+                 stripes=64):
+        if slot_size <= self._SLOT_HEADER.size:
+            raise ValueError(f"slot_size must exceed {self._SLOT_HEADER.size}")
+        self.path = path
+        self.fill_lock_path = path + ".fill-lock"
+        self._locks = StripedFileLock(path + ".lock", stripes + 1)
+        self._stripes = stripes
+        self._evictions = 0
+
+        size = self._FILE_HEADER_SIZE + slots * slot_size
+        # The extra stripe guards creation and the generation counter.
+        self._locks.acquire(stripes)
+        try:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if os.fstat(fd).st_size == 0:
+                    os.ftruncate(fd, size)
+                    os.pwrite(fd, self._FILE_HEADER.pack(self.MAGIC, slots,
+                                                         slot_size, 0), 0)
+                magic, slots, slot_size, _ = self._FILE_HEADER.unpack(
+                    os.pread(fd, self._FILE_HEADER.size, 0))
+                if magic != self.MAGIC:
+                    raise ValueError(f"{path} is not a query cache file")
+                # An existing file keeps the geometry it was created with.
+                self._map = mmap.mmap(fd, self._FILE_HEADER_SIZE + slots * slot_size)
+            finally:
+                os.close(fd)
+        finally:
+            self._locks.release(stripes)
+        self.slots = slots
+        self.slot_size = slot_size
+
+    @staticmethod
+    def _table_mask(tables):
+        """A 64-bit set of table-name hashes, for invalidation."""
+        mask = 0
+        for table in tables:
+            mask |= 1 << (zlib.crc32(table.encode('utf-8')) % 64)
+        return mask
+
+    def _slot(self, key_digest):
+        """Returns (slot offset, stripe) for a key digest."""
+        index = int.from_bytes(key_digest[:8], "little") % self.slots
+        return self._FILE_HEADER_SIZE + index * self.slot_size, index % self._stripes
+
+    def _read_header(self, offset):
+        return self._SLOT_HEADER.unpack_from(self._map, offset)
+
+    def get(self, key):
+        """Returns (value bytes, expires_at), or None."""
+        key_digest = digest(key)
+        offset, stripe = self._slot(key_digest)
+        self._locks.acquire(stripe)
+        try:
+            stored, expires_at, _, length, used = self._read_header(offset)
+            if not used or stored != key_digest:
+                return None
+            start = offset + self._SLOT_HEADER.size
+            value = self._map[start:start + length]
+        finally:
+            self._locks.release(stripe)
+        return value, (None if expires_at != expires_at else expires_at)
+
+    def set(self, key, value, size, expires_at, tables, generation=None):
+        """
+        Writes an entry into its slot, replacing the previous occupant. With
+        a generation, nothing is stored if tables were invalidated since.
+        """
+        if len(value) > self.slot_size - self._SLOT_HEADER.size:
+            return
+        key_digest = digest(key)
+        offset, stripe = self._slot(key_digest)
+        self._locks.acquire(stripe)
+        try:
+            # invalidate_tables() holds every stripe, so the generation
+            # cannot change while this one is locked.
+            if generation is not None and generation != self.generation():
+                return
+            stored, _, _, _, used = self._read_header(offset)
+            if used and stored != key_digest:
+                self._evictions += 1
+            start = offset + self._SLOT_HEADER.size
+            self._map[start:start + len(value)] = value
+            self._SLOT_HEADER.pack_into(
+                self._map, offset, key_digest,
+                float("nan") if expires_at is None else expires_at,
+                self._table_mask(tables), len(value), 1)
+        finally:
+            self._locks.release(stripe)
+
+    def delete(self, key):
+        """Frees the key's slot; returns True if it held the key."""
+        key_digest = digest(key)
+        offset, stripe = self._slot(key_digest)
+        self._locks.acquire(stripe)
+        try:
+            stored, _, _, _, used = self._read_header(offset)
+            if not used or stored != key_digest:
+                return False
+            self._SLOT_HEADER.pack_into(self._map, offset, b"", 0.0, 0, 0, 0)
+            return True
+        finally:
+            self._locks.release(stripe)
+
+    def invalidate_tables(self, tables):
+        """
+        Frees every slot whose tables may include one of the given tables.
+
+        Table sets are stored as 64-bit hash masks, so an unrelated entry is
+        occasionally dropped too; a stale entry never survives.
+        """
+        mask = self._table_mask(tables)
+        dropped = 0
+        self._locks.acquire_all()
+        try:
+            for index in range(self.slots):
+                offset = self._FILE_HEADER_SIZE + index * self.slot_size
+                _, _, tables_mask, _, used = self._read_header(offset)
+                if used and tables_mask & mask:
+                    self._SLOT_HEADER.pack_into(self._map, offset, b"", 0.0, 0, 0, 0)
+                    dropped += 1
+            magic, slots, slot_size, generation = self._FILE_HEADER.unpack_from(self._map, 0)
+            self._FILE_HEADER.pack_into(self._map, 0, magic, slots, slot_size,
+                                        generation + 1)
+        finally:
+            self._locks.release_all()
+        return dropped
+
+    def generation(self):
+        """Returns the number of table invalidations, across processes."""
+        return self._FILE_HEADER.unpack_from(self._map, 0)[3]
+
+    def clear(self):
+        """Frees every slot."""
+        self._locks.acquire_all()
+        try:
+            for index in range(self.slots):
+                offset = self._FILE_HEADER_SIZE + index * self.slot_size
+                self._SLOT_HEADER.pack_into(self._map, offset, b"", 0.0, 0, 0, 0)
+        finally:
+            self._locks.release_all()
+
+    def stats(self):
+        """Returns used slots and their bytes, and evictions by this process."""
+        entries = nbytes = 0
+        for index in range(self.slots):
+            _, _, _, length, used = self._read_header(
+                self._FILE_HEADER_SIZE + index * self.slot_size)
+            if used:
+                entries += 1
+                nbytes += length
+        return {"entries": entries, "bytes": nbytes, "evictions": self._evictions}
+
+
+class SQLiteBackend:
+    """
+    A cross-process store in a local SQLite file.
+
+    Args:
+        path (str): The cache database; processes opening it share it.
+        max_entries (int): The most entries kept at once.
+        max_bytes (int): The most bytes of values kept at once.
+        touch_interval (float): Seconds between writes of the last-used
+            times of hits. Until then they are kept in this process, and
+            set() also writes them, in the transaction it opens anyway.
+    """
+
+    shared = True
+
+    def __init__(self, path="query_cache.sqlite", max_entries=100000,
+                 max_bytes=256 * 2**20, touch_interval=5.0):
+        self.path = path
+        self.fill_lock_path = path + ".fill-lock"
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.touch_interval = touch_interval
+        self._local = threading.local()
+        self._evictions = 0
+        # key digest -> last hit time, not yet written to the file.
+        self._touched = {}
+        self._touched_lock = threading.Lock()
+        self._last_touch = time.monotonic()
+        conn = self._connection()
+        with conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS entries ("
+                         "key BLOB PRIMARY KEY, value BLOB NOT NULL, "
+                         "expires_at REAL, size INTEGER NOT NULL, "
+                         "last_used REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used "
+                         "ON entries (last_used)")
+            conn.execute("CREATE TABLE IF NOT EXISTS entry_tables ("
+                         "table_name TEXT NOT NULL, key BLOB NOT NULL, "
+                         "PRIMARY KEY (table_name, key)) WITHOUT ROWID")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta ("
+                         "name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO meta VALUES ('generation', 0)")
+
+    def _connection(self):
+        """Returns this thread's connection to the cache file."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        """
+        Returns (value bytes, expires_at), or None.
+
+        A hit only reads. Its time is remembered and written with the
+        others every touch_interval seconds, if the write lock is free.
+        """
+        key_digest = digest(key)
+        conn = self._connection()
+        row = conn.execute("SELECT value, expires_at FROM entries WHERE key = ?",
+                           (key_digest,)).fetchone()
+        if row is None:
+            return None
+        with self._touched_lock:
+            self._touched[key_digest] = time.time()
+            due = time.monotonic() - self._last_touch >= self.touch_interval
+            if due:
+                self._last_touch = time.monotonic()
+        if due:
+            self._flush_touched(conn, wait=False)
+        return row[0], row[1]
+
+    def _take_touched(self):
+        """Removes and returns the hit times waiting to be written."""
+        with self._touched_lock:
+            touched, self._touched = self._touched, {}
+        return touched
+
+    def _write_touched(self, conn, touched):
+        """Writes hit times; call inside a write transaction."""
+        conn.executemany("UPDATE entries SET last_used = MAX(last_used, ?) "
+                         "WHERE key = ?",
+                         [(used, key) for key, used in touched.items()])
+
+    def _flush_touched(self, conn, wait):
+        """
+        Writes the pending hit times. Without wait, gives up at once if
+        another connection holds the write lock, and keeps them for later.
+        """
+        touched = self._take_touched()
+        if not touched:
+            return
+        if not wait:
+            conn.execute("PRAGMA busy_timeout = 0")
+        try:
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                self._write_touched(conn, touched)
+        except sqlite3.OperationalError:
+            # Busy: put them back, unless newer hits replaced them.
+            with self._touched_lock:
+                for key, used in touched.items():
+                    if used > self._touched.get(key, 0.0):
+                        self._touched[key] = used
+        finally:
+            if not wait:
+                conn.execute("PRAGMA busy_timeout = 30000")
+
+    def set(self, key, value, size, expires_at, tables, generation=None):
+        """
+        Stores an entry, evicting least recently used ones if needed. With
+        a generation, nothing is stored if tables were invalidated since.
+        """
+        if len(value) > self.max_bytes:
+            return
+        key_digest = digest(key)
+        conn = self._connection()
+        with conn:
+            # Take the write lock first, so the generation cannot change
+            # between the check and the insert.
+            conn.execute("BEGIN IMMEDIATE")
+            if generation is not None and generation != conn.execute(
+                    "SELECT value FROM meta WHERE name = 'generation'").fetchone()[0]:
+                return
+            conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                         (key_digest, value, expires_at, len(value), time.time()))
+            # Eviction below goes by last_used, so bring it up to date while
+            # the write lock is held anyway.
+            self._write_touched(conn, self._take_touched())
+            conn.execute("DELETE FROM entry_tables WHERE key = ?", (key_digest,))
+            conn.executemany("INSERT INTO entry_tables VALUES (?, ?)",
+                             [(table, key_digest) for table in tables])
+            count, total = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+            while count > self.max_entries or total > self.max_bytes:
+                oldest = conn.execute("SELECT key, size FROM entries "
+                                      "ORDER BY last_used LIMIT 1").fetchone()
+                self._delete(conn, oldest[0])
+                count, total = count - 1, total - oldest[1]
+                self._evictions += 1
+
+    @staticmethod
+    def _delete(conn, key_digest):
+        cursor = conn.execute("DELETE FROM entries WHERE key = ?", (key_digest,))
+        conn.execute("DELETE FROM entry_tables WHERE key = ?", (key_digest,))
+        return cursor.rowcount > 0
+
+    def delete(self, key):
+        """Drops one entry; returns True if it existed."""
+        conn = self._connection()
+        with conn:
+            return self._delete(conn, digest(key))
+
+    def invalidate_tables(self, tables):
+        """Drops the entries that read any of the tables."""
+        tables = list(tables)
+        conn = self._connection()
+        with conn:
+            conn.execute("UPDATE meta SET value = value + 1 WHERE name = 'generation'")
+            if not tables:
+                return 0
+            marks = ", ".join("?" * len(tables))
+            keys = f"SELECT key FROM entry_tables WHERE table_name IN ({marks})"
+            dropped = conn.execute(f"DELETE FROM entries WHERE key IN ({keys})",
+                                   tables).rowcount
+            conn.execute(f"DELETE FROM entry_tables WHERE key IN ({keys})", tables)
+        return dropped
+
+    def generation(self):
+        """Returns the number of table invalidations, across processes."""
+        return self._connection().execute(
+            "SELECT value FROM meta WHERE name = 'generation'").fetchone()[0]
+
+    def clear(self):
+        """Drops every entry."""
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM entries")
+            conn.execute("DELETE FROM entry_tables")
+
+    def stats(self):
+        """Returns the number of entries and bytes, and evictions."""
+        count, total = self._connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {"entries": count, "bytes": total, "evictions": self._evictions}
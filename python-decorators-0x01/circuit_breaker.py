@@ -0,0 +1,343 @@
+#!/usr/bin/python3
+"""
+A circuit breaker for database calls.
+
+When the database is down, retry_on_failure still tries every call several
+times and sleeps between attempts, so each caller waits seconds before it
+gets an error. A circuit breaker remembers that the database is failing and
+answers straight away instead:
+- closed: calls go through; their outcomes are recorded in a sliding window
+  of the last `window` seconds
+- open: once at least min_calls calls in the window have a failure rate of
+  failure_threshold or more, calls fail fast (or return the fallback)
+  without touching the database, for open_seconds
+- half-open: after open_seconds a few probe calls are let through; if they
+  all succeed the breaker closes, if one fails it opens again
+
+Usage: guarded_db_connection replaces with_db_connection. The breaker
+wraps borrowing the pooled connection as well as the call, so an
+unreachable database (a failing connect, a pool timeout) opens the circuit
+too, and an open circuit skips the borrow altogether:
+
+    @guarded_db_connection(fallback=lambda: [])
+    @retry_on_failure(retries=3, delay=1)
+    def fetch_users(conn):
+        ...
+
+circuit_breaker() guards any other callable. Put inside with_db_connection,
+it only sees errors raised after the connection was borrowed.
+
+Run `python3 circuit_breaker.py` to time a fast-failed call.
+"""
+import functools
+import logging
+import sqlite3
+import threading
+import time
+import db_pool
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+logger = logging.getLogger("circuit_breaker")
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the function while the circuit is open."""
+
+
+def is_failure(error):
+    """
+    Returns True for errors that say the database is unhealthy: operational
+    errors (locked, unreachable, disk I/O) and pool timeouts, which only a
+    breaker around the borrow (guarded_db_connection) can see. Errors such
+    as an IntegrityError are the caller's fault and do not trip the breaker.
+    """
+    return isinstance(error, (sqlite3.OperationalError,
+                              db_pool.PoolTimeoutError))
+
+
+class CircuitBreaker:
+    """
+    Thread-safe circuit breaker state with a time-bucketed sliding window.
+
+    Args:
+        failure_threshold (float): Failure rate (0-1) that opens the circuit.
+        min_calls (int): Calls needed in the window before the rate counts,
+            so one early failure does not open the circuit.
+        window (float): Length of the sliding window in seconds.
+        buckets (int): Slots the window is split into; older slots drop out
+            as time moves on.
+        open_seconds (float): How long the circuit stays open before probing.
+        half_open_calls (int): Probe calls that must succeed to close again.
+        failure_if (callable): Decides whether an exception is a failure.
+    """
+
+    def __init__(self, failure_threshold=0.5, min_calls=10, window=30.0,
+                 buckets=10, open_seconds=5.0, half_open_calls=1,
+                 failure_if=is_failure):
+        self.failure_threshold = failure_threshold
+        self.min_calls = min_calls
+        self.window = window
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.failure_if = failure_if
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0      # probe calls let through while half-open
+        self._successes = 0   # probe calls that succeeded
+        self._bucket_seconds = window / buckets
+        # Each slot is [bucket number, calls, failures].
+        self._buckets = [[-1, 0, 0] for _ in range(buckets)]
+
+        self._rejected = 0
+        self._opened = 0
+
+    def _bucket(self, now):
+        """Returns the slot for `now`, clearing it if it is out of date."""
+        number = int(now / self._bucket_seconds)
+        slot = self._buckets[number % len(self._buckets)]
+        if slot[0] != number:
+            slot[0], slot[1], slot[2] = number, 0, 0
+        return slot
+
+    def _window_counts(self, now):
+        """Returns (calls, failures) in the window; call with the lock held."""
+        oldest = int(now / self._bucket_seconds) - len(self._buckets) + 1
+        calls = failures = 0
+        for number, bucket_calls, bucket_failures in self._buckets:
+            if number >= oldest:
+                calls += bucket_calls
+                failures += bucket_failures
+        return calls, failures
+
+    def _transition(self, state, now):
+        """Moves to a new state; call with the lock held."""
+        logger.warning("Circuit %s -> %s", self._state, state)
+        self._state = state
+        if state == OPEN:
+            self._opened_at = now
+            self._opened += 1
+        elif state == HALF_OPEN:
+            self._probes = self._successes = 0
+        else:
+            for slot in self._buckets:
+                slot[0], slot[1], slot[2] = -1, 0, 0
+
+    def allow(self):
+        """
+        Decides whether a call may go through.
+
+        Returns:
+            bool: True to make the call (and report it with record_success,
+                record_failure or release), False to fail fast.
+        """
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            now = time.monotonic()
+            if self._state == OPEN:
+                if now - self._opened_at < self.open_seconds:
+                    self._rejected += 1
+                    return False
+                self._transition(HALF_OPEN, now)
+            if self._probes < self.half_open_calls:
+                self._probes += 1
+                return True
+            self._rejected += 1
+            return False
+
+    def record_success(self):
+        """Records a call that worked."""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._successes += 1
+                if self._successes >= self.half_open_calls:
+                    self._transition(CLOSED, time.monotonic())
+            else:
+                self._bucket(time.monotonic())[1] += 1
+
+    def record_failure(self):
+        """Records a failed call; may open the circuit."""
+        with self._lock:
+            now = time.monotonic()
+            if self._state == HALF_OPEN:
+                self._transition(OPEN, now)
+                return
+            if self._state == OPEN:
+                return
+            slot = self._bucket(now)
+            slot[1] += 1
+            slot[2] += 1
+            calls, failures = self._window_counts(now)
+            if (calls >= self.min_calls
+                    and failures / calls >= self.failure_threshold):
+                self._transition(OPEN, now)
+
+    @property
+    def state(self):
+        """closed, open or half-open."""
+        with self._lock:
+            if (self._state == OPEN
+                    and time.monotonic() - self._opened_at >= self.open_seconds):
+                return HALF_OPEN  # the next call will probe
+            return self._state
+
+    def release(self):
+        """
+        Gives back a half-open probe slot without recording an outcome, for
+        a call that was interrupted (e.g. KeyboardInterrupt) or failed with
+        an error that is not a failure. Otherwise the slot would stay taken
+        and every later call would be rejected.
+        """
+        with self._lock:
+            if self._state == HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def reset(self):
+        """Closes the circuit and forgets the window."""
+        with self._lock:
+            if self._state != CLOSED:
+                self._transition(CLOSED, time.monotonic())
+
+    def stats(self):
+        """
+        Returns the state, calls and failures in the window, fast-failed
+        calls and how often the circuit has opened.
+        """
+        state = self.state
+        with self._lock:
+            calls, failures = self._window_counts(time.monotonic())
+            return {
+                "state": state,
+                "window_calls": calls,
+                "window_failures": failures,
+                "rejected": self._rejected,
+                "opened": self._opened,
+            }
+
+
+def _guarded_call(breaker, fallback, name, call, args, kwargs):
+    """
+    Runs call(*args, **kwargs) if the breaker allows it and records the
+    outcome; otherwise returns fallback(*args, **kwargs) or raises
+    CircuitOpenError.
+    """
+    if not breaker.allow():
+        if fallback is not None:
+            return fallback(*args, **kwargs)
+        raise CircuitOpenError(f"Circuit for '{name}' is open")
+    failed = None
+    try:
+        result = call(*args, **kwargs)
+        failed = False
+        return result
+    except Exception as e:
+        # An error that is not the database's fault (e.g. an IntegrityError)
+        # says nothing about its health either way: it must neither open
+        # the circuit nor close it as a successful probe
+        if breaker.failure_if(e):
+            failed = True
+        raise
+    finally:
+        if failed is None:
+            # No outcome to record (a non-failure error, or a BaseException
+            # such as KeyboardInterrupt), but a half-open probe slot must
+            # not leak
+            breaker.release()
+        elif failed:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+
+def circuit_breaker(fallback=None, breaker=None, **options):
+    """
+    A decorator that stops calling a failing database for a while.
+
+    Args:
+        fallback (callable): Called with the same arguments instead of the
+            function while the circuit is open, e.g. to return cached or
+            empty results. Without one, CircuitOpenError is raised.
+        breaker (CircuitBreaker): State to use, so several functions can
+            share one circuit. By default each decorated function gets its
+            own, built from **options (see CircuitBreaker).
+    """
+    breaker = breaker or CircuitBreaker(**options)
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return _guarded_call(breaker, fallback, func.__name__, func,
+                                 args, kwargs)
+        wrapper.breaker = breaker
+        return wrapper
+    return decorator
+
+
+def guarded_db_connection(fallback=None, breaker=None, path=None, **options):
+    """
+    with_db_connection with a circuit breaker around borrowing the pooled
+    connection and running the function.
+
+    Connection failures and pool timeouts count as failures, like errors
+    from the query. While the circuit is open no connection is borrowed.
+    As in with_db_connection, a database error is printed and None is
+    returned, after it has been recorded.
+
+    Args:
+        fallback (callable): Called with the caller's arguments (there is
+            no connection) while the circuit is open. Without one,
+            CircuitOpenError is raised.
+        breaker (CircuitBreaker): State to share with other functions.
+            By default one is built from **options (see CircuitBreaker).
+        path (str): The database file; defaults to db_pool's.
+    """
+    breaker = breaker or CircuitBreaker(**options)
+
+    def decorator(func):
+        def call(*args, **kwargs):
+            with db_pool.connection(path) as conn:
+                return func(conn, *args, **kwargs)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                return _guarded_call(breaker, fallback, func.__name__, call,
+                                     args, kwargs)
+            except sqlite3.Error as e:
+                print(f"Database error occurred: {e}")
+                return None
+        wrapper.breaker = breaker
+        return wrapper
+    return decorator
+
+
+def benchmark(calls=100000):
+    """
+    Prints the latency of a call rejected by an open circuit, for a
+    database that cannot even be opened.
+
+    Args:
+        calls (int): Calls to time.
+    """
+    breaker = CircuitBreaker(min_calls=1, open_seconds=3600)
+
+    @guarded_db_connection(fallback=lambda: [], breaker=breaker,
+                           path="/nonexistent/users.db")
+    def fetch_users(conn):
+        return conn.execute("SELECT * FROM users").fetchall()
+
+    fetch_users()  # fails to connect and opens the circuit
+    start = time.perf_counter()
+    for _ in range(calls):
+        fetch_users()
+    per_call = (time.perf_counter() - start) / calls
+    print(f"fast-failed call: {per_call * 1e6:.2f} us/call ({breaker.stats()})")
+
+
+if __name__ == "__main__":
+    benchmark()
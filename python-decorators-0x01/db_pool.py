@@ -0,0 +1,308 @@
+#!/usr/bin/python3
+"""
+A thread-safe pool of SQLite connections for with_db_connection.
+
+Connecting per call means opening the file, reading the schema and starting
+with a cold page cache every time. The pool keeps connections open instead:
+- a thread gets back the connection it used last, if it is free, so its
+  statement cache and pages stay warm
+- at most max_size connections exist; other callers wait for a free one
+- connections idle for longer than idle_timeout are closed
+- PRAGMAs (WAL, synchronous, cache_size, busy_timeout) are applied once,
+  when a connection is opened
+- a returned connection has any uncommitted transaction rolled back, just
+  as closing it would have done
+
+The database file comes from the USERS_DB_PATH environment variable
+(default users.db).
+
+Usage:
+    with db_pool.connection() as conn:
+        conn.execute(...)
+
+Run `python3 db_pool.py` to compare connect-per-call with the pool.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+DEFAULT_DB_PATH = "users.db"
+
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -8000,  # negative means KiB, i.e. about 8 MB per connection
+    "busy_timeout": 5000,
+}
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection becomes free within the timeout."""
+
+
+class SQLitePool:
+    """
+    A bounded pool of reusable SQLite connections.
+
+    Args:
+        path (str): The database file. Defaults to USERS_DB_PATH or users.db.
+        max_size (int): The maximum number of open connections.
+        idle_timeout (float): Seconds a connection may sit unused before it
+            is closed. None keeps idle connections forever.
+        borrow_timeout (float): Seconds to wait for a free connection before
+            raising PoolTimeoutError. None waits forever.
+        pragmas (dict): PRAGMAs applied to every new connection.
+    """
+
+    def __init__(self, path=None, max_size=8, idle_timeout=60.0,
+                 borrow_timeout=30.0, pragmas=None):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self.path = path or os.getenv('USERS_DB_PATH', DEFAULT_DB_PATH)
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.borrow_timeout = borrow_timeout
+        self.pragmas = DEFAULT_PRAGMAS if pragmas is None else pragmas
+
+        self._condition = threading.Condition()
+        # Idle connections as (connection, returned_at) pairs.
+        self._idle = deque()
+        self._size = 0
+        self._local = threading.local()
+
+        self._borrows = 0
+        self._reused_own = 0
+        self._created = 0
+        self._evicted = 0
+        self._waits = 0
+
+    def _open(self):
+        """Opens a new connection and applies the PRAGMAs."""
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name}={value}")
+        return conn
+
+    def _evict_idle(self, now):
+        """Closes connections idle for too long; call with the lock held."""
+        if self.idle_timeout is None:
+            return
+        # The oldest returns are on the left.
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            conn, _ = self._idle.popleft()
+            self._size -= 1
+            self._evicted += 1
+            conn.close()
+
+    def _take_idle(self):
+        """Takes this thread's previous connection if idle, else the newest."""
+        own = getattr(self._local, "conn", None)
+        if own is not None:
+            for index, (conn, _) in enumerate(self._idle):
+                if conn is own:
+                    del self._idle[index]
+                    self._reused_own += 1
+                    return conn
+        return self._idle.pop()[0]
+
+    def acquire(self):
+        """
+        Borrows a connection, waiting if all max_size are in use.
+
+        Returns:
+            sqlite3.Connection: A connection; give it back with release().
+        """
+        deadline = (None if self.borrow_timeout is None
+                    else time.monotonic() + self.borrow_timeout)
+        with self._condition:
+            self._borrows += 1
+            while True:
+                self._evict_idle(time.monotonic())
+                if self._idle:
+                    conn = self._take_idle()
+                    break
+                if self._size < self.max_size:
+                    # Count it before opening so no other thread overshoots.
+                    self._size += 1
+                    conn = None
+                    break
+                self._waits += 1
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise PoolTimeoutError(
+                        f"No connection to {self.path} free after "
+                        f"{self.borrow_timeout}s (max_size={self.max_size})"
+                    )
+                self._condition.wait(remaining)
+
+        if conn is None:
+            try:
+                conn = self._open()
+            except Exception:
+                with self._condition:
+                    self._size -= 1
+                    self._condition.notify()
+                raise
+            with self._condition:
+                self._created += 1
+        self._local.conn = conn
+        return conn
+
+    def release(self, conn, discard=False):
+        """
+        Gives a connection back to the pool.
+
+        Args:
+            conn (sqlite3.Connection): A connection from acquire().
+            discard (bool): Close it instead of keeping it.
+        """
+        if not discard:
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+            except sqlite3.Error:
+                discard = True
+        with self._condition:
+            if discard:
+                self._size -= 1
+                conn.close()
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._condition.notify()
+
+    @contextmanager
+    def connection(self):
+        """Context manager that borrows a connection and gives it back."""
+        conn = self.acquire()
+        try:
+            yield conn
+        except sqlite3.ProgrammingError:
+            # e.g. the connection was closed by the caller.
+            self.release(conn, discard=True)
+            raise
+        except BaseException:
+            self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+    def close(self):
+        """Closes every idle connection."""
+        with self._condition:
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._size -= 1
+                conn.close()
+
+    def stats(self):
+        """
+        Returns counters describing the pool.
+
+        Returns:
+            dict: size, idle, borrows, borrows that got the thread's own
+                previous connection, connections created and evicted, and
+                how often a borrower had to wait.
+        """
+        with self._condition:
+            return {
+                "path": self.path,
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": len(self._idle),
+                "borrows": self._borrows,
+                "reused_own": self._reused_own,
+                "created": self._created,
+                "evicted_idle": self._evicted,
+                "waits": self._waits,
+            }
+
+
+# One pool per database path, re-created after a fork because a child must
+# not share SQLite connections with its parent.
+_pools = {}
+_pools_pid = None
+_pools_lock = threading.Lock()
+
+
+def get_pool(path=None):
+    """
+    Returns the shared pool for a database file.
+
+    Args:
+        path (str): The database file. Defaults to USERS_DB_PATH or users.db.
+            DB_POOL_SIZE and DB_POOL_IDLE_TIMEOUT tune new pools.
+    """
+    global _pools_pid
+    path = path or os.getenv('USERS_DB_PATH', DEFAULT_DB_PATH)
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            _pools.clear()
+            _pools_pid = os.getpid()
+        pool = _pools.get(path)
+        if pool is None:
+            pool = _pools[path] = SQLitePool(
+                path,
+                max_size=int(os.getenv('DB_POOL_SIZE', '8')),
+                idle_timeout=float(os.getenv('DB_POOL_IDLE_TIMEOUT', '60'))
+            )
+        return pool
+
+
+def connection(path=None):
+    """
+    Context manager that lends a pooled connection.
+
+    Usage:
+        with db_pool.connection() as conn:
+            ...
+    """
+    return get_pool(path).connection()
+
+
+def benchmark(calls=2000, path="pool_benchmark.db"):
+    """
+    Prints the per-call cost of connect-per-call versus the pool for a
+    primary-key lookup.
+
+    Args:
+        calls (int): Calls to time for each approach.
+        path (str): A scratch database, created and removed here.
+    """
+    setup = sqlite3.connect(path)
+    setup.execute("CREATE TABLE IF NOT EXISTS users "
+                  "(id INTEGER PRIMARY KEY, name TEXT, email TEXT, age INTEGER)")
+    setup.executemany("INSERT OR IGNORE INTO users VALUES (?, ?, ?, ?)",
+                      [(i, f"user{i}", f"user{i}@example.com", 20 + i % 50)
+                       for i in range(1000)])
+    setup.commit()
+    setup.close()
+
+    query = "SELECT * FROM users WHERE id = ?"
+    start = time.perf_counter()
+    for i in range(calls):
+        conn = sqlite3.connect(path)
+        conn.execute(query, (i % 1000,)).fetchone()
+        conn.close()
+    per_connect = (time.perf_counter() - start) / calls
+
+    pool = SQLitePool(path)
+    start = time.perf_counter()
+    for i in range(calls):
+        with pool.connection() as conn:
+            conn.execute(query, (i % 1000,)).fetchone()
+    per_pooled = (time.perf_counter() - start) / calls
+    pool.close()
+
+    print(f"connect per call: {per_connect * 1e6:8.1f} us/call")
+    print(f"pooled:           {per_pooled * 1e6:8.1f} us/call "
+          f"({per_connect / per_pooled:.1f}x faster)")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+if __name__ == "__main__":
+    benchmark()
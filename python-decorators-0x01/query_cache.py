@@ -0,0 +1,528 @@
+#!/usr/bin/python3
+"""
+A bounded result cache for cache_query.
+
+Results are keyed by the normalized SQL (whitespace collapsed) together with
+its parameters, so "WHERE id = ?" with (1,) and with (2,) are separate
+entries. The cache stays within both an entry count and an approximate byte
+budget by evicting the least recently used entries, and entries expire
+after ttl seconds.
+
+Each entry remembers the tables its query reads. When compute() runs inside
+record_reads(conn), they are recorded by a SQLite authorizer (every table
+SQLite reads, including joins, comma lists, views and schema-qualified
+names); the table names found in the SQL text are added as a fallback.
+invalidate_tables() drops every entry that read one of the given tables;
+transactional in 2-transactional.py calls it after committing writes, so
+readers never see rows that were changed through it.
+
+Where entries live is pluggable (see cache_backends.py): in this process,
+or in a memory-mapped file or SQLite file shared by several processes,
+e.g. the workers of one server. Values for the shared backends are
+serialized with pickle protocol 5, or msgpack when asked for and installed.
+
+get_or_compute() fills a missing entry once, however many threads (and,
+with a shared backend, processes) miss it at the same time: the others
+wait for that fill and use its result. It can also serve an expired entry
+for a grace period while a background thread refreshes it
+(stale-while-revalidate), and refresh hot entries slightly before they
+expire (probabilistic early expiration), so a popular entry expiring does
+not send every caller to the database at once.
+"""
+import math
+import os
+import pickle
+import random
+import re
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from cache_backends import (MemoryBackend, MmapBackend, SQLiteBackend,
+                            StripedFileLock, digest)
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional; pickle is always available
+    msgpack = None
+
+MISS = object()
+
+_SPACES = re.compile(r"\s+")
+# The first table after FROM/JOIN, without any schema prefix. It is all the
+# cache knows about queries computed outside record_reads().
+_READ_TABLES = re.compile(r"\b(?:FROM|JOIN)\s+(?:[`\"\[]?\w+[`\"\]]?\.)?[`\"\[]?(\w+)",
+                          re.IGNORECASE)
+
+
+def normalize_sql(sql):
+    """Collapses whitespace and drops a trailing semicolon."""
+    return _SPACES.sub(" ", sql).strip().rstrip(";").rstrip()
+
+
+def make_key(sql, params=None):
+    """
+    Returns the cache key of a query.
+
+    Args:
+        sql (str): The query text.
+        params: Its parameters (a sequence or a mapping), or None.
+
+    Returns:
+        tuple: (normalized SQL, parameters as a hashable tuple).
+    """
+    if params is None:
+        frozen = ()
+    elif isinstance(params, dict):
+        frozen = tuple(sorted(params.items()))
+    else:
+        frozen = tuple(params)
+    return normalize_sql(sql), frozen
+
+
+def tables_of(sql):
+    """
+    Returns the lowercase names of the tables after FROM and JOIN in a
+    query. Comma-separated lists and subqueries hidden in views are missed;
+    record_reads() gets those right.
+    """
+    return frozenset(name.lower() for name in _READ_TABLES.findall(sql))
+
+
+def estimate_size(value):
+    """
+    Roughly estimates the memory used by a query result.
+
+    A list of rows is measured from its first row, which is accurate enough
+    for rows of one query.
+
+    Args:
+        value: A result, usually a list of row tuples.
+
+    Returns:
+        int: The estimated size in bytes.
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)) and value:
+        first = value[0]
+        row = sys.getsizeof(first)
+        if isinstance(first, (list, tuple)):
+            row += sum(sys.getsizeof(item) for item in first)
+        size += row * len(value)
+    return size
+
+
+class _Call:
+    """One in-flight fill that other callers can wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class QueryCache:
+    """
+    A thread-safe LRU cache of query results with TTL and a byte budget.
+
+    Args:
+        max_entries (int): The most results kept at once (MemoryBackend).
+        max_bytes (int): The most (estimated) bytes of results kept at once
+            (MemoryBackend).
+        ttl (float): Seconds a result stays valid. None never expires.
+        backend: Where entries are stored. Defaults to a MemoryBackend
+            with max_entries and max_bytes.
+        serializer (str): "pickle" or "msgpack", for shared backends.
+        fill_stripes (int): Cross-process fill locks; misses on keys in
+            different stripes do not wait for each other.
+        stale_ttl (float): Seconds an expired result may still be served
+            by get_or_compute() while it is refreshed in the background.
+            0 disables stale-while-revalidate.
+        early_expiration (float): XFetch beta; higher values refresh hot
+            entries earlier. 0 disables early expiration.
+        refresh_workers (int): Threads running background refreshes.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 2**20, ttl=300.0,
+                 backend=None, serializer="pickle", fill_stripes=64,
+                 stale_ttl=0.0, early_expiration=0.0, refresh_workers=2):
+        if serializer not in ("pickle", "msgpack"):
+            raise ValueError("serializer must be 'pickle' or 'msgpack'")
+        if serializer == "msgpack" and msgpack is None:
+            raise ImportError("serializer='msgpack' needs msgpack "
+                              "(pip install msgpack)")
+        self.ttl = ttl
+        self.backend = backend or MemoryBackend(max_entries, max_bytes)
+        self.serializer = serializer
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._calls = {}
+        self._fill_stripes = fill_stripes
+        self._fill_locks = None
+        self._fill_pid = None
+        self.stale_ttl = stale_ttl
+        self.early_expiration = early_expiration
+        self.refresh_workers = refresh_workers
+        self._refreshing = set()
+        self._refresher = None
+        self._refresher_pid = None
+
+        self._hits = 0
+        self._misses = 0
+        self._expired = 0
+        self._invalidations = 0
+        self._coalesced = 0
+        self._stale_hits = 0
+        self._refreshes = 0
+        self._refresh_errors = 0
+
+    def _dumps(self, value):
+        if self.serializer == "msgpack":
+            return msgpack.packb(value, use_bin_type=True)
+        return pickle.dumps(value, protocol=5)
+
+    def _loads(self, data):
+        if self.serializer == "msgpack":
+            # Rows come back as tuples, as they went in.
+            return msgpack.unpackb(data, raw=False, use_list=False)
+        return pickle.loads(data)
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _lookup(self, key):
+        """
+        Returns (value, fresh_until, compute_seconds) for a key, or None if
+        it is not cached or past its stale period; does not count.
+        """
+        entry = self.backend.get(key)
+        if entry is None:
+            return None
+        stored, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            self.backend.delete(key)
+            self._count("_expired")
+            return None
+        return self._loads(stored) if self.backend.shared else stored
+
+    def get(self, sql, params=None):
+        """
+        Looks a query up.
+
+        Returns:
+            The cached result, or MISS (also for a stale result).
+        """
+        entry = self._lookup(make_key(sql, params))
+        if entry is None or (entry[1] is not None and entry[1] <= time.time()):
+            self._count("_misses")
+            return MISS
+        self._count("_hits")
+        return entry[0]
+
+    def generation(self):
+        """
+        Returns a token to pass to set() for a result about to be computed.
+
+        If a write invalidates tables while the query runs, set() with the
+        older token discards the possibly stale result.
+        """
+        return self.backend.generation()
+
+    def set(self, sql, params, value, ttl=None, generation=None,
+            compute_seconds=0.0, tables=()):
+        """
+        Stores a query result.
+
+        Args:
+            sql (str): The query text.
+            params: Its parameters, or None.
+            value: The result to cache.
+            ttl (float): Overrides the cache's ttl for this entry.
+            generation (int): The generation() taken before running the
+                query; the result is dropped if tables were invalidated since.
+            compute_seconds (float): How long the query took, which scales
+                the early expiration window.
+            tables (iterable): Tables the query read, e.g. from
+                record_reads(); added to those named in the SQL.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        fresh_until = None if ttl is None else time.time() + ttl
+        # The backend keeps the entry through its stale period as well.
+        expires_at = None if ttl is None else fresh_until + self.stale_ttl
+        stored = (value, fresh_until, compute_seconds)
+        if self.backend.shared:
+            stored = self._dumps(stored)
+            size = len(stored)
+        else:
+            size = estimate_size(value)
+        tables = tables_of(sql) | {table.lower() for table in tables}
+        # The backend compares the generation and stores the entry under one
+        # lock, so an invalidation cannot slip in between the two.
+        self.backend.set(make_key(sql, params), stored, size, expires_at,
+                         tables, generation)
+
+    @contextmanager
+    def record_reads(self, conn):
+        """
+        Records the tables read through a sqlite3 connection while a
+        result is being computed for this cache.
+
+        compute() and refresh() wrap their query in it, e.g.
+            with cache.record_reads(conn):
+                return conn.execute(sql).fetchall()
+        Outside a fill it does nothing. The connection's authorizer is
+        replaced for the duration of the block.
+        """
+        tables = getattr(self._local, "read_tables", None)
+        if tables is None:
+            yield
+            return
+
+        def authorizer(action, arg1, arg2, db_name, trigger):
+            if action == sqlite3.SQLITE_READ and arg1:
+                tables.add(arg1.lower())
+            return sqlite3.SQLITE_OK
+
+        conn.set_authorizer(authorizer)
+        try:
+            yield
+        finally:
+            conn.set_authorizer(None)
+
+    def _fill_lock(self, key, locked):
+        """Takes or drops the cross-process fill lock of a key's stripe."""
+        path = self.backend.fill_lock_path
+        if path is None:
+            return
+        if self._fill_locks is None or self._fill_pid != os.getpid():
+            self._fill_locks = StripedFileLock(path, self._fill_stripes)
+            self._fill_pid = os.getpid()
+        stripe = int.from_bytes(digest(key)[:4], "little") % self._fill_stripes
+        if locked:
+            self._fill_locks.acquire(stripe)
+        else:
+            self._fill_locks.release(stripe)
+
+    def _expires_early(self, fresh_until, compute_seconds, now):
+        """
+        Probabilistic early expiration (XFetch): each caller treats a fresh
+        entry as expired with a probability that rises as its expiry nears
+        and with how long it took to compute, so one caller usually
+        refreshes it before it actually expires for everyone.
+        """
+        if not self.early_expiration or fresh_until is None or not compute_seconds:
+            return False
+        gap = -compute_seconds * self.early_expiration * math.log(1.0 - random.random())
+        return now + gap >= fresh_until
+
+    def _fill(self, key, sql, params, compute, ttl, recheck):
+        """
+        Runs compute() and caches its result, under the key's
+        cross-process fill lock. With recheck, a value another process
+        stored while we waited for the lock is returned instead.
+        """
+        self._fill_lock(key, True)
+        try:
+            if recheck:
+                entry = self._lookup(key)
+                if entry is not None and (entry[1] is None or entry[1] > time.time()):
+                    return entry[0]
+            generation = self.generation()
+            start = time.perf_counter()
+            self._local.read_tables = tables = set()
+            try:
+                value = compute()
+            finally:
+                self._local.read_tables = None
+            self.set(sql, params, value, ttl, generation,
+                     time.perf_counter() - start, tables)
+            return value
+        finally:
+            self._fill_lock(key, False)
+
+    def _refresh_in_background(self, key, sql, params, refresh, ttl):
+        """Starts refresh() in a worker thread unless it is already running."""
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+            self._refreshes += 1
+            if self._refresher is None or self._refresher_pid != os.getpid():
+                self._refresher = ThreadPoolExecutor(
+                    max_workers=self.refresh_workers,
+                    thread_name_prefix="query-cache-refresh")
+                self._refresher_pid = os.getpid()
+
+        def run():
+            try:
+                self._fill(key, sql, params, refresh, ttl,
+                           recheck=self.backend.shared)
+            except Exception as e:
+                # The stale value stays in place until a refresh works.
+                with self._lock:
+                    self._refresh_errors += 1
+                print(f"Background refresh failed for '{sql}': {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        self._refresher.submit(run)
+
+    def get_or_compute(self, sql, params, compute, ttl=None, refresh=None):
+        """
+        Returns the cached result of a query, computing it on a miss.
+
+        Concurrent misses on the same key run compute() once: in this
+        process the first caller fills the entry and the others wait for
+        its result (or its exception). With a shared backend, fills in other
+        processes are serialized per key stripe with fcntl locks, and the
+        cache is checked again after the lock is taken.
+
+        With stale_ttl, an expired entry is still returned for that many
+        seconds while refresh() runs in a background thread; with
+        early_expiration, a fresh entry may be refreshed that way shortly
+        before it expires (XFetch). Either way callers do not wait.
+
+        Args:
+            sql (str): The query text.
+            params: Its parameters, or None.
+            compute (callable): Runs the query and returns its result.
+            ttl (float): Overrides the cache's ttl for this entry.
+            refresh (callable): Recomputes the result in a background
+                thread. It must not use resources owned by the caller, such
+                as the caller's connection. Defaults to compute.
+
+        compute and refresh should run their query inside
+        record_reads(conn), so that the entry is invalidated by writes to
+        every table the query read.
+        """
+        key = make_key(sql, params)
+        entry = self._lookup(key)
+        if entry is not None:
+            value, fresh_until, compute_seconds = entry
+            now = time.time()
+            fresh = fresh_until is None or fresh_until > now
+            if fresh and not self._expires_early(fresh_until, compute_seconds, now):
+                self._count("_hits")
+                return value
+            if fresh or self.stale_ttl:
+                # Stale (or about to be): serve it, refresh behind the scenes.
+                self._count("_hits" if fresh else "_stale_hits")
+                self._refresh_in_background(key, sql, params, refresh or compute, ttl)
+                return value
+        self._count("_misses")
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self._coalesced += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = self._fill(key, sql, params, compute, ttl,
+                                    recheck=self.backend.shared)
+            return call.value
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def invalidate(self, sql, params=None):
+        """Drops the entry of one query, if cached."""
+        if self.backend.delete(make_key(sql, params)):
+            self._count("_invalidations")
+
+    def invalidate_tables(self, tables):
+        """
+        Drops every entry whose query reads one of the tables.
+
+        Args:
+            tables (iterable): Table names (case-insensitive).
+
+        Returns:
+            int: The number of entries dropped.
+        """
+        dropped = self.backend.invalidate_tables(
+            {table.lower() for table in tables})
+        with self._lock:
+            self._invalidations += dropped
+        return dropped
+
+    def clear(self):
+        """Drops every entry."""
+        self.backend.clear()
+
+    def __len__(self):
+        return self.backend.stats()["entries"]
+
+    def stats(self):
+        """
+        Returns counters describing the cache.
+
+        Returns:
+            dict: entries, bytes, hits, misses, hit_rate, expired, evictions,
+                invalidations, coalesced (misses that waited for another
+                caller's fill), stale_hits, refreshes (background refreshes
+                started) and refresh_errors. Counters are for this process;
+                entries and bytes are for the whole backend.
+        """
+        backend = self.backend.stats()
+        with self._lock:
+            lookups = self._hits + self._stale_hits + self._misses
+            return {
+                "entries": backend["entries"],
+                "bytes": backend["bytes"],
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": (self._hits + self._stale_hits) / lookups if lookups else 0.0,
+                "expired": self._expired,
+                "evictions": backend["evictions"],
+                "invalidations": self._invalidations,
+                "coalesced": self._coalesced,
+                "stale_hits": self._stale_hits,
+                "refreshes": self._refreshes,
+                "refresh_errors": self._refresh_errors,
+            }
+
+
+def cache_from_env():
+    """
+    Builds the shared cache from environment variables:
+    QUERY_CACHE_BACKEND ("memory", "mmap" or "sqlite"), QUERY_CACHE_PATH
+    (the file of a shared backend), QUERY_CACHE_TTL (seconds),
+    QUERY_CACHE_SERIALIZER ("pickle" or "msgpack"), QUERY_CACHE_STALE_TTL
+    (seconds) and QUERY_CACHE_EARLY_EXPIRATION (XFetch beta).
+    """
+    kind = os.getenv('QUERY_CACHE_BACKEND', 'memory')
+    path = os.getenv('QUERY_CACHE_PATH')
+    if kind == "memory":
+        backend = None
+    elif kind == "mmap":
+        backend = MmapBackend(path or "query_cache.mmap")
+    elif kind == "sqlite":
+        backend = SQLiteBackend(path or "query_cache.sqlite")
+    else:
+        raise ValueError(f"Unknown QUERY_CACHE_BACKEND {kind!r}")
+    return QueryCache(ttl=float(os.getenv('QUERY_CACHE_TTL', '300')),
+                      backend=backend,
+                      serializer=os.getenv('QUERY_CACHE_SERIALIZER', 'pickle'),
+                      stale_ttl=float(os.getenv('QUERY_CACHE_STALE_TTL', '0')),
+                      early_expiration=float(
+                          os.getenv('QUERY_CACHE_EARLY_EXPIRATION', '0')))
+
+
+# The cache shared by cache_query and transactional in this process.
+shared_cache = cache_from_env()
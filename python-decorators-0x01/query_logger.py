@@ -0,0 +1,233 @@
+#!/usr/bin/python3
+"""
+A query log that keeps file I/O out of the code being logged.
+
+AsyncQueryLogger.log() only appends a (timestamp, message) pair to a bounded
+in-memory buffer. A background thread formats the buffered records and
+writes them with one write() call when enough have piled up (flush_size) or
+when flush_interval seconds have passed, and rotates the file once it grows
+past max_bytes (query_log.txt -> query_log.txt.1 -> ...).
+
+When the buffer is full the logger either drops the oldest record (the
+"drop" policy, like a ring buffer; the caller never waits) or makes the
+caller wait for the writer to catch up (the "block" policy; nothing is lost).
+"""
+import atexit
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+DROP = "drop"
+BLOCK = "block"
+
+
+class AsyncQueryLogger:
+    """
+    Buffers log records in memory and writes them from a background thread.
+
+    Args:
+        path (str): The log file.
+        capacity (int): The most records held in memory at once.
+        policy (str): "drop" discards the oldest record when the buffer is
+            full; "block" waits until the writer has made room.
+        flush_size (int): Wake the writer once this many records are waiting.
+        flush_interval (float): Write waiting records at least this often.
+        max_bytes (int): Rotate the file when it grows past this size.
+            0 disables rotation.
+        backup_count (int): How many rotated files to keep.
+    """
+
+    def __init__(self, path, capacity=10000, policy=DROP, flush_size=512,
+                 flush_interval=1.0, max_bytes=10 * 2**20, backup_count=5):
+        if policy not in (DROP, BLOCK):
+            raise ValueError(f"policy must be {DROP!r} or {BLOCK!r}")
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.path = path
+        self.capacity = capacity
+        self.policy = policy
+        self.flush_size = min(flush_size, capacity)
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+
+        self._buffer = deque()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._pid = None
+        self._closed = False
+        self._file = None
+
+        self._logged = 0
+        self._written = 0
+        self._dropped = 0
+        self._flushes = 0
+        self._rotations = 0
+        self._errors = 0
+        atexit.register(self.close)
+
+    def _ensure_writer(self):
+        """Starts the writer thread (again, after a fork)."""
+        if self._thread is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run,
+                                            name="query-log-writer",
+                                            daemon=True)
+            self._thread.start()
+
+    def log(self, message):
+        """
+        Queues one message; the timestamp is taken now, formatted later.
+
+        Args:
+            message (str): The text to log.
+
+        Returns:
+            bool: False if the logger is closed, including when it was
+                closed while a "block" caller waited for room; True
+                otherwise (with the "drop" policy an older record may have
+                been discarded).
+        """
+        record = (time.time(), message)
+        with self._condition:
+            if self._closed:
+                return False
+            self._ensure_writer()
+            if len(self._buffer) >= self.capacity:
+                if self.policy == DROP:
+                    self._buffer.popleft()
+                    self._dropped += 1
+                else:
+                    while len(self._buffer) >= self.capacity and not self._closed:
+                        self._condition.notify_all()
+                        self._condition.wait()
+                    # close() may have written the buffer out while we
+                    # waited; a record added now would never be written.
+                    if self._closed:
+                        return False
+            self._buffer.append(record)
+            self._logged += 1
+            # Only wake the writer when a batch is ready; otherwise it wakes
+            # up on its own every flush_interval.
+            if len(self._buffer) == self.flush_size:
+                self._condition.notify_all()
+        return True
+
+    def flush(self, timeout=None):
+        """
+        Waits until every record logged so far is written to the file.
+
+        Args:
+            timeout (float): Give up after this many seconds.
+
+        Returns:
+            bool: True if everything was written in time.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            target = self._logged
+            while self._written + self._dropped < target and self._thread:
+                self._condition.notify_all()
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def close(self):
+        """Writes whatever is buffered, stops the writer and closes the file."""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+            thread = self._thread
+        if thread is not None and thread.is_alive() and self._pid == os.getpid():
+            thread.join()
+        self._write(self._take())
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def stats(self):
+        """
+        Returns counters describing the logger.
+
+        Returns:
+            dict: logged, written, dropped and pending records, plus the
+                number of flushes, rotations and write errors.
+        """
+        with self._condition:
+            return {
+                "logged": self._logged,
+                "written": self._written,
+                "dropped": self._dropped,
+                "pending": len(self._buffer),
+                "flushes": self._flushes,
+                "rotations": self._rotations,
+                "errors": self._errors,
+            }
+
+    def _take(self):
+        """Removes and returns every buffered record."""
+        with self._condition:
+            records = list(self._buffer)
+            self._buffer.clear()
+            # Callers blocked on a full buffer can continue.
+            self._condition.notify_all()
+            return records
+
+    def _run(self):
+        """The writer thread: waits for a batch or a timeout, then writes."""
+        while True:
+            with self._condition:
+                if not self._closed and len(self._buffer) < self.flush_size:
+                    self._condition.wait(self.flush_interval)
+                if self._closed:
+                    return
+            self._write(self._take())
+
+    def _write(self, records):
+        """Formats records and appends them to the file in one write."""
+        if not records:
+            return
+        lines = []
+        last_second, stamp = None, None
+        for created, message in records:
+            # Consecutive records mostly share a second; format it once.
+            second = int(created)
+            if second != last_second:
+                last_second = second
+                stamp = datetime.fromtimestamp(second).strftime("%Y-%m-%d %H:%M:%S")
+            lines.append(f"[{stamp}] {message}\n")
+        data = "".join(lines)
+        try:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(data)
+            self._file.flush()
+            if self.max_bytes and self._file.tell() >= self.max_bytes:
+                self._rotate()
+        except OSError as e:
+            self._errors += 1
+            print(f"Error writing to log file {self.path}: {e}")
+        with self._condition:
+            self._written += len(records)
+            self._flushes += 1
+            self._condition.notify_all()
+
+    def _rotate(self):
+        """Renames path -> path.1 -> path.2 ... and starts a new file."""
+        self._file.close()
+        self._file = None
+        if self.backup_count > 0:
+            for index in range(self.backup_count - 1, 0, -1):
+                source = f"{self.path}.{index}"
+                if os.path.exists(source):
+                    os.replace(source, f"{self.path}.{index + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._rotations += 1
@@ -0,0 +1,256 @@
+#!/usr/bin/python3
+"""
+Aggregated timing statistics for SQL queries.
+
+Queries are grouped by fingerprint: the SQL with literals replaced by "?",
+so "SELECT * FROM users WHERE id = 1" and "... id = 2" count as one query.
+For each fingerprint the profiler keeps the number of calls and errors,
+rows returned, total/min/max time and a latency histogram with power-of-two
+buckets (1us, 2us, 4us, ...), from which percentiles are estimated.
+
+report(top) returns the fingerprints that cost the most, which is where
+optimisation pays off. The profile_queries(profiler) decorator records
+every call of a query function:
+
+    @profile_queries(profiler)
+    def fetch_all_users(query):
+        ...
+"""
+import functools
+import re
+import threading
+import time
+from functools import lru_cache
+
+_STRING = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_SPACES = re.compile(r"\s+")
+
+REPORT_KEYS = ("total_seconds", "count", "mean_seconds", "p99_seconds",
+               "max_seconds", "rows", "errors")
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(sql):
+    """
+    Normalises a query so that queries differing only in literals match.
+
+    Args:
+        sql (str): The query text.
+
+    Returns:
+        str: The query with string and number literals replaced by "?",
+            IN lists collapsed to "IN (...)" and whitespace collapsed.
+    """
+    normalized = _STRING.sub("?", sql)
+    normalized = _NUMBER.sub("?", normalized)
+    normalized = _IN_LIST.sub("IN (...)", normalized)
+    return _SPACES.sub(" ", normalized).strip().rstrip(";").rstrip()
+
+
+class QueryStats:
+    """Counters and a latency histogram for one fingerprint."""
+
+    __slots__ = ("fingerprint", "count", "errors", "rows", "total_seconds",
+                 "min_seconds", "max_seconds", "buckets")
+
+    def __init__(self, query_fingerprint):
+        self.fingerprint = query_fingerprint
+        self.count = 0
+        self.errors = 0
+        self.rows = 0
+        self.total_seconds = 0.0
+        self.min_seconds = None
+        self.max_seconds = 0.0
+        # buckets[i] counts calls that took less than 2**i microseconds
+        # (and at least 2**(i-1)).
+        self.buckets = []
+
+    def add(self, seconds, rows=0, error=False):
+        """Records one call."""
+        self.count += 1
+        self.errors += bool(error)
+        self.rows += rows or 0
+        self.total_seconds += seconds
+        if self.min_seconds is None or seconds < self.min_seconds:
+            self.min_seconds = seconds
+        if seconds > self.max_seconds:
+            self.max_seconds = seconds
+        index = int(seconds * 1e6).bit_length()
+        if index >= len(self.buckets):
+            self.buckets.extend([0] * (index + 1 - len(self.buckets)))
+        self.buckets[index] += 1
+
+    def percentile(self, fraction):
+        """
+        Estimates a latency percentile from the histogram.
+
+        Args:
+            fraction (float): e.g. 0.99 for p99.
+
+        Returns:
+            float: The upper bound, in seconds, of the bucket holding that
+                percentile (at most a factor of two above the true value).
+        """
+        if not self.count:
+            return 0.0
+        wanted = fraction * self.count
+        seen = 0
+        for index, calls in enumerate(self.buckets):
+            seen += calls
+            if seen >= wanted:
+                return min((2 ** index) / 1e6, self.max_seconds)
+        return self.max_seconds
+
+    def as_dict(self):
+        """Returns the statistics as a plain dictionary."""
+        return {
+            "fingerprint": self.fingerprint,
+            "count": self.count,
+            "errors": self.errors,
+            "rows": self.rows,
+            "total_seconds": self.total_seconds,
+            "mean_seconds": self.total_seconds / self.count if self.count else 0.0,
+            "min_seconds": self.min_seconds or 0.0,
+            "max_seconds": self.max_seconds,
+            "p50_seconds": self.percentile(0.50),
+            "p95_seconds": self.percentile(0.95),
+            "p99_seconds": self.percentile(0.99),
+            "histogram": {f"<{2 ** index}us": calls
+                          for index, calls in enumerate(self.buckets) if calls},
+        }
+
+
+class QueryProfiler:
+    """
+    Collects QueryStats per fingerprint and reports slow queries.
+
+    Args:
+        slow_threshold (float): Calls taking at least this many seconds are
+            passed to slow_log. None disables the slow-query log.
+        slow_log (callable): Receives a message for every slow call, e.g.
+            AsyncQueryLogger.log.
+    """
+
+    def __init__(self, slow_threshold=0.1, slow_log=None):
+        self.slow_threshold = slow_threshold
+        self.slow_log = slow_log
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, sql, seconds, rows=0, error=None, params=None):
+        """
+        Records one executed query.
+
+        Args:
+            sql (str): The query text.
+            seconds (float): How long it took.
+            rows (int): Rows it returned.
+            error (Exception): The error it raised, if any.
+            params: Its parameters, shown in the slow-query log only.
+        """
+        key = fingerprint(sql)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = QueryStats(key)
+            stats.add(seconds, rows, error is not None)
+        if (self.slow_log is not None and self.slow_threshold is not None
+                and seconds >= self.slow_threshold):
+            status = f"failed: {error}" if error is not None else f"{rows} rows"
+            self.slow_log(f"Slow query ({seconds * 1000:.1f} ms, {status}): "
+                          f"{sql} params={params!r}")
+
+    def report(self, top=10, by="total_seconds"):
+        """
+        Returns the most expensive fingerprints.
+
+        Args:
+            top (int): How many to return. None returns all of them.
+            by (str): The sort key, one of REPORT_KEYS.
+
+        Returns:
+            list: Dictionaries (see QueryStats.as_dict), most expensive first.
+        """
+        if by not in REPORT_KEYS:
+            raise ValueError(f"by must be one of {REPORT_KEYS}")
+        with self._lock:
+            rows = [stats.as_dict() for stats in self._stats.values()]
+        rows.sort(key=lambda row: row[by], reverse=True)
+        return rows if top is None else rows[:top]
+
+    def format_report(self, top=10, by="total_seconds"):
+        """Returns report() as a printable table."""
+        lines = [f"{'calls':>7} {'errors':>6} {'rows':>8} {'total ms':>10} "
+                 f"{'mean ms':>9} {'p99 ms':>9}  query"]
+        for row in self.report(top, by):
+            lines.append(f"{row['count']:>7} {row['errors']:>6} {row['rows']:>8} "
+                         f"{row['total_seconds'] * 1000:>10.2f} "
+                         f"{row['mean_seconds'] * 1000:>9.3f} "
+                         f"{row['p99_seconds'] * 1000:>9.3f}  {row['fingerprint']}")
+        return "\n".join(lines)
+
+    def reset(self):
+        """Forgets all statistics."""
+        with self._lock:
+            self._stats.clear()
+
+
+def _query_and_params(args, kwargs):
+    """
+    Finds the SQL and its parameters in a call's arguments: the 'query' and
+    'params' keywords, or else the first string argument and the argument
+    right after it.
+    """
+    query = kwargs.get('query')
+    params = kwargs.get('params')
+    if query is None:
+        for index, arg in enumerate(args):
+            if isinstance(arg, str):
+                query = arg
+                if params is None and index + 1 < len(args):
+                    params = args[index + 1]
+                break
+    return query, params
+
+
+def _count_rows(result):
+    """Rows in a query function's result: a list of rows, one row, or none."""
+    if result is None:
+        return 0
+    if isinstance(result, list):
+        return len(result)
+    return 1
+
+
+def profile_queries(profiler):
+    """
+    A decorator that times the SQL query executed by the decorated function
+    and records it in `profiler`: latency histogram, rows returned and
+    errors, grouped by query fingerprint (literals stripped). Slow calls are
+    written to the profiler's slow-query log together with their parameters.
+
+    Args:
+        profiler (QueryProfiler): Where the calls are recorded;
+            print(profiler.format_report()) shows the most expensive queries.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            query, params = _query_and_params(args, kwargs)
+            if not query:
+                return func(*args, **kwargs)
+
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                profiler.record(query, time.perf_counter() - start, error=e,
+                                params=params)
+                raise
+            profiler.record(query, time.perf_counter() - start,
+                            rows=_count_rows(result), params=params)
+            return result
+        return wrapper
+    return decorator
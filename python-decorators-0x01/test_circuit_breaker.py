@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""Unit tests for the circuit_breaker module"""
+
+import contextlib
+import io
+import sqlite3
+import time
+import unittest
+from circuit_breaker import (CLOSED, HALF_OPEN, OPEN, CircuitBreaker,
+                             CircuitOpenError, circuit_breaker,
+                             guarded_db_connection)
+
+OPEN_SECONDS = 0.05
+
+
+class Database:
+    """A stand-in query whose next outcome the test sets"""
+
+    def __init__(self):
+        self.__name__ = "query"
+        self.error = None
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return "rows"
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Test case for the circuit breaker's state transitions"""
+
+    def setUp(self):
+        """Guard a fake query with a breaker that opens after two failures"""
+        self.database = Database()
+        self.query = circuit_breaker(min_calls=2, failure_threshold=0.5,
+                                     open_seconds=OPEN_SECONDS)(self.database)
+        self.breaker = self.query.breaker
+
+    def open_circuit(self):
+        """Fails two calls so the circuit opens"""
+        self.database.error = sqlite3.OperationalError("database is locked")
+        for _ in range(2):
+            with self.assertRaises(sqlite3.OperationalError):
+                self.query()
+        self.assertEqual(self.breaker.state, OPEN)
+
+    def wait_for_half_open(self):
+        """Waits until the next call will be a probe"""
+        time.sleep(OPEN_SECONDS * 1.5)
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+
+    def test_closed_to_open(self):
+        """Test failures open the circuit and calls then fail fast"""
+        self.open_circuit()
+        calls = self.database.calls
+        with self.assertRaises(CircuitOpenError):
+            self.query()
+        self.assertEqual(self.database.calls, calls)
+        self.assertEqual(self.breaker.stats()["rejected"], 1)
+
+    def test_min_calls(self):
+        """Test one failure is not enough to open the circuit"""
+        self.database.error = sqlite3.OperationalError("database is locked")
+        with self.assertRaises(sqlite3.OperationalError):
+            self.query()
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_half_open_to_closed(self):
+        """Test a successful probe closes the circuit"""
+        self.open_circuit()
+        self.wait_for_half_open()
+        self.database.error = None
+        self.assertEqual(self.query(), "rows")
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertEqual(self.breaker.stats()["window_calls"], 0)
+
+    def test_half_open_to_open(self):
+        """Test a failed probe opens the circuit again"""
+        self.open_circuit()
+        self.wait_for_half_open()
+        with self.assertRaises(sqlite3.OperationalError):
+            self.query()
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertEqual(self.breaker.stats()["opened"], 2)
+
+    def test_one_probe_at_a_time(self):
+        """Test other calls are rejected while the probe runs"""
+        self.open_circuit()
+        self.wait_for_half_open()
+        inner = []
+
+        def probe():
+            with self.assertRaises(CircuitOpenError):
+                self.query()
+            inner.append(True)
+            return "rows"
+
+        self.assertEqual(circuit_breaker(breaker=self.breaker)(probe)(),
+                         "rows")
+        self.assertEqual(inner, [True])
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_interrupted_probe_releases_its_slot(self):
+        """Test a probe stopped by KeyboardInterrupt lets the next one run"""
+        self.open_circuit()
+        self.wait_for_half_open()
+        self.database.error = KeyboardInterrupt()
+        with self.assertRaises(KeyboardInterrupt):
+            self.query()
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.database.error = None
+        self.assertEqual(self.query(), "rows")
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_non_failure_probe_records_nothing(self):
+        """Test a probe raising a caller error neither closes nor opens"""
+        self.open_circuit()
+        self.wait_for_half_open()
+        self.database.error = sqlite3.IntegrityError("UNIQUE constraint failed")
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.query()
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        # The slot was released, so the next call probes (and fails)
+        self.database.error = sqlite3.OperationalError("database is locked")
+        with self.assertRaises(sqlite3.OperationalError):
+            self.query()
+        self.assertEqual(self.breaker.state, OPEN)
+
+    def test_non_failures_do_not_open(self):
+        """Test caller errors never open a closed circuit"""
+        self.database.error = sqlite3.IntegrityError("UNIQUE constraint failed")
+        for _ in range(5):
+            with self.assertRaises(sqlite3.IntegrityError):
+                self.query()
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_fallback(self):
+        """Test the fallback answers while the circuit is open"""
+        breaker = CircuitBreaker(min_calls=1, open_seconds=60)
+        database = Database()
+        database.error = sqlite3.OperationalError("disk I/O error")
+        query = circuit_breaker(fallback=lambda: [], breaker=breaker)(database)
+        with self.assertRaises(sqlite3.OperationalError):
+            query()
+        self.assertEqual(query(), [])
+        self.assertEqual(database.calls, 1)
+
+
+class TestGuardedDbConnection(unittest.TestCase):
+    """Test case for the breaker around borrowing a connection"""
+
+    def test_unreachable_database_opens_circuit(self):
+        """Test a failing connect opens the circuit and skips the borrow"""
+        calls = []
+
+        @guarded_db_connection(fallback=lambda: [], min_calls=1,
+                               open_seconds=60, path="/nonexistent/users.db")
+        def fetch_users(conn):
+            calls.append(conn)
+            return conn.execute("SELECT * FROM users").fetchall()
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.assertIsNone(fetch_users())
+        self.assertIn("Database error occurred", output.getvalue())
+        self.assertEqual(fetch_users(), [])
+        self.assertEqual(fetch_users.breaker.state, OPEN)
+        self.assertEqual(calls, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""Unit tests for the db_pool module"""
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+import db_pool
+from db_pool import PoolTimeoutError, SQLitePool
+
+
+class TestSQLitePool(unittest.TestCase):
+    """Test case for SQLitePool on a temporary database"""
+
+    def setUp(self):
+        """Create a temporary database with a users table"""
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "users.db")
+        conn = sqlite3.connect(self.path)
+        conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT)")
+        conn.execute("INSERT INTO users VALUES (1, 'Alice')")
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        """Remove the temporary database"""
+        shutil.rmtree(self.directory)
+
+    def test_thread_gets_its_own_connection_back(self):
+        """Test each thread reuses the connection it had, not the newest"""
+        pool = SQLitePool(self.path, max_size=2)
+        both_held = threading.Barrier(2)
+        first_released = threading.Event()
+        seen = {}
+
+        def borrow(name, release_first):
+            with pool.connection() as conn:
+                first = conn
+                both_held.wait()
+                if not release_first:
+                    first_released.wait()
+            if release_first:
+                first_released.set()
+            time.sleep(0.05)  # Both connections are idle again
+            with pool.connection() as conn:
+                seen[name] = (first, conn)
+
+        threads = [threading.Thread(target=borrow, args=("a", True)),
+                   threading.Thread(target=borrow, args=("b", False))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for name, (first, again) in seen.items():
+            self.assertIs(again, first, name)
+        stats = pool.stats()
+        self.assertEqual(stats["created"], 2)
+        self.assertEqual(stats["reused_own"], 2)
+        pool.close()
+
+    def test_connection_works_and_is_reused(self):
+        """Test a borrowed connection queries the database and is kept"""
+        pool = SQLitePool(self.path)
+        with pool.connection() as conn:
+            row = conn.execute("SELECT name FROM users WHERE id = 1").fetchone()
+        self.assertEqual(row, ("Alice",))
+        with pool.connection() as again:
+            self.assertIs(again, conn)
+        self.assertEqual(pool.stats()["created"], 1)
+        pool.close()
+
+    def test_idle_timeout(self):
+        """Test a connection idle for longer than idle_timeout is closed"""
+        pool = SQLitePool(self.path, idle_timeout=0.05)
+        with pool.connection() as conn:
+            pass
+        time.sleep(0.1)
+        with pool.connection() as again:
+            self.assertIsNot(again, conn)
+        with self.assertRaises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+        stats = pool.stats()
+        self.assertEqual((stats["created"], stats["evicted_idle"]), (2, 1))
+        pool.close()
+
+    def test_borrow_timeout(self):
+        """Test PoolTimeoutError when every connection stays in use"""
+        pool = SQLitePool(self.path, max_size=1, borrow_timeout=0.05)
+        conn = pool.acquire()
+        with self.assertRaises(PoolTimeoutError):
+            pool.acquire()
+        pool.release(conn)
+        pool.close()
+
+    def test_uncommitted_work_is_rolled_back(self):
+        """Test a returned connection does not keep an open transaction"""
+        pool = SQLitePool(self.path)
+        with pool.connection() as conn:
+            conn.execute("INSERT INTO users VALUES (2, 'Bob')")
+        self.assertFalse(conn.in_transaction)
+        with pool.connection() as conn:
+            count = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+        self.assertEqual(count, 1)
+        pool.close()
+
+    def test_users_db_path_override(self):
+        """Test USERS_DB_PATH picks the file unless a path is given"""
+        with patch.dict(os.environ, {"USERS_DB_PATH": self.path}):
+            self.assertEqual(SQLitePool().path, self.path)
+            self.assertEqual(SQLitePool("other.db").path, "other.db")
+            pool = db_pool.get_pool()
+            self.assertEqual(pool.path, self.path)
+            self.assertIs(db_pool.get_pool(self.path), pool)
+            with db_pool.connection() as conn:
+                row = conn.execute("SELECT name FROM users").fetchone()
+            self.assertEqual(row, ("Alice",))
+            pool.close()
+        with patch.dict(os.environ):
+            os.environ.pop("USERS_DB_PATH", None)
+            self.assertEqual(SQLitePool().path, db_pool.DEFAULT_DB_PATH)
+
+
+if __name__ == "__main__":
+    unittest.main()
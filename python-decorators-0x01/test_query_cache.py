@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""Unit tests for the query_cache module"""
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from cache_backends import MmapBackend, SQLiteBackend
+from query_cache import MISS, QueryCache, make_key
+
+SQL = "SELECT * FROM users WHERE id = ?"
+THREADS = 32
+
+
+class SlowQuery:
+    """A stand-in for a query: counts its calls and takes a while"""
+
+    def __init__(self, seconds=0.05):
+        self.seconds = seconds
+        self.calls = 0
+        self.version = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+            self.version += 1
+            version = self.version
+        time.sleep(self.seconds)
+        return [(1, "user", version)]
+
+
+def hammer(cache, query, calls=THREADS * 4, refresh=None):
+    """Calls get_or_compute for one key from a pool of threads"""
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        futures = [pool.submit(cache.get_or_compute, SQL, (1,), query,
+                               refresh=refresh)
+                   for _ in range(calls)]
+        return [future.result() for future in futures]
+
+
+def wait_for(condition, timeout=2.0):
+    """Polls condition until it is true or the timeout passes"""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+class TestQueryCache(unittest.TestCase):
+    """Test case for QueryCache with the in-process backend"""
+
+    def test_key_includes_params(self):
+        """Test the same SQL with different params is cached separately"""
+        cache = QueryCache()
+        cache.set(SQL, (1,), ["one"])
+        cache.set(SQL, (2,), ["two"])
+        self.assertEqual(cache.get("SELECT *  FROM users\nWHERE id = ?;", (1,)),
+                         ["one"])
+        self.assertEqual(cache.get(SQL, (2,)), ["two"])
+        self.assertIs(cache.get(SQL, (3,)), MISS)
+        self.assertNotEqual(make_key(SQL, (1,)), make_key(SQL, (2,)))
+
+    def test_lru_eviction(self):
+        """Test the least recently used entry is evicted first"""
+        cache = QueryCache(max_entries=2)
+        cache.set(SQL, (1,), [1])
+        cache.set(SQL, (2,), [2])
+        cache.get(SQL, (1,))
+        cache.set(SQL, (3,), [3])
+        self.assertIs(cache.get(SQL, (2,)), MISS)
+        self.assertEqual(cache.get(SQL, (1,)), [1])
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_ttl_expiry(self):
+        """Test an entry is a miss once its ttl has passed"""
+        cache = QueryCache(ttl=0.05)
+        cache.set(SQL, (1,), [1])
+        self.assertEqual(cache.get(SQL, (1,)), [1])
+        time.sleep(0.06)
+        self.assertIs(cache.get(SQL, (1,)), MISS)
+        self.assertEqual(cache.stats()["expired"], 1)
+
+    def test_invalidate_tables(self):
+        """Test writes to a table drop the results that read it"""
+        cache = QueryCache()
+        cache.set(SQL, (1,), [1])
+        cache.set("SELECT * FROM orders", None, [2])
+        self.assertEqual(cache.invalidate_tables(["USERS"]), 1)
+        self.assertIs(cache.get(SQL, (1,)), MISS)
+        self.assertEqual(cache.get("SELECT * FROM orders"), [2])
+
+    def test_result_computed_during_write_is_not_cached(self):
+        """Test a result from before an invalidation is discarded"""
+        cache = QueryCache()
+        generation = cache.generation()
+        cache.invalidate_tables(["users"])
+        cache.set(SQL, (1,), [1], generation=generation)
+        self.assertIs(cache.get(SQL, (1,)), MISS)
+
+    def test_record_reads_finds_every_table(self):
+        """Test tables in comma lists and schema-qualified names are recorded"""
+        conn = sqlite3.connect(":memory:")
+        conn.execute("CREATE TABLE users (id INTEGER, name TEXT)")
+        conn.execute("CREATE TABLE orders (user_id INTEGER)")
+        cache = QueryCache()
+        queries = ("SELECT * FROM users, orders",
+                   "SELECT * FROM main.orders")
+        for sql in queries:
+            def compute(sql=sql):
+                with cache.record_reads(conn):
+                    return conn.execute(sql).fetchall()
+            cache.get_or_compute(sql, None, compute)
+        self.assertEqual(cache.invalidate_tables(["orders"]), 2)
+        for sql in queries:
+            self.assertIs(cache.get(sql), MISS)
+
+    def test_record_reads_outside_a_fill(self):
+        """Test record_reads leaves the connection alone outside a fill"""
+        conn = sqlite3.connect(":memory:")
+        with QueryCache().record_reads(conn):
+            self.assertEqual(conn.execute("SELECT 1").fetchall(), [(1,)])
+
+
+class TestStampedeProtection(unittest.TestCase):
+    """Test case for a thread pool hammering a single key"""
+
+    def test_cold_key_is_computed_once(self):
+        """Test concurrent misses coalesce into a single query"""
+        cache = QueryCache()
+        query = SlowQuery()
+        results = hammer(cache, query)
+        self.assertEqual(query.calls, 1)
+        self.assertTrue(all(result == [(1, "user", 1)] for result in results))
+        self.assertGreater(cache.stats()["coalesced"], 0)
+
+    def test_expired_key_is_recomputed_once(self):
+        """Test an expiring hot key sends one caller to the database"""
+        cache = QueryCache(ttl=0.05)
+        query = SlowQuery()
+        hammer(cache, query)
+        time.sleep(0.06)
+        results = hammer(cache, query)
+        self.assertEqual(query.calls, 2)
+        self.assertTrue(all(result == [(1, "user", 2)] for result in results))
+
+    def test_waiters_get_the_error(self):
+        """Test a failed fill raises in every waiting caller and caches nothing"""
+        cache = QueryCache()
+
+        def failing():
+            time.sleep(0.05)
+            raise RuntimeError("database is down")
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            futures = [pool.submit(cache.get_or_compute, SQL, (1,), failing)
+                       for _ in range(8)]
+        for future in futures:
+            self.assertIsInstance(future.exception(), RuntimeError)
+        self.assertIs(cache.get(SQL, (1,)), MISS)
+
+    def test_stale_while_revalidate(self):
+        """Test callers get the stale value while one refresh runs behind"""
+        cache = QueryCache(ttl=0.05, stale_ttl=5)
+        query = SlowQuery(seconds=0.2)
+        cache.get_or_compute(SQL, (1,), query)
+        time.sleep(0.06)
+
+        start = time.perf_counter()
+        results = hammer(cache, query)
+        elapsed = time.perf_counter() - start
+        # Nobody waited for the 0.2s refresh.
+        self.assertLess(elapsed, 0.2)
+        self.assertTrue(all(result == [(1, "user", 1)] for result in results))
+        self.assertTrue(wait_for(lambda: cache.get(SQL, (1,)) == [(1, "user", 2)]))
+        self.assertEqual(query.calls, 2)
+        stats = cache.stats()
+        self.assertEqual(stats["refreshes"], 1)
+        self.assertGreater(stats["stale_hits"], 0)
+
+    def test_refresh_uses_its_own_callable(self):
+        """Test background refreshes call refresh, not compute"""
+        cache = QueryCache(ttl=0.05, stale_ttl=5)
+        query = SlowQuery(seconds=0)
+        refresh = SlowQuery(seconds=0)
+        cache.get_or_compute(SQL, (1,), query)
+        time.sleep(0.06)
+        hammer(cache, query, refresh=refresh)
+        self.assertTrue(wait_for(lambda: refresh.calls == 1))
+        self.assertEqual(query.calls, 1)
+
+    def test_failed_refresh_keeps_stale_value(self):
+        """Test a failing refresh leaves the stale value in place"""
+        cache = QueryCache(ttl=0.05, stale_ttl=5)
+        cache.get_or_compute(SQL, (1,), lambda: ["old"])
+        time.sleep(0.06)
+
+        def failing():
+            raise RuntimeError("database is down")
+
+        self.assertEqual(cache.get_or_compute(SQL, (1,), failing), ["old"])
+        self.assertTrue(wait_for(lambda: cache.stats()["refresh_errors"] == 1))
+        self.assertEqual(cache.get_or_compute(SQL, (1,), failing), ["old"])
+
+    def test_early_expiration(self):
+        """Test XFetch refreshes a hot entry before it expires"""
+        cache = QueryCache(ttl=60, early_expiration=1e9)
+        query = SlowQuery(seconds=0.01)
+        cache.get_or_compute(SQL, (1,), query)
+        results = hammer(cache, query)
+        self.assertTrue(all(result[0][:2] == (1, "user") for result in results))
+        self.assertTrue(wait_for(lambda: query.calls >= 2))
+        self.assertEqual(cache.stats()["misses"], 1)
+
+
+class TestSharedBackends(unittest.TestCase):
+    """Test case for the cross-process backends"""
+
+    def setUp(self):
+        """Create a scratch directory for the cache files"""
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Remove the scratch directory"""
+        shutil.rmtree(self.directory)
+
+    def backends(self):
+        """The shared backends under test"""
+        return (MmapBackend(os.path.join(self.directory, "cache.mmap"),
+                            slots=64, slot_size=4096),
+                SQLiteBackend(os.path.join(self.directory, "cache.sqlite")))
+
+    def test_round_trip_and_invalidation(self):
+        """Test values survive serialization and table invalidation works"""
+        for backend in self.backends():
+            with self.subTest(backend=type(backend).__name__):
+                cache = QueryCache(backend=backend)
+                cache.set(SQL, (1,), [(1, "user", None)])
+                other = QueryCache(backend=type(backend)(backend.path))
+                self.assertEqual(other.get(SQL, (1,)), [(1, "user", None)])
+                other.invalidate_tables(["users"])
+                self.assertIs(cache.get(SQL, (1,)), MISS)
+
+    def test_result_computed_during_write_is_not_cached(self):
+        """Test the shared backends drop a result from before an invalidation"""
+        for backend in self.backends():
+            with self.subTest(backend=type(backend).__name__):
+                cache = QueryCache(backend=backend)
+                generation = cache.generation()
+                cache.invalidate_tables(["users"])
+                cache.set(SQL, (1,), [1], generation=generation)
+                self.assertIs(cache.get(SQL, (1,)), MISS)
+
+    def test_cold_key_is_computed_once(self):
+        """Test concurrent misses coalesce with a shared backend too"""
+        for backend in self.backends():
+            with self.subTest(backend=type(backend).__name__):
+                query = SlowQuery()
+                results = hammer(QueryCache(backend=backend), query)
+                self.assertEqual(query.calls, 1)
+                self.assertTrue(all(result == [(1, "user", 1)]
+                                    for result in results))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Unit tests for the query_logger module"""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from query_logger import BLOCK, DROP, AsyncQueryLogger
+
+
+class NoWriterLogger(AsyncQueryLogger):
+    """A logger without its writer thread: the buffer only empties on close"""
+
+    def _ensure_writer(self):
+        pass
+
+
+def read_messages(path):
+    """Returns the messages in a log file, without their timestamps"""
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [line.split("] ", 1)[1].rstrip("\n") for line in f]
+
+
+class TestAsyncQueryLogger(unittest.TestCase):
+    """Test case for the drop and block policies and rotation"""
+
+    def setUp(self):
+        """Create a temporary directory for the log files"""
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "query_log.txt")
+
+    def tearDown(self):
+        """Remove the temporary directory"""
+        shutil.rmtree(self.directory)
+
+    def test_drop_keeps_newest(self):
+        """Test a full buffer drops the oldest records"""
+        logger = NoWriterLogger(self.path, capacity=4, policy=DROP)
+        for index in range(10):
+            self.assertTrue(logger.log(f"query {index}"))
+        logger.close()
+        self.assertEqual(read_messages(self.path),
+                         [f"query {index}" for index in range(6, 10)])
+        stats = logger.stats()
+        self.assertEqual((stats["logged"], stats["written"], stats["dropped"]),
+                         (10, 4, 6))
+
+    def test_block_loses_nothing(self):
+        """Test the block policy writes every record through a small buffer"""
+        logger = AsyncQueryLogger(self.path, capacity=2, policy=BLOCK,
+                                  flush_size=2, flush_interval=0.01)
+        for index in range(200):
+            self.assertTrue(logger.log(f"query {index}"))
+        logger.close()
+        self.assertEqual(read_messages(self.path),
+                         [f"query {index}" for index in range(200)])
+        self.assertEqual(logger.stats()["dropped"], 0)
+
+    def test_block_then_close(self):
+        """Test a caller blocked when the logger closes gets False"""
+        logger = NoWriterLogger(self.path, capacity=1, policy=BLOCK)
+        self.assertTrue(logger.log("first"))
+        results = []
+        caller = threading.Thread(
+            target=lambda: results.append(logger.log("second")))
+        caller.start()
+        time.sleep(0.1)  # Let the caller block on the full buffer
+        logger.close()
+        caller.join(5)
+        self.assertFalse(caller.is_alive())
+        self.assertEqual(results, [False])
+        self.assertEqual(read_messages(self.path), ["first"])
+        stats = logger.stats()
+        self.assertEqual((stats["logged"], stats["written"], stats["pending"]),
+                         (1, 1, 0))
+
+    def test_log_after_close(self):
+        """Test logging to a closed logger is refused"""
+        logger = AsyncQueryLogger(self.path)
+        logger.close()
+        self.assertFalse(logger.log("late"))
+
+    def test_rotation(self):
+        """Test the file is rotated and only backup_count files are kept"""
+        logger = AsyncQueryLogger(self.path, flush_size=1, max_bytes=1,
+                                  backup_count=2)
+        for index in range(4):
+            logger.log(f"query {index}")
+            self.assertTrue(logger.flush(timeout=5))
+        logger.close()
+        self.assertEqual(read_messages(self.path + ".1"), ["query 3"])
+        self.assertEqual(read_messages(self.path + ".2"), ["query 2"])
+        self.assertFalse(os.path.exists(self.path + ".3"))
+        self.assertEqual(logger.stats()["rotations"], 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""Unit tests for the query_profiler module"""
+
+import unittest
+from query_profiler import QueryProfiler, QueryStats, fingerprint, profile_queries
+
+
+class TestFingerprint(unittest.TestCase):
+    """Test case for query fingerprints"""
+
+    def test_literals(self):
+        """Test string and number literals are replaced"""
+        self.assertEqual(
+            fingerprint("SELECT * FROM users WHERE id = 42 AND name = 'Bob'"),
+            "SELECT * FROM users WHERE id = ? AND name = ?")
+        self.assertEqual(fingerprint("SELECT * FROM t WHERE x > -1.5e3"),
+                         "SELECT * FROM t WHERE x > ?")
+
+    def test_same_query_different_literals(self):
+        """Test queries differing only in literals share a fingerprint"""
+        self.assertEqual(fingerprint("SELECT * FROM users WHERE id = 1"),
+                         fingerprint("SELECT  *  FROM users\nWHERE id = 2;"))
+
+    def test_quotes_and_identifiers(self):
+        """Test escaped quotes and digits in names are handled"""
+        self.assertEqual(
+            fingerprint("SELECT col1 FROM t2 WHERE name = 'it''s' OR x = \"a\""),
+            "SELECT col1 FROM t2 WHERE name = ? OR x = ?")
+
+    def test_in_list(self):
+        """Test IN lists of any length collapse to one form"""
+        self.assertEqual(fingerprint("SELECT * FROM t WHERE id IN (1, 2, 3)"),
+                         "SELECT * FROM t WHERE id IN (...)")
+        self.assertEqual(fingerprint("SELECT * FROM t WHERE id in (7)"),
+                         "SELECT * FROM t WHERE id IN (...)")
+
+
+class TestQueryStats(unittest.TestCase):
+    """Test case for the power-of-two latency buckets"""
+
+    def test_buckets(self):
+        """Test each call lands in the bucket below the next power of two"""
+        stats = QueryStats("q")
+        for seconds in (0.5e-6, 1e-6, 1.5e-6, 3e-6, 1000e-6, 1024e-6):
+            stats.add(seconds)
+        self.assertEqual(stats.as_dict()["histogram"],
+                         {"<1us": 1, "<2us": 2, "<4us": 1, "<1024us": 1,
+                          "<2048us": 1})
+
+    def test_percentile(self):
+        """Test percentiles are bucket upper bounds capped by the maximum"""
+        stats = QueryStats("q")
+        for _ in range(99):
+            stats.add(10e-6)
+        stats.add(0.5)
+        self.assertEqual(stats.percentile(0.5), 16e-6)
+        self.assertEqual(stats.percentile(1.0), 0.5)
+        self.assertEqual(QueryStats("q").percentile(0.5), 0.0)
+
+
+class TestQueryProfiler(unittest.TestCase):
+    """Test case for QueryProfiler and the slow-query log"""
+
+    def setUp(self):
+        """Create a profiler that collects its slow-query messages"""
+        self.messages = []
+        self.profiler = QueryProfiler(slow_threshold=0.1,
+                                      slow_log=self.messages.append)
+
+    def test_slow_log(self):
+        """Test only calls at or above the threshold are logged"""
+        self.profiler.record("SELECT * FROM users WHERE id = ?", 0.05, rows=1,
+                             params=(1,))
+        self.profiler.record("SELECT * FROM users WHERE id = ?", 0.25, rows=3,
+                             params=(2,))
+        self.profiler.record("DELETE FROM users", 0.1,
+                             error=ValueError("locked"))
+        self.assertEqual(self.messages, [
+            "Slow query (250.0 ms, 3 rows): "
+            "SELECT * FROM users WHERE id = ? params=(2,)",
+            "Slow query (100.0 ms, failed: locked): "
+            "DELETE FROM users params=None",
+        ])
+
+    def test_report(self):
+        """Test calls are grouped by fingerprint, most expensive first"""
+        self.profiler.record("SELECT * FROM users WHERE id = 1", 0.01, rows=1)
+        self.profiler.record("SELECT * FROM users WHERE id = 2", 0.01, rows=1)
+        self.profiler.record("SELECT * FROM users", 0.001, rows=50)
+        top = self.profiler.report()
+        self.assertEqual([row["fingerprint"] for row in top],
+                         ["SELECT * FROM users WHERE id = ?",
+                          "SELECT * FROM users"])
+        self.assertEqual((top[0]["count"], top[0]["rows"]), (2, 2))
+        with self.assertRaises(ValueError):
+            self.profiler.report(by="name")
+
+    def test_profile_queries(self):
+        """Test the decorator records rows, params and errors"""
+        @profile_queries(self.profiler)
+        def run(query, params=None):
+            if "bad" in query:
+                raise ValueError("bad query")
+            return [(1,), (2,)]
+
+        self.assertEqual(run("SELECT id FROM users WHERE age > ?", (30,)),
+                         [(1,), (2,)])
+        with self.assertRaises(ValueError):
+            run(query="SELECT bad")
+        rows = {row["fingerprint"]: row for row in self.profiler.report()}
+        self.assertEqual(rows["SELECT id FROM users WHERE age > ?"]["rows"], 2)
+        self.assertEqual(rows["SELECT bad"]["errors"], 1)
+
+    def test_profile_queries_without_query(self):
+        """Test a call without a query string is passed through unrecorded"""
+        @profile_queries(self.profiler)
+        def count(limit):
+            return limit
+
+        self.assertEqual(count(3), 3)
+        self.assertEqual(self.profiler.report(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""Unit tests for the 3-retry_on_failure module"""
+
+import contextlib
+import io
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# Importing the module runs its demo query; point it at a scratch database.
+_directory = tempfile.mkdtemp()
+_path = os.path.join(_directory, "users.db")
+_setup = sqlite3.connect(_path)
+_setup.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT)")
+_setup.close()
+with patch.dict(os.environ, {"USERS_DB_PATH": _path}), \
+        contextlib.redirect_stdout(io.StringIO()):
+    retry = __import__('3-retry_on_failure')
+
+
+def tearDownModule():
+    """Remove the scratch database"""
+    shutil.rmtree(_directory)
+
+
+class Flaky:
+    """A function that raises the given errors in turn, then returns 'ok'"""
+
+    def __init__(self, *errors):
+        self.__name__ = "flaky"
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self, *args):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+def locked():
+    """A transient error"""
+    return sqlite3.OperationalError("database is locked")
+
+
+class TestRetryBudget(unittest.TestCase):
+    """Test case for the RetryBudget token bucket"""
+
+    def test_exhaustion(self):
+        """Test withdrawals stop when the tokens run out"""
+        budget = retry.RetryBudget(ratio=0.5, capacity=2)
+        self.assertTrue(budget.withdraw())
+        self.assertTrue(budget.withdraw())
+        self.assertFalse(budget.withdraw())
+        self.assertEqual(budget.tokens, 0)
+
+    def test_refill(self):
+        """Test calls refill the bucket by ratio, up to capacity"""
+        budget = retry.RetryBudget(ratio=0.5, capacity=2)
+        budget.withdraw()
+        budget.withdraw()
+        budget.deposit()
+        self.assertFalse(budget.withdraw())
+        budget.deposit()
+        self.assertTrue(budget.withdraw())
+        for _ in range(10):
+            budget.deposit()
+        self.assertEqual(budget.tokens, 2)
+
+
+class TestRetryOnFailure(unittest.TestCase):
+    """Test case for which errors retry_on_failure retries"""
+
+    def setUp(self):
+        """Use a private budget and metrics for each test"""
+        self.budget = retry.RetryBudget(ratio=0.1, capacity=10)
+        self.metrics = retry.RetryMetrics()
+
+    def decorate(self, func, retries=3):
+        """Wraps func with retry_on_failure without sleeping"""
+        return retry.retry_on_failure(retries=retries, delay=0,
+                                      budget=self.budget,
+                                      metrics=self.metrics)(func)
+
+    def test_transient_error_is_retried(self):
+        """Test a locked database is retried until the call succeeds"""
+        func = Flaky(locked(), locked())
+        self.assertEqual(self.decorate(func)(), "ok")
+        self.assertEqual(func.calls, 3)
+        stats = self.metrics.snapshot()
+        self.assertEqual((stats["retries"], stats["recovered"]), (2, 1))
+
+    def test_non_transient_errors_are_not_retried(self):
+        """Test errors that would fail again are raised at once"""
+        for error in (sqlite3.OperationalError("no such table: users"),
+                      sqlite3.IntegrityError("UNIQUE constraint failed"),
+                      ValueError("bad argument")):
+            with self.subTest(error=error):
+                func = Flaky(error)
+                with self.assertRaises(type(error)):
+                    self.decorate(func)()
+                self.assertEqual(func.calls, 1)
+        stats = self.metrics.snapshot()
+        self.assertEqual((stats["not_retryable"], stats["retries"]), (3, 0))
+
+    def test_retries_exhausted(self):
+        """Test the last error is raised after the given retries"""
+        func = Flaky(*(locked() for _ in range(5)))
+        with self.assertRaises(sqlite3.OperationalError):
+            self.decorate(func, retries=2)()
+        self.assertEqual(func.calls, 3)
+        self.assertEqual(self.metrics.snapshot()["exhausted"], 1)
+
+    def test_budget_exhausted(self):
+        """Test an empty budget stops retries after the first attempt"""
+        self.budget = retry.RetryBudget(ratio=0.1, capacity=1)
+        self.assertTrue(self.budget.withdraw())
+        func = Flaky(locked())
+        with self.assertRaises(sqlite3.OperationalError):
+            self.decorate(func)()
+        self.assertEqual(func.calls, 1)
+        self.assertEqual(self.metrics.snapshot()["budget_exhausted"], 1)
+
+    def test_rollback_between_attempts(self):
+        """Test a retry starts from a clean transaction"""
+        conn = sqlite3.connect(":memory:")
+        conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY)")
+        attempts = []
+
+        def insert(conn):
+            attempts.append(conn.execute("SELECT COUNT(*) FROM users")
+                            .fetchone()[0])
+            conn.execute("INSERT INTO users VALUES (1)")
+            if len(attempts) == 1:
+                raise locked()
+            return "ok"
+
+        self.assertEqual(self.decorate(insert)(conn), "ok")
+        self.assertEqual(attempts, [0, 0])
+        conn.close()
+
+
+class TestHelpers(unittest.TestCase):
+    """Test case for is_transient and backoff_delay"""
+
+    def test_is_transient(self):
+        """Test only lock and busy errors are transient"""
+        self.assertTrue(retry.is_transient(locked()))
+        self.assertTrue(retry.is_transient(
+            sqlite3.OperationalError("Database is BUSY")))
+        self.assertFalse(retry.is_transient(
+            sqlite3.OperationalError("near \"SELEC\": syntax error")))
+        self.assertFalse(retry.is_transient(
+            sqlite3.DatabaseError("database is locked")))
+        self.assertFalse(retry.is_transient(TimeoutError()))
+
+    def test_backoff_delay(self):
+        """Test the delay is jittered below a doubling, capped limit"""
+        for attempt, limit in ((0, 0.5), (1, 1.0), (2, 2.0), (10, 3.0)):
+            delays = [retry.backoff_delay(attempt, 0.5, 3.0)
+                      for _ in range(200)]
+            self.assertTrue(all(0 <= delay <= limit for delay in delays))
+            self.assertGreater(max(delays), limit / 2)
+        with patch("random.uniform", side_effect=lambda low, high: high):
+            self.assertEqual(retry.backoff_delay(3, 1, 30), 8)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,44 +2,119 @@
 """
 This module contains a generator function that streams user data
 row by row from a MySQL database.
+
+The rows are streamed with an unbuffered cursor: MySQL sends them as the
+client reads them, so memory use does not depend on the table size.
 """
+import resource
+import sys
+import time
+import tracemalloc
 import seed  # Import the seed module to use its connection functions
+import row_formats
+
+# Rows read from the socket per fetchmany() call while streaming.
+DEFAULT_READ_AHEAD = 100
 
-def stream_users():
+def stream_users(read_ahead=DEFAULT_READ_AHEAD, buffered=False,
+                 row_format="dict"):
     """
     A generator function that connects to the ALX_prodev database
     and yields user rows one by one.
 
-    Each row is returned as a dictionary for easy access to column data.
+    By default each row is returned as a dictionary for easy access to
+    column data. row_format selects a lighter shape instead: "tuple",
+    "namedtuple" or "record" (see row_formats.py).
+
+    Args:
+        read_ahead (int): How many rows to pull from the socket per fetchmany()
+            call. Larger values mean fewer calls, smaller ones less memory.
+        buffered (bool): Load the whole result set into memory before the
+            first row is yielded. Only useful for comparison in the benchmark.
+        row_format (str): "dict", "tuple", "namedtuple" or "record".
     """
-    connection = None
-    cursor = None
+    row_formats.check_format(row_format)
     try:
-        # Establish a connection to the database
-        connection = seed.connect_to_prodev()
-        if not connection:
-            # If connection fails, the generator stops
-            return
+        # Borrow a connection from the shared pool. It goes back to the pool
+        # when the with block ends, or is closed if the block ends with an
+        # error or because the consumer stopped early.
+        with seed.pooled_connection() as connection:
+            if not connection:
+                # If connection fails, the generator stops
+                return
 
-        # Using dictionary=True makes the cursor return rows as dictionaries
-        # (e.g., {'user_id': '...', 'name': '...'}), which matches the expected output.
-        cursor = connection.cursor(dictionary=True)
+            # Using dictionary=True makes the cursor return rows as dictionaries
+            # (e.g., {'user_id': '...', 'name': '...'}), which matches the expected output.
+            # buffered=False keeps the result set on the server side of the
+            # socket (mysql_use_result) instead of copying it all into this
+            # process, so memory stays flat however large the table is.
+            # The other formats start from plain tuples, which are far cheaper.
+            cursor = connection.cursor(dictionary=(row_format == "dict"),
+                                       buffered=buffered)
 
-        # Execute the query to fetch all users
-        cursor.execute("SELECT * FROM user_data ORDER BY name;")
+            # Execute the query to fetch all users
+            cursor.execute("SELECT * FROM user_data ORDER BY name;")
+            convert = None
+            if row_format != "dict":
+                convert = row_formats.row_converter(row_format,
+                                                    cursor.column_names)
 
-        # This is the single loop required by the instructions.
-        # The cursor itself is an iterator, so we can loop over it.
-        # It fetches rows from the database as needed, not all at once.
-        for row in cursor:
-            yield row
+            exhausted = False
+            try:
+                # This is the single loop required by the instructions.
+                # Each fetchmany() reads only the next read_ahead rows off the
+                # wire, so the first row is yielded as soon as it arrives.
+                while True:
+                    rows = cursor.fetchmany(read_ahead)
+                    if not rows:
+                        break
+                    yield from (rows if convert is None else map(convert, rows))
+                exhausted = True
+            finally:
+                # Only close the cursor once the result is fully read:
+                # mysql.connector's cursor.close() would otherwise read the
+                # remaining rows first. If the consumer stopped early, the
+                # pool closes the whole connection (and the cursor with it)
+                # instead of resetting it.
+                if exhausted:
+                    cursor.close()
 
     except Exception as e:
         print(f"An error occurred while streaming users: {e}")
-    finally:
-        # Ensure the cursor and connection are closed properly
-        if cursor:
-            cursor.close()
-        if connection and connection.is_connected():
-            connection.close()
 
+
+def benchmark_memory(buffered=False):
+    """
+    Streams every user and prints the time to the first row, the total time
+    and the peak memory of this process.
+
+    Peak RSS only ever grows, so compare modes in separate processes:
+        python3 0-stream_users.py streaming
+        python3 0-stream_users.py buffered
+
+    Args:
+        buffered (bool): Benchmark the buffered cursor instead of streaming.
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    first_row_at = None
+    count = 0
+    for _ in stream_users(buffered=buffered):
+        if first_row_at is None:
+            first_row_at = time.perf_counter() - start
+        count += 1
+    total = time.perf_counter() - start
+    _, peak_traced = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # ru_maxrss is in kilobytes on Linux.
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    mode = "buffered" if buffered else "streaming"
+    print(f"{mode}: {count} rows in {total:.2f}s, "
+          f"first row after {(first_row_at or 0) * 1000:.1f} ms, "
+          f"peak Python heap {peak_traced / 2**20:.1f} MiB, "
+          f"peak RSS {peak_rss_mb:.1f} MiB")
+
+
+if __name__ == "__main__":
+    benchmark_memory(buffered=len(sys.argv) > 1 and sys.argv[1] == "buffered")
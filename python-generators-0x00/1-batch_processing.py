@@ -3,61 +3,146 @@
 This module contains functions to stream and process user data in batches
 for improved performance when handling large datasets.
 """
+import time
 import seed  # Import the seed module for database connection
+import row_formats
+from adaptive_batching import observe_batch, size_of
+from prefetch import prefetch as prefetched
+from query_builder import Query
 
-def stream_users_in_batches(batch_size=50):
+def stream_users_in_batches(batch_size=50, row_format="dict", query=None,
+                            prefetch=0, raise_errors=False):
     """
     A generator function that connects to the database and yields
     batches of user rows.
 
     Args:
-        batch_size (int): The number of rows to fetch in each batch.
+        batch_size (int or AdaptiveBatchSizer): The number of rows to fetch
+            in each batch, or a sizer that adapts it after every batch.
+        row_format (str): "dict" (default), "tuple", "namedtuple", "record",
+            or "columnar" for one array per column (see row_formats.py).
+        query (Query): Optional filters/projection to push into MySQL.
+            Defaults to every user, ordered by name.
+        prefetch (int): Batches a background thread fetches ahead of the
+            consumer, so fetching overlaps with processing. 0 (the default)
+            fetches each batch only when it is asked for.
+        raise_errors (bool): Raise connection and query errors instead of
+            printing them and ending the stream. Callers that must not
+            mistake a failure for the end of the table (e.g. export.py)
+            set this.
 
     Yields:
-        list: A list of dictionaries, where each dictionary represents a user.
+        list: A list of dictionaries, where each dictionary represents a user,
+            or a list of rows in the requested format. Columnar batches are
+            a dict of column name to array instead.
     """
-    connection = None
-    cursor = None
+    row_formats.check_format(row_format, row_formats.BATCH_FORMATS)
+    if prefetch > 0:
+        yield from prefetched(
+            stream_users_in_batches(batch_size, row_format, query,
+                                    raise_errors=raise_errors), prefetch
+        )
+        return
+
     try:
-        connection = seed.connect_to_prodev()
-        if not connection:
-            return
-
-        # Use a dictionary cursor to get rows as dictionaries
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM user_data ORDER BY name;")
-
-        # This is the first loop (the main fetching loop)
-        while True:
-            # fetchmany() is an efficient way to get a specific number of rows
-            batch = cursor.fetchmany(batch_size)
-            
-            # If fetchmany returns an empty list, we've reached the end
-            if not batch:
-                break
-            
-            # Yield the entire batch (a list of user dictionaries)
-            yield batch
+        with seed.pooled_connection() as connection:
+            if not connection:
+                if raise_errors:
+                    raise ConnectionError("Could not connect to ALX_prodev")
+                return
+
+            # Use a dictionary cursor to get rows as dictionaries; every
+            # other format is built from the cheaper plain tuples.
+            cursor = connection.cursor(dictionary=(row_format == "dict"))
+            if query is None:
+                cursor.execute("SELECT * FROM user_data ORDER BY name;")
+            else:
+                cursor.execute(*query.build())
+            column_names = cursor.column_names
+
+            # This is the first loop (the main fetching loop)
+            while True:
+                # fetchmany() is an efficient way to get a specific number of rows
+                start = time.perf_counter()
+                batch = cursor.fetchmany(size_of(batch_size))
+
+                # If fetchmany returns an empty list, we've reached the end
+                if not batch:
+                    break
+                observe_batch(batch_size, batch, time.perf_counter() - start)
+
+                if row_format != "dict":
+                    batch = row_formats.convert_batch(batch, row_format,
+                                                      column_names)
+
+                # Yield the entire batch (a list of user dictionaries)
+                yield batch
+
+            cursor.close()
 
     except Exception as e:
+        if raise_errors:
+            raise
         print(f"An error occurred while streaming batches: {e}")
-    finally:
-        if cursor:
-            cursor.close()
-        if connection and connection.is_connected():
-            connection.close()
 
 
-def batch_processing(batch_size=50):
+def batch_processing(batch_size=50, row_format="dict", pushdown=True):
     """
     Processes batches of users to filter and print users older than 25.
 
     Args:
         batch_size (int): The size of the batches to process.
+        row_format (str): "dict" filters user by user; "columnar" applies
+            the age filter to a whole batch at once (vectorised with NumPy
+            when it is installed).
+        pushdown (bool): Let MySQL apply the age filter, so only matching
+            users are sent over the network. False streams every user and
+            filters in Python.
     """
+    if pushdown:
+        older_users = Query().where("age", ">", 25).order_by("name")
+        for user_batch in stream_users_in_batches(batch_size, row_format,
+                                                  query=older_users):
+            if row_format == "columnar":
+                user_batch = row_formats.iter_columnar_rows(user_batch)
+            for user in user_batch:
+                print(user)
+        return
+
+    if row_format == "columnar":
+        for user_batch in stream_users_in_batches(batch_size, "columnar"):
+            older = row_formats.filter_columnar(user_batch, "age", ">", 25)
+            for user in row_formats.iter_columnar_rows(older):
+                print(user)
+        return
+
     # This is the second loop (iterating over the batches yielded by the generator)
     for user_batch in stream_users_in_batches(batch_size):
         # This is the third loop (iterating over users within a single batch)
         for user in user_batch:
             if user.get('age', 0) > 25:
                 print(user)
+
+
+def benchmark_prefetch(batch_size=1000, process_seconds=0.01, depth=2):
+    """
+    Times a full batch scan where each batch takes process_seconds to
+    process, with and without prefetching.
+
+    Args:
+        batch_size (int): The number of rows per batch.
+        process_seconds (float): Simulated processing time per batch.
+        depth (int): The prefetch depth to compare against no prefetch.
+    """
+    for label, prefetch in (("no prefetch", 0), (f"prefetch={depth}", depth)):
+        start = time.perf_counter()
+        batches = 0
+        for _ in stream_users_in_batches(batch_size, prefetch=prefetch):
+            time.sleep(process_seconds)
+            batches += 1
+        elapsed = time.perf_counter() - start
+        print(f"{label:<12} {batches} batches in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    benchmark_prefetch()
@@ -3,42 +3,75 @@
 This module demonstrates memory-efficient aggregation by using a generator
 to calculate the average age of all users in a database without
 loading the entire dataset into memory.
+
+When the database can compute the aggregate itself, calculate_average_age
+asks it to with AVG(), so a single row crosses the network instead of
+every age. The streaming path is kept as the fallback.
 """
 import seed  # Import the seed module for database connection
+import query_builder
+import streaming_stats
 
 def stream_user_ages():
     """
     A generator that connects to the database and yields the age
     of each user, one by one.
     """
-    connection = None
-    cursor = None
     try:
-        connection = seed.connect_to_prodev()
-        if not connection:
-            return
+        with seed.pooled_connection() as connection:
+            if not connection:
+                return
+
+            cursor = connection.cursor()
+            # We only need the 'age' column, which is more efficient
+            cursor.execute("SELECT age FROM user_data")
 
-        cursor = connection.cursor()
-        # We only need the 'age' column, which is more efficient
-        cursor.execute("SELECT age FROM user_data")
+            # This is the first loop, iterating through the cursor
+            for row in cursor:
+                yield row[0]  # Yield only the age value (the first column)
 
-        # This is the first loop, iterating through the cursor
-        for row in cursor:
-            yield row[0]  # Yield only the age value (the first column)
+            cursor.close()
 
     except Exception as e:
         print(f"An error occurred while streaming ages: {e}")
-    finally:
-        if cursor:
+
+
+def stream_column_values(column, batch_size=1000):
+    """
+    A generator that yields every value of one numeric user_data column.
+
+    Args:
+        column (str): The column to stream, e.g. "age".
+        batch_size (int): Rows fetched per round trip.
+    """
+    sql, params = query_builder.Query().select(column).build()
+    try:
+        with seed.pooled_connection() as connection:
+            if not connection:
+                return
+
+            cursor = connection.cursor()
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield row[0]
+
             cursor.close()
-        if connection and connection.is_connected():
-            connection.close()
+
+    except Exception as e:
+        print(f"An error occurred while streaming {column}: {e}")
 
 
-def calculate_average_age():
+def average_age_streaming():
     """
     Consumes the stream_user_ages generator to calculate the average
     age in a memory-efficient manner.
+
+    Returns:
+        float: The average age, or 0 if there are no users.
     """
     total_age = 0
     user_count = 0
@@ -47,15 +80,75 @@ def calculate_average_age():
     for age in stream_user_ages():
         total_age += age
         user_count += 1
-    
+
     if user_count == 0:
-        average_age = 0
-    else:
-        average_age = total_age / user_count
+        return 0
+    return total_age / user_count
+
+
+def average_age_pushdown():
+    """
+    Lets MySQL compute the average age with AVG().
+
+    Returns:
+        float: The average age, or 0 if there are no users.
+    """
+    average, = query_builder.aggregate(query_builder.Query(), ("AVG", "age"))
+    return float(average) if average is not None else 0
+
+
+def age_histogram(bucket_width=10):
+    """
+    Counts users per age bucket (0-9, 10-19, ...) inside MySQL.
+
+    Args:
+        bucket_width (int): The width of each age bucket.
+
+    Returns:
+        dict: bucket start mapped to user count.
+    """
+    return query_builder.histogram(query_builder.Query(), "age", bucket_width)
+
+
+def calculate_average_age(pushdown=True):
+    """
+    Prints the average age of all users.
+
+    Args:
+        pushdown (bool): Try the AVG() query first and only fall back to
+            streaming every age if it fails. False always streams.
+    """
+    average_age = None
+    if pushdown:
+        try:
+            average_age = average_age_pushdown()
+        except Exception as e:
+            print(f"AVG() pushdown failed, streaming ages instead: {e}")
+    if average_age is None:
+        average_age = average_age_streaming()
 
     print(f"Average age of users: {average_age:.2f}")
 
 
+def calculate_age_statistics(bucket_width=10):
+    """
+    Computes count, mean, variance, min/max, quantiles and a histogram of
+    the users' ages in one pass over stream_user_ages, with bounded memory.
+
+    Args:
+        bucket_width (int): The width of each histogram bucket.
+
+    Returns:
+        dict: See streaming_stats.StreamSummary.result().
+    """
+    summary = streaming_stats.summarize(stream_user_ages(), bucket_width)
+    print(f"Users: {summary['count']}, mean age {summary['mean']:.2f}, "
+          f"stddev {summary['stddev']:.2f}, range {summary['min']}-{summary['max']}")
+    print("Age quantiles: " + ", ".join(
+        f"p{int(q * 100)}={value}" for q, value in summary['quantiles'].items()))
+    return summary
+
+
 if __name__ == "__main__":
     # This block makes the script runnable from the command line
     calculate_average_age()
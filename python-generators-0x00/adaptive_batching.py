@@ -0,0 +1,157 @@
+#!/usr/bin/python3
+"""
+This module picks batch sizes at runtime instead of hardcoding them.
+
+A good batch size depends on how wide the rows are and how far away the
+database is: narrow rows over a slow link want big batches, wide rows want
+small ones. AdaptiveBatchSizer watches how long each batch took to fetch and
+how much memory it used, and steers the next size towards a target latency
+while staying within a memory budget.
+
+Pass a sizer anywhere a batch or page size is accepted:
+    sizer = AdaptiveBatchSizer(target_seconds=0.05)
+    for batch in stream_users_in_batches(sizer):
+        ...
+    print(sizer.report())
+"""
+import sys
+
+
+def estimate_batch_bytes(batch):
+    """
+    Roughly estimates the memory used by a list of rows.
+
+    Only the first row is measured (container plus values), which is
+    accurate enough for rows of a single table.
+
+    Args:
+        batch (list): Rows as dicts, tuples or other sequences.
+
+    Returns:
+        int: The estimated size of the batch in bytes.
+    """
+    if not batch:
+        return 0
+    row = batch[0]
+    values = row.values() if isinstance(row, dict) else row
+    row_bytes = sys.getsizeof(row) + sum(sys.getsizeof(value) for value in values)
+    return sys.getsizeof(batch) + row_bytes * len(batch)
+
+
+class AdaptiveBatchSizer:
+    """
+    Chooses the next batch size from the measurements of previous batches.
+
+    Args:
+        initial (int): The size of the first batch.
+        minimum (int): Never go below this size.
+        maximum (int): Never go above this size.
+        target_seconds (float): The time one batch should take to fetch.
+        memory_budget (int): The most bytes one batch may occupy.
+        max_step (float): The largest factor by which the size may grow or
+            shrink between two batches, which keeps it from oscillating.
+        smoothing (float): Weight of the newest measurement in the running
+            averages (0 < smoothing <= 1).
+    """
+
+    def __init__(self, initial=50, minimum=10, maximum=50000,
+                 target_seconds=0.05, memory_budget=16 * 2**20,
+                 max_step=2.0, smoothing=0.5):
+        if not minimum <= initial <= maximum:
+            raise ValueError("initial must be between minimum and maximum")
+        self.size = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_seconds = target_seconds
+        self.memory_budget = memory_budget
+        self.max_step = max_step
+        self.smoothing = smoothing
+        self.seconds_per_row = None
+        self.bytes_per_row = None
+        self.sizes = []
+
+    def _smooth(self, current, measured):
+        """Exponentially weighted moving average."""
+        if current is None:
+            return measured
+        return current + self.smoothing * (measured - current)
+
+    def observe(self, rows, seconds, nbytes=None):
+        """
+        Records one batch and computes the size of the next.
+
+        Args:
+            rows (int): The number of rows the batch held.
+            seconds (float): How long fetching it took.
+            nbytes (int): Its estimated memory use, if known.
+
+        Returns:
+            int: The size to request next.
+        """
+        self.sizes.append(self.size)
+        if rows <= 0:
+            return self.size
+
+        self.seconds_per_row = self._smooth(self.seconds_per_row, seconds / rows)
+        if nbytes:
+            self.bytes_per_row = self._smooth(self.bytes_per_row, nbytes / rows)
+
+        if self.seconds_per_row > 0:
+            ideal = self.target_seconds / self.seconds_per_row
+        else:
+            ideal = self.maximum
+        if self.bytes_per_row:
+            ideal = min(ideal, self.memory_budget / self.bytes_per_row)
+
+        ideal = max(self.size / self.max_step, min(ideal, self.size * self.max_step))
+        self.size = int(max(self.minimum, min(self.maximum, ideal)))
+        return self.size
+
+    def report(self):
+        """
+        Summarises the sizes chosen so far.
+
+        Returns:
+            dict: batches, first/last/min/max/mean size and the measured
+                seconds and bytes per row.
+        """
+        sizes = self.sizes or [self.size]
+        return {
+            "batches": len(self.sizes),
+            "first_size": sizes[0],
+            "last_size": sizes[-1],
+            "next_size": self.size,
+            "min_size": min(sizes),
+            "max_size": max(sizes),
+            "mean_size": sum(sizes) / len(sizes),
+            "seconds_per_row": self.seconds_per_row,
+            "bytes_per_row": self.bytes_per_row,
+        }
+
+
+def size_of(batch_size):
+    """
+    Returns the size to fetch next for a fixed size or a sizer.
+
+    Args:
+        batch_size (int or AdaptiveBatchSizer): The caller's batch size.
+
+    Returns:
+        int: The number of rows to fetch.
+    """
+    if isinstance(batch_size, AdaptiveBatchSizer):
+        return batch_size.size
+    return batch_size
+
+
+def observe_batch(batch_size, batch, seconds):
+    """
+    Feeds a fetched batch back to a sizer; does nothing for a fixed size.
+
+    Args:
+        batch_size (int or AdaptiveBatchSizer): The caller's batch size.
+        batch (list): The rows that were fetched.
+        seconds (float): How long the fetch took.
+    """
+    if isinstance(batch_size, AdaptiveBatchSizer):
+        batch_size.observe(len(batch), seconds, estimate_batch_bytes(batch))
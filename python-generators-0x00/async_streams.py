@@ -0,0 +1,272 @@
+#!/usr/bin/python3
+"""
+This module contains asynchronous counterparts of the generator modules.
+
+The synchronous generators block on mysql.connector, so a single worker can
+only drive one stream at a time. These async generators use aiomysql and an
+async connection pool, so one event loop can interleave many streams.
+
+Each stream can prefetch: a background task fetches up to `prefetch` batches
+ahead into a bounded queue while the consumer is still working on the
+current one. The bounded queue is the backpressure: when the consumer falls
+behind, the fetcher waits instead of buffering the whole table.
+
+Running this file benchmarks N concurrent full scans in one process:
+    python3 async_streams.py 8
+"""
+import asyncio
+import os
+import sys
+import time
+
+try:
+    import aiomysql
+except ImportError:  # aiomysql is optional; only opening the pool needs it
+    aiomysql = None
+
+_paginate = __import__('2-lazy_paginate')
+
+# One pool per event loop: aiomysql pools are bound to the loop that made them.
+_pools = {}
+
+
+async def get_async_pool():
+    """
+    Returns the async pool of ALX_prodev connections for the running loop.
+
+    The pool size follows the DB_POOL_SIZE environment variable, like
+    seed.get_pool().
+    """
+    loop = asyncio.get_running_loop()
+    pool = _pools.get(loop)
+    if pool is None:
+        if aiomysql is None:
+            raise ImportError("async_streams needs aiomysql "
+                              "(pip install aiomysql)")
+        pool = await aiomysql.create_pool(
+            host=os.getenv('DB_HOST', 'localhost'),
+            user=os.getenv('DB_USER'),
+            password=os.getenv('DB_PASSWORD') or '',
+            db='ALX_prodev',
+            minsize=1,
+            maxsize=int(os.getenv('DB_POOL_SIZE', '5')),
+            autocommit=True
+        )
+        _pools[loop] = pool
+    return pool
+
+
+async def close_async_pool():
+    """Closes the running loop's pool and waits for its connections."""
+    pool = _pools.pop(asyncio.get_running_loop(), None)
+    if pool is not None:
+        pool.close()
+        await pool.wait_closed()
+
+
+async def _prefetched(source, depth):
+    """
+    Re-yields an async generator while a task reads `depth` items ahead.
+
+    Args:
+        source: The async generator to read from.
+        depth (int): The maximum number of items fetched but not yet consumed.
+
+    Yields:
+        The items of source, in order.
+    """
+    queue = asyncio.Queue(maxsize=depth)
+    done = object()
+
+    async def produce():
+        try:
+            async for item in source:
+                await queue.put(item)
+        finally:
+            await source.aclose()
+        await queue.put(done)
+
+    producer = asyncio.ensure_future(produce())
+    try:
+        while True:
+            getter = asyncio.ensure_future(queue.get())
+            # Wake up if the producer fails, instead of waiting forever.
+            await asyncio.wait({getter, producer},
+                               return_when=asyncio.FIRST_COMPLETED)
+            if not getter.done():
+                getter.cancel()
+                producer.result()  # Re-raises the producer's error
+                continue
+            item = getter.result()
+            if item is done:
+                break
+            yield item
+    finally:
+        if not producer.done():
+            producer.cancel()
+        try:
+            await producer
+        except asyncio.CancelledError:
+            pass
+
+
+async def _fetch_batches(query, params, batch_size, dictionary=True):
+    """
+    Streams the result of one query in batches over an unbuffered cursor.
+
+    A consumer that stops early (aclose(), or the loop finalising the
+    generator) has its connection closed rather than drained, since reading
+    the rest of a large result would take as long as the scan itself. The
+    cursor is only closed after a full read for the same reason: closing an
+    SS cursor reads the rows that are left. The pool drops a closed
+    connection instead of reusing it.
+    """
+    pool = await get_async_pool()
+    connection = await pool.acquire()
+    try:
+        cursor_class = aiomysql.SSDictCursor if dictionary else aiomysql.SSCursor
+        cursor = await connection.cursor(cursor_class)
+        await cursor.execute(query, params)
+        while True:
+            rows = await cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield list(rows)
+        await cursor.close()
+    except BaseException:
+        connection.close()
+        raise
+    finally:
+        await pool.release(connection)
+
+
+def _with_prefetch(source, prefetch):
+    """Wraps source in a prefetching reader when prefetch > 0."""
+    return _prefetched(source, prefetch) if prefetch > 0 else source
+
+
+async def async_stream_users_in_batches(batch_size=50, prefetch=1):
+    """
+    Async counterpart of stream_users_in_batches.
+
+    Args:
+        batch_size (int): The number of rows in each batch.
+        prefetch (int): Batches to fetch ahead of the consumer (0 disables).
+
+    Yields:
+        list: A list of user dictionaries.
+    """
+    source = _fetch_batches("SELECT * FROM user_data ORDER BY name",
+                            (), batch_size)
+    async for batch in _with_prefetch(source, prefetch):
+        yield batch
+
+
+async def async_stream_users(read_ahead=100, prefetch=1):
+    """
+    Async counterpart of stream_users.
+
+    Args:
+        read_ahead (int): Rows read from the socket per round trip.
+        prefetch (int): Chunks of read_ahead rows to fetch ahead (0 disables).
+
+    Yields:
+        dict: One user at a time.
+    """
+    async for batch in async_stream_users_in_batches(read_ahead, prefetch):
+        for row in batch:
+            yield row
+
+
+async def _pages(page_size, mode, cursor):
+    """Fetches lazy_pagination's pages one after another on one connection."""
+    pool = await get_async_pool()
+    async with pool.acquire() as connection:
+        async with connection.cursor(aiomysql.DictCursor) as db_cursor:
+            offset = 0
+            last_key = _paginate.decode_cursor(cursor) if cursor else None
+            while True:
+                if mode == "offset":
+                    await db_cursor.execute(_paginate.OFFSET_PAGE_QUERY,
+                                            (page_size, offset))
+                elif last_key is None:
+                    await db_cursor.execute(_paginate.FIRST_KEYSET_PAGE_QUERY,
+                                            (page_size,))
+                else:
+                    await db_cursor.execute(_paginate.NEXT_KEYSET_PAGE_QUERY,
+                                            (last_key[0], last_key[1], page_size))
+                page = list(await db_cursor.fetchall())
+                if not page:
+                    break
+                yield page
+                offset += page_size
+                last_key = tuple(page[-1][column]
+                                 for column in _paginate.KEYSET_COLUMNS)
+
+
+async def async_lazy_pagination(page_size=100, mode="offset", cursor=None,
+                                prefetch=1):
+    """
+    Async counterpart of lazy_pagination.
+
+    Args:
+        page_size (int): The number of users per page.
+        mode (str): "offset" or "keyset", as in lazy_pagination.
+        cursor (str): A next_cursor() token to resume a keyset walk.
+        prefetch (int): Pages to fetch ahead of the consumer (0 disables).
+
+    Yields:
+        list: A page (list) of user dictionaries.
+    """
+    if mode not in ("offset", "keyset"):
+        raise ValueError(f"Unknown pagination mode: {mode!r}")
+    if cursor is not None and mode != "keyset":
+        raise ValueError("A cursor can only be used in keyset mode.")
+    async for page in _with_prefetch(_pages(page_size, mode, cursor), prefetch):
+        yield page
+
+
+async def async_stream_user_ages(read_ahead=1000, prefetch=1):
+    """
+    Async counterpart of stream_user_ages.
+
+    Args:
+        read_ahead (int): Ages read from the socket per round trip.
+        prefetch (int): Chunks to fetch ahead of the consumer (0 disables).
+
+    Yields:
+        int: The age of one user at a time.
+    """
+    source = _fetch_batches("SELECT age FROM user_data", (), read_ahead,
+                            dictionary=False)
+    async for batch in _with_prefetch(source, prefetch):
+        for row in batch:
+            yield row[0]
+
+
+async def benchmark_concurrent(streams=8, prefetch=1):
+    """
+    Runs `streams` full scans of user_data concurrently on one event loop
+    and prints the total rows per second.
+
+    Args:
+        streams (int): The number of concurrent streams.
+        prefetch (int): The prefetch depth of each stream.
+    """
+    async def scan():
+        count = 0
+        async for _ in async_stream_users(prefetch=prefetch):
+            count += 1
+        return count
+
+    start = time.perf_counter()
+    counts = await asyncio.gather(*(scan() for _ in range(streams)))
+    elapsed = time.perf_counter() - start
+    total = sum(counts)
+    print(f"{streams} concurrent streams: {total} rows in {elapsed:.2f}s "
+          f"({total / elapsed if elapsed else 0:,.0f} rows/s)")
+    await close_async_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(benchmark_concurrent(int(sys.argv[1]) if len(sys.argv) > 1 else 8))
@@ -0,0 +1,348 @@
+#!/usr/bin/python3
+"""
+This module lets the project run on MySQL or on an embedded SQLite file.
+
+seed.py picks a backend from the DB_BACKEND environment variable ("mysql",
+the default, or "sqlite") and opens every connection through it. A backend
+knows how to connect, which exception type its driver raises, and the
+dialect-specific SQL the loader needs (schema, insert/upsert, row hashes).
+
+SQLite connections are wrapped in SQLiteConnection, which mimics the parts
+of the mysql.connector API this project uses: cursor(dictionary=...,
+buffered=..., prepared=...), %s placeholders, column_names, is_connected()
+and ping(); prepared is accepted but changes nothing. That way
+0-stream_users.py, 1-batch_processing.py, 2-lazy_paginate.py and
+4-stream_ages.py run unchanged on either backend.
+
+Both backends are tuned for streaming and bulk loads:
+- MySQL uses the C extension when available, and executemany() on an
+  INSERT is sent as one multi-row statement.
+- SQLite runs in WAL mode (readers never block the writer), with
+  synchronous=NORMAL, a memory-mapped database file (mmap_size), temp
+  tables in memory and a larger statement cache; executemany() reuses one
+  compiled statement for the whole batch.
+
+Environment variables:
+    DB_BACKEND            "mysql" or "sqlite"
+    DB_PATH               SQLite database file (default ALX_prodev.db)
+    DB_SQLITE_MMAP_SIZE   bytes of the file to memory-map (default 256 MiB)
+"""
+import hashlib
+import math
+import os
+import re
+import sqlite3
+from functools import lru_cache
+
+DEFAULT_SQLITE_PATH = "ALX_prodev.db"
+DEFAULT_MMAP_SIZE = 256 * 2**20
+
+# Re-inserting a chunk after a crash between COMMIT and the state file update
+# must not fail, so duplicate keys are turned into no-ops.
+MYSQL_INSERT_SQL = ("INSERT INTO user_data (user_id, name, email, age) "
+                    "VALUES (%s, %s, %s, %s) "
+                    "ON DUPLICATE KEY UPDATE user_id = user_id")
+MYSQL_UPSERT_SQL = ("INSERT INTO user_data (user_id, name, email, age) "
+                    "VALUES (%s, %s, %s, %s) "
+                    "ON DUPLICATE KEY UPDATE name = VALUES(name), "
+                    "email = VALUES(email), age = VALUES(age)")
+SQLITE_INSERT_SQL = ("INSERT INTO user_data (user_id, name, email, age) "
+                     "VALUES (%s, %s, %s, %s) "
+                     "ON CONFLICT (user_id) DO NOTHING")
+SQLITE_UPSERT_SQL = ("INSERT INTO user_data (user_id, name, email, age) "
+                     "VALUES (%s, %s, %s, %s) "
+                     "ON CONFLICT (user_id) DO UPDATE SET name = excluded.name, "
+                     "email = excluded.email, age = excluded.age")
+# The database hashes each row the same way bulk_loader.row_hash() does, so
+# only 36 + 32 bytes per row reach Python instead of the whole row. SQLite
+# gets MD5() and CONCAT_WS() as functions registered on each connection.
+ROW_HASHES_SQL = ("SELECT user_id, MD5(CONCAT_WS(CHAR(31), name, email, age)) "
+                  "FROM user_data")
+
+
+class MySQLBackend:
+    """Connects through mysql.connector to a MySQL server."""
+
+    name = "mysql"
+    insert_sql = MYSQL_INSERT_SQL
+    upsert_sql = MYSQL_UPSERT_SQL
+    row_hashes_sql = ROW_HASHES_SQL
+    supports_load_data = True
+    create_database_sql = "CREATE DATABASE IF NOT EXISTS ALX_prodev"
+    # Note: MySQL doesn't have a native UUID type like PostgreSQL. VARCHAR(36) is standard.
+    # DECIMAL for age is unusual; INT is more standard. We will use INT here.
+    # The (name, user_id) index backs the keyset pagination in 2-lazy_paginate.py.
+    create_table_sql = ("""
+    CREATE TABLE IF NOT EXISTS user_data (
+        user_id VARCHAR(36) PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        email VARCHAR(255) NOT NULL,
+        age INT NOT NULL,
+        INDEX(user_id),
+        INDEX idx_name_user_id (name, user_id)
+    )
+    """,)
+
+    def __init__(self):
+        # Imported here so SQLite deployments do not need the MySQL driver.
+        import mysql.connector
+        self._driver = mysql.connector
+        self.Error = mysql.connector.Error
+
+    def connect(self, database=None, **options):
+        """
+        Opens a MySQL connection using DB_HOST, DB_USER and DB_PASSWORD.
+
+        Args:
+            database (str): The database to select, or None for none.
+            **options: Passed on to mysql.connector.connect().
+        """
+        if database:
+            options["database"] = database
+        # Prefer the C extension; the driver falls back to pure Python.
+        options.setdefault("use_pure", False)
+        return self._driver.connect(
+            host=os.getenv('DB_HOST', 'localhost'),
+            user=os.getenv('DB_USER'),
+            password=os.getenv('DB_PASSWORD'),
+            **options
+        )
+
+
+# A quoted string literal (quotes doubled to escape them) or a %s / %%.
+_PLACEHOLDER = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")|%([s%])""")
+
+
+def _placeholder(match):
+    """Replaces one _PLACEHOLDER match; see _to_qmark()."""
+    literal = match.group(1)
+    if literal is not None:
+        return literal.replace("%%", "%")
+    return "?" if match.group(2) == "s" else "%"
+
+
+@lru_cache(maxsize=256)
+def _to_qmark(sql):
+    """
+    Rewrites mysql.connector's %s placeholders (and %%) for sqlite3.
+
+    A %s inside a quoted string literal, e.g. LIKE '%s%', is text and not a
+    placeholder, so it is left alone; %% still stands for %.
+    """
+    return _PLACEHOLDER.sub(_placeholder, sql)
+
+
+class SQLiteCursor:
+    """
+    A sqlite3 cursor that behaves like a mysql.connector cursor.
+
+    Args:
+        cursor (sqlite3.Cursor): The cursor to wrap.
+        dictionary (bool): Return rows as dicts keyed by column name.
+        buffered (bool): Read the whole result set when the query runs, as a
+            buffered MySQL cursor does. Unbuffered cursors step through the
+            result as rows are fetched.
+    """
+
+    def __init__(self, cursor, dictionary=False, buffered=False):
+        self._cursor = cursor
+        self._dictionary = dictionary
+        self._buffered = buffered
+        self._rows = None
+        self.column_names = ()
+
+    def _convert(self, rows):
+        """Turns sqlite3 tuples into the configured row type."""
+        if self._dictionary:
+            names = self.column_names
+            return [dict(zip(names, row)) for row in rows]
+        return rows
+
+    def execute(self, operation, params=()):
+        """Runs one statement with %s placeholders."""
+        self._cursor.execute(_to_qmark(operation), tuple(params or ()))
+        description = self._cursor.description
+        self.column_names = tuple(column[0] for column in description or ())
+        self._rows = None
+        if self._buffered and description:
+            self._rows = iter(self._cursor.fetchall())
+
+    def executemany(self, operation, seq_params):
+        """Runs one compiled statement for every parameter tuple."""
+        self._cursor.executemany(_to_qmark(operation), seq_params)
+        self.column_names = ()
+        self._rows = None
+
+    def fetchmany(self, size=1):
+        """Returns up to size rows; an empty list means the end."""
+        if self._rows is not None:
+            rows = [row for _, row in zip(range(size), self._rows)]
+        else:
+            rows = self._cursor.fetchmany(size)
+        return self._convert(rows)
+
+    def fetchone(self):
+        """Returns the next row, or None at the end."""
+        rows = self.fetchmany(1)
+        return rows[0] if rows else None
+
+    def fetchall(self):
+        """Returns all remaining rows."""
+        rows = list(self._rows) if self._rows is not None else self._cursor.fetchall()
+        return self._convert(rows)
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    @property
+    def rowcount(self):
+        """The number of rows the last statement changed."""
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        """The rowid of the last inserted row."""
+        return self._cursor.lastrowid
+
+    def close(self):
+        """Releases the underlying statement."""
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """
+    A sqlite3 connection that behaves like a mysql.connector connection.
+
+    It may be used by one thread at a time, from any thread, which is what
+    the connection pool and the prefetch threads need.
+
+    Args:
+        path (str): The database file.
+        mmap_size (int): Bytes of the file to memory-map for reads.
+        **options: Passed on to sqlite3.connect().
+    """
+
+    def __init__(self, path, mmap_size=DEFAULT_MMAP_SIZE, **options):
+        options.setdefault("timeout", 30)
+        options.setdefault("cached_statements", 256)
+        self._connection = sqlite3.connect(path, check_same_thread=False,
+                                           **options)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+        self._connection.execute("PRAGMA temp_store=MEMORY")
+        # MySQL functions used by query_builder.py and bulk_loader.py.
+        self._connection.create_function("FLOOR", 1, _floor, deterministic=True)
+        self._connection.create_function("MD5", 1, _md5, deterministic=True)
+        self._connection.create_function("CONCAT_WS", -1, _concat_ws,
+                                         deterministic=True)
+        self._open = True
+
+    def cursor(self, dictionary=False, buffered=False, prepared=False):
+        """
+        Returns a new cursor.
+
+        Args:
+            dictionary (bool): Return rows as dicts keyed by column name.
+            buffered (bool): Read the whole result when the query runs.
+            prepared (bool): Accepted so code written for mysql.connector
+                runs unchanged, but it changes nothing: sqlite3 compiles
+                every statement once and keeps it in the connection's
+                statement cache (cached_statements), prepared or not.
+        """
+        return SQLiteCursor(self._connection.cursor(), dictionary, buffered)
+
+    def commit(self):
+        """Commits the current transaction."""
+        self._connection.commit()
+
+    def rollback(self):
+        """Rolls back the current transaction."""
+        self._connection.rollback()
+
+    def is_connected(self):
+        """Returns True until the connection is closed."""
+        return self._open
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        """Raises sqlite3.ProgrammingError if the connection is closed."""
+        if not self._open:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+
+    def close(self):
+        """Closes the connection."""
+        self._open = False
+        self._connection.close()
+
+
+def _floor(value):
+    """SQL FLOOR(), which older SQLite builds lack."""
+    return None if value is None else math.floor(value)
+
+
+def _md5(value):
+    """SQL MD5() as a lowercase hex digest."""
+    return None if value is None else hashlib.md5(str(value).encode('utf-8')).hexdigest()
+
+
+def _concat_ws(separator, *values):
+    """SQL CONCAT_WS(), which skips NULL values like MySQL does."""
+    return separator.join(str(value) for value in values if value is not None)
+
+
+class SQLiteBackend:
+    """Stores ALX_prodev in a local SQLite file (DB_PATH)."""
+
+    name = "sqlite"
+    Error = sqlite3.Error
+    insert_sql = SQLITE_INSERT_SQL
+    upsert_sql = SQLITE_UPSERT_SQL
+    row_hashes_sql = ROW_HASHES_SQL
+    supports_load_data = False
+    # The file is the database, so there is nothing to create.
+    create_database_sql = None
+    create_table_sql = ("""
+    CREATE TABLE IF NOT EXISTS user_data (
+        user_id VARCHAR(36) PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        email VARCHAR(255) NOT NULL,
+        age INT NOT NULL
+    )
+    """, "CREATE INDEX IF NOT EXISTS idx_name_user_id ON user_data (name, user_id)")
+
+    def __init__(self, path=None, mmap_size=None):
+        self.path = path or os.getenv('DB_PATH', DEFAULT_SQLITE_PATH)
+        self.mmap_size = mmap_size or int(os.getenv('DB_SQLITE_MMAP_SIZE',
+                                                    DEFAULT_MMAP_SIZE))
+
+    def connect(self, database=None, **options):
+        """
+        Opens the SQLite file; database is ignored since the file is the
+        database.
+
+        Args:
+            database (str): Ignored.
+            **options: Passed on to sqlite3.connect().
+        """
+        return SQLiteConnection(self.path, self.mmap_size, **options)
+
+
+BACKENDS = {"mysql": MySQLBackend, "sqlite": SQLiteBackend}
+
+
+def get_backend(name=None):
+    """
+    Returns the backend called name, or the one chosen by DB_BACKEND.
+
+    Args:
+        name (str): "mysql" or "sqlite". Defaults to DB_BACKEND, then "mysql".
+    """
+    name = (name or os.getenv('DB_BACKEND', 'mysql')).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown DB_BACKEND {name!r}; "
+                         f"expected one of {', '.join(BACKENDS)}")
+    return BACKENDS[name]()
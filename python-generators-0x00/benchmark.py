@@ -0,0 +1,250 @@
+#!/usr/bin/python3
+"""
+This module benchmarks the streaming functions of this project.
+
+For each requested scale it re-seeds user_data with deterministic synthetic
+users, then runs stream_users, stream_users_in_batches, lazy_pagination and
+stream_user_ages, each in a fresh subprocess so peak memory is measured in
+isolation. For every run it records:
+- rows and total seconds, and rows per second
+- time to the first row (or first batch/page)
+- peak RSS of the process
+- database connections opened
+
+Results are written as JSON, so runs from different commits can be diffed.
+
+Usage:
+    python3 benchmark.py --scales 10000,100000,1000000 --output results.json
+"""
+import argparse
+import contextlib
+import csv
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+import seed  # Import the seed module for database connection
+import bulk_loader
+
+TARGETS = ("stream_users", "stream_users_in_batches", "lazy_pagination",
+           "stream_user_ages")
+
+_FIRST_NAMES = ("Ada", "Alan", "Barbara", "Claude", "Donald", "Edsger",
+                "Frances", "Grace", "Ken", "Linus", "Margaret", "Niklaus")
+_LAST_NAMES = ("Lovelace", "Turing", "Liskov", "Shannon", "Knuth", "Dijkstra",
+               "Allen", "Hopper", "Thompson", "Torvalds", "Hamilton", "Wirth")
+
+
+def synthetic_users(count, random_seed=0):
+    """
+    Yields deterministic fake users in the shape of user_data.csv.
+
+    Args:
+        count (int): The number of users.
+        random_seed (int): The same seed always yields the same users.
+
+    Yields:
+        tuple: (user_id, name, email, age).
+    """
+    rng = random.Random(random_seed)
+    for i in range(count):
+        first = rng.choice(_FIRST_NAMES)
+        last = rng.choice(_LAST_NAMES)
+        user_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+        yield (user_id, f"{first} {last}",
+               f"{first}.{last}{i}@example.com".lower(), rng.randint(18, 100))
+
+
+def seed_database(count, random_seed=0):
+    """
+    Replaces the contents of user_data with `count` synthetic users.
+
+    Args:
+        count (int): The number of users to load.
+        random_seed (int): Seed for synthetic_users.
+
+    Returns:
+        dict: The bulk loader's report.
+    """
+    connection = seed.connect_to_prodev()
+    if connection is None:
+        raise ConnectionError("Could not connect to ALX_prodev")
+    try:
+        seed.create_table(connection)
+        cursor = connection.cursor()
+        cursor.execute("DELETE FROM user_data")
+        connection.commit()
+        cursor.close()
+    finally:
+        connection.close()
+
+    with tempfile.NamedTemporaryFile('w', suffix='.csv', newline='',
+                                     encoding='utf-8', delete=False) as f:
+        writer = csv.writer(f)
+        writer.writerow(("user_id", "name", "email", "age"))
+        writer.writerows(synthetic_users(count, random_seed))
+        csv_path = f.name
+    try:
+        return bulk_loader.load_csv(csv_path, resume=False, progress_every=0)
+    finally:
+        os.remove(csv_path)
+
+
+def _iterate(target):
+    """Returns the iterator to benchmark and whether it yields batches."""
+    if target == "stream_users":
+        return __import__('0-stream_users').stream_users(), False
+    if target == "stream_users_in_batches":
+        return __import__('1-batch_processing').stream_users_in_batches(1000), True
+    if target == "lazy_pagination":
+        return __import__('2-lazy_paginate').lazy_pagination(1000, mode="keyset"), True
+    if target == "stream_user_ages":
+        return __import__('4-stream_ages').stream_user_ages(), False
+    raise ValueError(f"Unknown benchmark target: {target!r}")
+
+
+def run_target(target):
+    """
+    Runs one streaming function to completion and measures it.
+
+    This is meant to run in its own process (see measure_target), since
+    peak RSS can only go up within a process.
+
+    Args:
+        target (str): One of TARGETS.
+
+    Returns:
+        dict: The metrics of the run.
+    """
+    connections_before = seed.connections_opened()
+    start = time.perf_counter()
+    iterator, batched = _iterate(target)
+    first_item = None
+    rows = 0
+    for item in iterator:
+        if first_item is None:
+            first_item = time.perf_counter() - start
+        rows += len(item) if batched else 1
+    seconds = time.perf_counter() - start
+
+    # ru_maxrss is in kilobytes on Linux but in bytes on macOS.
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != "darwin":
+        peak_rss *= 1024
+    return {
+        "rows": rows,
+        "seconds": seconds,
+        "rows_per_sec": rows / seconds if seconds else 0.0,
+        "time_to_first_row": first_item,
+        "peak_rss_bytes": peak_rss,
+        "connections_opened": seed.connections_opened() - connections_before,
+    }
+
+
+def measure_target(target):
+    """
+    Runs run_target in a fresh Python process and returns its metrics.
+
+    Args:
+        target (str): One of TARGETS.
+
+    Returns:
+        dict: The metrics reported by the subprocess.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--run", target],
+        cwd=here, check=True, capture_output=True, text=True
+    ).stdout
+    # The last line is the JSON result; anything before it is program output.
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _git_commit():
+    """Returns the current git commit, or None outside a git checkout."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+            check=True, cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(scales, targets=TARGETS, random_seed=0):
+    """
+    Seeds each scale and benchmarks every target against it.
+
+    Args:
+        scales (list): Row counts to benchmark, e.g. [10000, 1000000].
+        targets (tuple): Which streaming functions to run.
+        random_seed (int): Seed for the synthetic data.
+
+    Returns:
+        dict: Environment details and results[scale][target] metrics.
+    """
+    results = {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "backend": seed.BACKEND.name,
+        "results": {},
+    }
+    for scale in scales:
+        print(f"Seeding {scale} users...", file=sys.stderr)
+        # Keep the loader's report off stdout, which may be carrying the JSON.
+        with contextlib.redirect_stdout(sys.stderr):
+            load = seed_database(scale, random_seed)
+        scale_results = {"seed_rows_per_sec": load["rows_per_sec"]}
+        for target in targets:
+            metrics = measure_target(target)
+            print(f"  {target}: {metrics['rows_per_sec']:,.0f} rows/s, "
+                  f"first row {metrics['time_to_first_row'] or 0:.4f}s, "
+                  f"peak RSS {metrics['peak_rss_bytes'] / 2**20:.1f} MiB",
+                  file=sys.stderr)
+            scale_results[target] = metrics
+        results["results"][str(scale)] = scale_results
+    return results
+
+
+def main(argv=None):
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scales", default="10000",
+                        help="comma-separated row counts, e.g. 10000,1000000")
+    parser.add_argument("--targets", default=",".join(TARGETS),
+                        help="comma-separated functions to benchmark")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="random seed for the synthetic users")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    parser.add_argument("--run", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run:
+        print(json.dumps(run_target(args.run)))
+        return
+
+    scales = [int(scale) for scale in args.scales.split(",")]
+    targets = tuple(target for target in args.targets.split(",") if target)
+    for target in targets:
+        if target not in TARGETS:
+            parser.error(f"unknown target {target!r}")
+    results = run_benchmarks(scales, targets, args.seed)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
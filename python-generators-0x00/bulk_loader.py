@@ -0,0 +1,489 @@
+#!/usr/bin/python3
+"""
+This module loads large CSV files into user_data quickly and safely.
+
+Instead of reading the whole file into a list and sending one huge
+executemany(), the loader:
+- reads the CSV in fixed-size chunks, so memory does not grow with the file
+- commits every chunk on its own, as one multi-row INSERT (mysql.connector
+  rewrites executemany() on an INSERT into a single statement) or through
+  LOAD DATA LOCAL INFILE
+- can load several chunks at once, each worker on its own connection
+- records committed chunks in a state file next to the CSV, so a failed
+  load can be resumed without redoing finished chunks
+- reports rows per second as it goes
+
+sync_csv() refreshes an already loaded table instead: it compares a content
+hash of every CSV row with one computed by the database, and applies only the
+inserts, updates and deletes needed, in batches. Both sides are walked in
+user_id order (the CSV through an external sort), so memory does not grow
+with the table.
+
+Usage:
+    python3 bulk_loader.py user_data.csv [chunk_size] [workers] [insert|infile]
+    python3 bulk_loader.py --sync user_data.csv [batch_size]
+"""
+import csv
+import hashlib
+import heapq
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import seed  # Import the seed module for database connection
+
+DEFAULT_CHUNK_SIZE = 5000
+
+# The INSERT (duplicate keys become no-ops, so a chunk re-inserted after a
+# crash between COMMIT and the state file update does not fail), the upsert
+# and the row-hash query are dialect specific and come from the backend
+# (see backends.py). LOAD DATA only exists on MySQL.
+LOAD_DATA_SQL = ("LOAD DATA LOCAL INFILE %s IGNORE INTO TABLE user_data "
+                 "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' "
+                 "LINES TERMINATED BY '\\n' (user_id, name, email, age)")
+
+
+def read_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Reads a user CSV lazily, chunk by chunk.
+
+    Args:
+        path (str): The CSV file. The first line is a header.
+        chunk_size (int): Rows per chunk.
+
+    Yields:
+        tuple: (chunk_index, rows), where rows are (user_id, name, email, age).
+    """
+    with open(path, 'r', newline='', encoding='utf-8') as csvfile:
+        reader = csv.reader(csvfile)
+        next(reader, None)  # Skip the header row
+        index = 0
+        chunk = []
+        for row in reader:
+            # The csv reader gives strings, so we convert age to int
+            chunk.append((row[0], row[1], row[2], int(row[3])))
+            if len(chunk) == chunk_size:
+                yield index, chunk
+                index += 1
+                chunk = []
+        if chunk:
+            yield index, chunk
+
+
+class LoadState:
+    """
+    Remembers which chunks of a CSV file have been committed.
+
+    The state file is a journal of JSON lines: the first line identifies the
+    load, and every committed chunk appends one line with its index. Marking
+    a chunk done is therefore a small append, not a rewrite of every chunk
+    so far. A line torn by a crash (no trailing newline) is ignored on load,
+    so at worst that one chunk is loaded again (duplicate keys are no-ops).
+
+    The state is tied to the file's size, modification time and the chunk
+    size, so a changed file or a different chunking starts from scratch.
+    """
+
+    def __init__(self, csv_path, chunk_size, state_path=None):
+        stat = os.stat(csv_path)
+        self.path = state_path or csv_path + ".load-state.json"
+        self.identity = {
+            "source": os.path.abspath(csv_path),
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "chunk_size": chunk_size,
+        }
+        self.done = set()
+        self._lock = threading.Lock()
+        self._journal_ok = False  # the file starts with this load's identity
+
+    def load(self):
+        """Reads previously committed chunks, if they match this load."""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                text = f.read()
+        except FileNotFoundError:
+            return
+        lines = text.splitlines()
+        if lines and not text.endswith("\n"):
+            # A crash mid-append: "4" may be the start of "42", so the last
+            # line only counts once its newline was written.
+            lines.pop()
+        try:
+            identity = json.loads(lines[0]) if lines else None
+        except ValueError:
+            return
+        if identity != self.identity:
+            return
+        for line in lines[1:]:
+            try:
+                self.done.add(int(json.loads(line)))
+            except (ValueError, TypeError):
+                continue
+        # After a torn last line, rewrite the journal on the next chunk
+        # rather than appending onto the partial line.
+        self._journal_ok = text.endswith("\n")
+
+    def mark_done(self, index):
+        """Records a committed chunk by appending it to the journal."""
+        with self._lock:
+            self.done.add(index)
+            if not self._journal_ok:
+                # A new load (or a stale file): start the journal afresh.
+                tmp_path = self.path + ".tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(json.dumps(self.identity) + "\n")
+                    for done in sorted(self.done):
+                        f.write(f"{done}\n")
+                os.replace(tmp_path, self.path)
+                self._journal_ok = True
+                return
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(f"{index}\n")
+
+    def clear(self):
+        """Deletes the state file once the whole load has finished."""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def _insert_chunk(connection, rows):
+    """Inserts one chunk as a multi-row INSERT and commits it."""
+    cursor = connection.cursor()
+    try:
+        cursor.executemany(seed.BACKEND.insert_sql, rows)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def _load_data_chunk(connection, rows):
+    """Writes one chunk to a temporary CSV and loads it with LOAD DATA."""
+    with tempfile.NamedTemporaryFile('w', suffix='.csv', newline='',
+                                     encoding='utf-8', delete=False) as f:
+        csv.writer(f, lineterminator='\n').writerows(rows)
+        tmp_path = f.name
+    cursor = connection.cursor()
+    try:
+        cursor.execute(LOAD_DATA_SQL, (tmp_path,))
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+        os.remove(tmp_path)
+
+
+def load_csv(path, chunk_size=DEFAULT_CHUNK_SIZE, method="insert", workers=1,
+             resume=True, state_path=None, connection=None, progress_every=10):
+    """
+    Streams a user CSV into user_data in committed chunks.
+
+    Args:
+        path (str): The CSV file to load.
+        chunk_size (int): Rows per chunk (and per transaction).
+        method (str): "insert" for multi-row INSERTs, or "infile" for
+            LOAD DATA LOCAL INFILE (the server must allow local_infile).
+        workers (int): Chunks loaded concurrently, each on its own connection.
+        resume (bool): Skip chunks a previous, failed run already committed.
+        state_path (str): Where to keep resume state. Defaults to
+            `<path>.load-state.json`.
+        connection: An open connection to use when workers == 1. By default
+            the loader opens its own.
+        progress_every (int): Print progress every this many chunks.
+
+    Returns:
+        dict: rows loaded, chunks loaded and skipped, seconds and rows/sec.
+    """
+    if method not in ("insert", "infile"):
+        raise ValueError(f"Unknown load method: {method!r}")
+    if method == "infile" and not seed.BACKEND.supports_load_data:
+        raise ValueError(f"The {seed.BACKEND.name} backend has no LOAD DATA; "
+                         "use method='insert'")
+    load_chunk = _insert_chunk if method == "insert" else _load_data_chunk
+    connect_options = {"allow_local_infile": True} if method == "infile" else {}
+
+    state = LoadState(path, chunk_size, state_path)
+    if resume:
+        state.load()
+
+    local = threading.local()
+    opened = []
+
+    def worker_connection():
+        """Returns this worker thread's connection, opening it if needed."""
+        if workers == 1 and connection is not None:
+            return connection
+        if getattr(local, "connection", None) is None:
+            local.connection = seed.connect_to_prodev(**connect_options)
+            if local.connection is None:
+                raise ConnectionError("Could not connect to ALX_prodev")
+            opened.append(local.connection)
+        return local.connection
+
+    def run(index, rows):
+        load_chunk(worker_connection(), rows)
+        state.mark_done(index)
+        return len(rows)
+
+    totals = {"rows": 0, "chunks": 0, "skipped_chunks": 0}
+    start = time.perf_counter()
+
+    def report(final=False):
+        elapsed = time.perf_counter() - start
+        rate = totals["rows"] / elapsed if elapsed else 0.0
+        label = "Loaded" if final else "Progress:"
+        print(f"{label} {totals['rows']} rows in {totals['chunks']} chunks, "
+              f"{elapsed:.1f}s, {rate:,.0f} rows/sec")
+        return elapsed, rate
+
+    def finished(rows):
+        totals["rows"] += rows
+        totals["chunks"] += 1
+        if progress_every and totals["chunks"] % progress_every == 0:
+            report()
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = set()
+            for index, rows in read_chunks(path, chunk_size):
+                if index in state.done:
+                    totals["skipped_chunks"] += 1
+                    continue
+                pending.add(executor.submit(run, index, rows))
+                # Keep at most two chunks per worker in memory.
+                if len(pending) >= workers * 2:
+                    completed, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in completed:
+                        finished(future.result())
+            for future in pending:
+                finished(future.result())
+    finally:
+        for opened_connection in opened:
+            opened_connection.close()
+
+    state.clear()
+    elapsed, rate = report(final=True)
+    return dict(totals, seconds=elapsed, rows_per_sec=rate)
+
+
+def row_hash(row):
+    """
+    Returns the content hash of a (user_id, name, email, age) row.
+
+    It matches MD5(CONCAT_WS(CHAR(31), name, email, age)) in MySQL.
+    """
+    _, name, email, age = row
+    content = "\x1f".join((name, email, str(age)))
+    return hashlib.md5(content.encode("utf-8")).hexdigest()
+
+
+def _table_hashes(connection, batch_size):
+    """
+    Streams (user_id, content hash) for every row of user_data, in user_id
+    order, batch_size rows per round trip.
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute(seed.BACKEND.row_hashes_sql + " ORDER BY user_id")
+        previous = None
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for user_id, digest in rows:
+                # The merge in sync_csv relies on both sides sorting the
+                # same way; a case-insensitive collation with mixed-case ids
+                # would break that, so stop instead of guessing.
+                if previous is not None and user_id <= previous:
+                    raise ValueError(
+                        f"user_data is not ordered by user_id as Python "
+                        f"orders it ({previous!r} before {user_id!r})"
+                    )
+                previous = user_id
+                yield user_id, digest
+    finally:
+        cursor.close()
+
+
+def _sorted_csv_rows(path, run_size, directory):
+    """
+    Yields the rows of a CSV file in user_id order, with an external sort.
+
+    Each run of run_size rows is sorted in memory and written to a
+    temporary file in `directory`, and the runs are then merged, so no more
+    than one run is held in memory at a time.
+    """
+    runs = []
+    for index, rows in read_chunks(path, run_size):
+        rows.sort()
+        run_path = os.path.join(directory, f"run-{index}.csv")
+        with open(run_path, 'w', newline='', encoding='utf-8') as run_file:
+            csv.writer(run_file).writerows(rows)
+        runs.append(run_path)
+
+    files = [open(run_path, 'r', newline='', encoding='utf-8')
+             for run_path in runs]
+    try:
+        readers = [((row[0], row[1], row[2], int(row[3]))
+                    for row in csv.reader(run_file))
+                   for run_file in files]
+        previous = None
+        for row in heapq.merge(*readers):
+            if row[0] == previous:
+                raise ValueError(f"Duplicate user_id in {path}: {row[0]!r}")
+            previous = row[0]
+            yield row
+    finally:
+        for run_file in files:
+            run_file.close()
+
+
+def _apply_upserts(connection, rows):
+    """Inserts new rows and overwrites changed ones, in one transaction."""
+    cursor = connection.cursor()
+    try:
+        cursor.executemany(seed.BACKEND.upsert_sql, rows)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def _apply_deletes(connection, user_ids):
+    """Deletes the given users, in one transaction."""
+    placeholders = ", ".join(["%s"] * len(user_ids))
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            f"DELETE FROM user_data WHERE user_id IN ({placeholders})",
+            tuple(user_ids)
+        )
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def sync_csv(path, batch_size=DEFAULT_CHUNK_SIZE, delete_missing=True,
+             connection=None):
+    """
+    Makes user_data match a CSV file by applying only the differences.
+
+    Rows are matched on user_id and compared by content hash. The table is
+    streamed in user_id order and merged against the CSV sorted the same way
+    (in batch_size runs spilled to temporary files). New and changed
+    rows are written with batched INSERT ... ON DUPLICATE KEY UPDATE, and rows
+    missing from the CSV are deleted in batches. Every batch commits on its
+    own, and running the sync again after a failure simply finishes the job.
+
+    Args:
+        path (str): The CSV file with the desired contents.
+        batch_size (int): Rows per write batch, per fetch and per sort run.
+        delete_missing (bool): Delete users that are not in the CSV.
+        connection: An open connection to use. By default one is opened.
+
+    Returns:
+        dict: Counts of inserted, updated, deleted and unchanged rows, and
+            the seconds taken.
+    """
+    own_connection = connection is None
+    if own_connection:
+        connection = seed.connect_to_prodev()
+        if connection is None:
+            raise ConnectionError("Could not connect to ALX_prodev")
+    # The table is streamed on a second connection, because a connection
+    # cannot run the writes while it is still reading a result set.
+    read_connection = seed.connect_to_prodev()
+    if read_connection is None:
+        if own_connection:
+            connection.close()
+        raise ConnectionError("Could not connect to ALX_prodev")
+
+    start = time.perf_counter()
+    counts = {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0}
+    pending = []
+    stale = []
+
+    def upsert(row):
+        pending.append(row)
+        if len(pending) >= batch_size:
+            _apply_upserts(connection, pending)
+            pending.clear()
+
+    def delete(user_id):
+        counts["deleted"] += 1
+        stale.append(user_id)
+        if len(stale) >= batch_size:
+            _apply_deletes(connection, stale)
+            stale.clear()
+
+    try:
+        with tempfile.TemporaryDirectory(prefix="user_sync-") as directory:
+            # Both sides arrive sorted by user_id, so they are compared like
+            # a merge join and memory stays at one batch/run however large
+            # the table is.
+            table = _table_hashes(read_connection, batch_size)
+            current = next(table, None)
+            for row in _sorted_csv_rows(path, batch_size, directory):
+                # Table rows that sort before this CSV row are not in the CSV.
+                while current is not None and current[0] < row[0]:
+                    if delete_missing:
+                        delete(current[0])
+                    current = next(table, None)
+                if current is None or current[0] != row[0]:
+                    counts["inserted"] += 1
+                    upsert(row)
+                    continue
+                if current[1] != row_hash(row):
+                    counts["updated"] += 1
+                    upsert(row)
+                else:
+                    counts["unchanged"] += 1
+                current = next(table, None)
+            # Whatever is left in the table was not in the CSV.
+            while current is not None:
+                if delete_missing:
+                    delete(current[0])
+                current = next(table, None)
+        if pending:
+            _apply_upserts(connection, pending)
+        if stale:
+            _apply_deletes(connection, stale)
+    finally:
+        read_connection.close()
+        if own_connection:
+            connection.close()
+
+    counts["seconds"] = time.perf_counter() - start
+    print(f"Sync done in {counts['seconds']:.1f}s: {counts['inserted']} inserted, "
+          f"{counts['updated']} updated, {counts['deleted']} deleted, "
+          f"{counts['unchanged']} unchanged.")
+    return counts
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "--sync":
+        sync_csv(sys.argv[2],
+                 batch_size=int(sys.argv[3]) if len(sys.argv) > 3 else DEFAULT_CHUNK_SIZE)
+        sys.exit(0)
+    if len(sys.argv) < 2:
+        print(f"Usage: {sys.argv[0]} [--sync] file.csv [chunk_size] [workers] [insert|infile]")
+        sys.exit(1)
+    load_csv(sys.argv[1],
+             chunk_size=int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_CHUNK_SIZE,
+             workers=int(sys.argv[3]) if len(sys.argv) > 3 else 1,
+             method=sys.argv[4] if len(sys.argv) > 4 else "insert")
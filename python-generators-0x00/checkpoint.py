@@ -0,0 +1,229 @@
+#!/usr/bin/python3
+"""
+This module makes long-running scans of user_data resumable.
+
+A checkpointed scan walks the table in keyset order, (name, user_id), and
+periodically records how far it got: the last key it delivered plus the
+number of rows and batches. If the process dies, running the same job again
+continues right after the last checkpoint instead of from row zero.
+
+A batch counts as processed once the consumer asks for the next one, and
+that is when its checkpoint is written. With the default every=1, a crash
+therefore redelivers only the batch that was being processed, and never
+one that was already finished: each batch is delivered exactly once to a
+consumer that completes it. A larger `every` saves fewer checkpoints at the
+cost of replaying up to `every - 1` finished batches after a crash.
+
+Checkpoints live in a local SQLite database (SQLiteCheckpointStore) or in
+one JSON file per job (FileCheckpointStore).
+"""
+import json
+import os
+import sqlite3
+import time
+
+_paginate = __import__('2-lazy_paginate')
+
+DEFAULT_CHECKPOINT_DB = "scan_checkpoints.db"
+
+
+class SQLiteCheckpointStore:
+    """
+    Keeps scan checkpoints in a local SQLite database.
+
+    Args:
+        path (str): The database file. It is created if needed.
+    """
+
+    def __init__(self, path=DEFAULT_CHECKPOINT_DB):
+        self.path = path
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS checkpoints ("
+                    "job_id TEXT PRIMARY KEY, last_name TEXT, last_user_id TEXT, "
+                    "rows INTEGER NOT NULL, batches INTEGER NOT NULL, "
+                    "updated_at REAL NOT NULL)"
+                )
+        finally:
+            conn.close()
+
+    def _connect(self):
+        """Opens a short-lived connection; checkpoints are infrequent."""
+        return sqlite3.connect(self.path, timeout=30)
+
+    def load(self, job_id):
+        """Returns the job's checkpoint as a dict, or None if it has none."""
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT last_name, last_user_id, rows, batches, updated_at "
+                "FROM checkpoints WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        last_name, last_user_id, rows, batches, updated_at = row
+        return {"last_key": (last_name, last_user_id), "rows": rows,
+                "batches": batches, "updated_at": updated_at}
+
+    def save(self, job_id, last_key, rows, batches):
+        """Records the job's position; the write is committed immediately."""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO checkpoints "
+                    "(job_id, last_name, last_user_id, rows, batches, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (job_id, last_key[0], last_key[1], rows, batches, time.time())
+                )
+        finally:
+            conn.close()
+
+    def clear(self, job_id):
+        """Forgets the job's position, e.g. once the scan has finished."""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM checkpoints WHERE job_id = ?", (job_id,))
+        finally:
+            conn.close()
+
+
+class FileCheckpointStore:
+    """
+    Keeps one JSON checkpoint file per job in a directory.
+
+    Args:
+        directory (str): Where the files go. It is created if needed.
+    """
+
+    def __init__(self, directory="scan_checkpoints"):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, job_id):
+        """Returns the checkpoint file of a job."""
+        safe_id = "".join(c if c.isalnum() or c in "-_." else "_" for c in job_id)
+        return os.path.join(self.directory, f"{safe_id}.json")
+
+    def load(self, job_id):
+        """Returns the job's checkpoint as a dict, or None if it has none."""
+        try:
+            with open(self._path(job_id), 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return None
+        saved["last_key"] = tuple(saved["last_key"])
+        return saved
+
+    def save(self, job_id, last_key, rows, batches):
+        """Records the job's position, replacing the file atomically."""
+        path = self._path(job_id)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"last_key": list(last_key), "rows": rows,
+                       "batches": batches, "updated_at": time.time()}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def clear(self, job_id):
+        """Forgets the job's position, e.g. once the scan has finished."""
+        try:
+            os.remove(self._path(job_id))
+        except FileNotFoundError:
+            pass
+
+
+def checkpointed_batches(job_id, batch_size=1000, store=None, every=1,
+                         resume=True):
+    """
+    Streams user batches in (name, user_id) order, checkpointing progress.
+
+    Args:
+        job_id (str): Names the scan; a later run with the same id resumes it.
+        batch_size (int or AdaptiveBatchSizer): Rows per batch.
+        store: A checkpoint store. Defaults to SQLiteCheckpointStore().
+        every (int): Save a checkpoint after every this many batches.
+        resume (bool): Continue from the job's checkpoint if there is one.
+            False starts over from the first row.
+
+    Yields:
+        list: A batch of user dictionaries.
+
+    Raises:
+        ConnectionError, or the driver's error, if the database cannot be
+        reached or a page query fails. The checkpoint is kept, so running
+        the job again resumes from it.
+    """
+    store = store or SQLiteCheckpointStore()
+    state = store.load(job_id) if resume else None
+    if state:
+        last_key, rows, batches = state["last_key"], state["rows"], state["batches"]
+        cursor = _paginate.encode_cursor(last_key)
+    else:
+        last_key, rows, batches = None, 0, 0
+        cursor = None
+
+    # lazy_pagination raises on connection and query errors, so the loop
+    # only ends normally once a page comes back empty: the end of the table.
+    # An error, or a consumer that stops early, leaves the checkpoint alone.
+    for batch in _paginate.lazy_pagination(batch_size, mode="keyset",
+                                           cursor=cursor):
+        yield batch
+
+        # The consumer asked for more, so it has finished with this batch.
+        rows += len(batch)
+        batches += 1
+        last_key = tuple(batch[-1][column] for column in _paginate.KEYSET_COLUMNS)
+        if batches % every == 0:
+            store.save(job_id, last_key, rows, batches)
+
+    # The scan is complete; the next run with this id starts from scratch.
+    store.clear(job_id)
+
+
+def checkpointed_rows(job_id, batch_size=1000, store=None, every=1,
+                      resume=True):
+    """
+    Row-by-row version of checkpointed_batches, for stream_users-style jobs.
+
+    Checkpoints are still taken per batch, so after a crash the rows of the
+    batch that was in progress are delivered again.
+
+    Yields:
+        dict: One user at a time.
+    """
+    for batch in checkpointed_batches(job_id, batch_size, store, every, resume):
+        yield from batch
+
+
+def scan_progress(job_id, store=None):
+    """
+    Returns the saved position of a job.
+
+    Returns:
+        dict: last_key, rows, batches and updated_at, or None if the job has
+            no checkpoint (never started, or finished).
+    """
+    return (store or SQLiteCheckpointStore()).load(job_id)
+
+
+def resumable_batch_processing(job_id, batch_size=50, store=None):
+    """
+    Checkpointed version of batch_processing: prints users older than 25,
+    and after a crash continues with the batch that was in progress.
+
+    Args:
+        job_id (str): Names the job for resuming.
+        batch_size (int): The size of the batches to process.
+        store: A checkpoint store. Defaults to SQLiteCheckpointStore().
+    """
+    for user_batch in checkpointed_batches(job_id, batch_size, store):
+        for user in user_batch:
+            if user.get('age', 0) > 25:
+                print(user)
@@ -0,0 +1,278 @@
+#!/usr/bin/python3
+"""
+This module provides a small, thread-safe database connection pool.
+
+Opening a MySQL connection costs a TCP handshake plus authentication, and
+every connection counts against the server's max_connections. The pool
+keeps a bounded number of connections alive and lends them out:
+- at most max_size connections exist at once; borrowers wait for a free one
+- connections idle for longer than idle_timeout are closed
+- every borrowed connection is pinged first, and dead ones are replaced
+- counters record borrow wait time and how often the pool was saturated
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection becomes available within the timeout."""
+
+
+def _default_ping(connection):
+    """Returns True if a mysql.connector connection is still usable."""
+    return connection.is_connected()
+
+
+def _default_reset(connection):
+    """Ends any open transaction so the next borrower starts clean."""
+    connection.rollback()
+
+
+def _close_quietly(connection):
+    """Closes a connection, ignoring errors from an already broken one."""
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+class ConnectionPool:
+    """
+    A bounded pool of reusable database connections.
+
+    Args:
+        factory (callable): Opens a new connection, or returns None on failure.
+        max_size (int): The maximum number of open connections.
+        idle_timeout (float): Seconds a connection may sit idle before it is
+            closed. None keeps idle connections forever.
+        borrow_timeout (float): Seconds to wait for a free connection before
+            raising PoolTimeoutError. None waits forever.
+        ping (callable): Returns True if a connection is healthy. It is called
+            on every borrow.
+        reset (callable): Cleans up a connection when it is returned.
+    """
+
+    def __init__(self, factory, max_size=5, idle_timeout=300.0,
+                 borrow_timeout=30.0, ping=_default_ping, reset=_default_reset):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self._factory = factory
+        self._max_size = max_size
+        self._idle_timeout = idle_timeout
+        self._borrow_timeout = borrow_timeout
+        self._ping = ping
+        self._reset = reset
+
+        self._condition = threading.Condition()
+        # Idle connections as (connection, returned_at) pairs. New borrows
+        # take from the right so the most recently used (warmest) one wins.
+        self._idle = deque()
+        self._size = 0
+        self._closed = False
+
+        self._borrows = 0
+        self._saturated_borrows = 0
+        self._timeouts = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._created = 0
+        self._evicted_idle = 0
+        self._failed_pings = 0
+        self._peak_in_use = 0
+
+    def acquire(self, timeout=None):
+        """
+        Borrows a healthy connection, opening a new one if there is room.
+
+        Args:
+            timeout (float): Overrides the pool's borrow_timeout.
+
+        Returns:
+            The connection, or None if the factory could not open one.
+
+        Raises:
+            PoolTimeoutError: If the pool stayed full for the whole timeout.
+        """
+        if timeout is None:
+            timeout = self._borrow_timeout
+        start = time.monotonic()
+        deadline = None if timeout is None else start + timeout
+        waited = False
+
+        while True:
+            connection = None
+            with self._condition:
+                while True:
+                    if self._closed:
+                        raise RuntimeError("The connection pool is closed.")
+                    self._evict_idle_locked()
+                    if self._idle:
+                        connection, _ = self._idle.pop()
+                        break
+                    if self._size < self._max_size:
+                        # Reserve the slot now, open the connection unlocked.
+                        self._size += 1
+                        break
+                    waited = True
+                    remaining = None
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._timeouts += 1
+                            raise PoolTimeoutError(
+                                f"No connection available after {timeout}s "
+                                f"(pool size {self._max_size})."
+                            )
+                    self._condition.wait(remaining)
+
+            if connection is None:
+                connection = self._open()
+                if connection is None:
+                    return None
+            elif not self._is_healthy(connection):
+                with self._condition:
+                    self._failed_pings += 1
+                    self._size -= 1
+                    self._condition.notify()
+                _close_quietly(connection)
+                continue
+
+            self._record_borrow(time.monotonic() - start, waited)
+            return connection
+
+    def release(self, connection, discard=False):
+        """
+        Returns a borrowed connection to the pool.
+
+        Args:
+            connection: The connection obtained from acquire().
+            discard (bool): Close the connection instead of keeping it, e.g.
+                because it may still hold an unread result set.
+        """
+        if not discard:
+            try:
+                self._reset(connection)
+            except Exception:
+                discard = True
+
+        with self._condition:
+            if discard or self._closed:
+                self._size -= 1
+            else:
+                self._idle.append((connection, time.monotonic()))
+                connection = None
+            self._condition.notify()
+
+        if connection is not None:
+            _close_quietly(connection)
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """
+        Context manager that borrows a connection and always gives it back.
+
+        If the block raises an error, or a generator using it is closed
+        early (GeneratorExit), the connection is closed rather than reused.
+        It may still have unread rows, and resetting it with rollback()
+        would make mysql.connector read all of them off the socket first.
+
+        Yields:
+            The borrowed connection, or None if none could be opened.
+        """
+        connection = self.acquire(timeout)
+        if connection is None:
+            yield None
+            return
+        try:
+            yield connection
+        except Exception:
+            self.release(connection, discard=True)
+            raise
+        except BaseException:
+            self.release(connection, discard=True)
+            raise
+        self.release(connection)
+
+    def stats(self):
+        """
+        Returns a snapshot of the pool counters.
+
+        Returns:
+            dict: Sizes, borrow counts, wait times and health check failures.
+        """
+        with self._condition:
+            in_use = self._size - len(self._idle)
+            return {
+                "max_size": self._max_size,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": in_use,
+                "peak_in_use": self._peak_in_use,
+                "created": self._created,
+                "borrows": self._borrows,
+                "saturated_borrows": self._saturated_borrows,
+                "timeouts": self._timeouts,
+                "total_wait_seconds": self._total_wait,
+                "max_wait_seconds": self._max_wait,
+                "avg_wait_seconds": (self._total_wait / self._borrows
+                                     if self._borrows else 0.0),
+                "evicted_idle": self._evicted_idle,
+                "failed_pings": self._failed_pings,
+            }
+
+    def close(self):
+        """Closes every idle connection and refuses further borrows."""
+        with self._condition:
+            self._closed = True
+            idle = [connection for connection, _ in self._idle]
+            self._size -= len(idle)
+            self._idle.clear()
+            self._condition.notify_all()
+        for connection in idle:
+            _close_quietly(connection)
+
+    def _open(self):
+        """Opens a connection for a slot that acquire() already reserved."""
+        try:
+            connection = self._factory()
+        except Exception:
+            connection = None
+        with self._condition:
+            if connection is None:
+                self._size -= 1
+                self._condition.notify()
+            else:
+                self._created += 1
+        return connection
+
+    def _is_healthy(self, connection):
+        """Pings a connection, treating any error as unhealthy."""
+        try:
+            return bool(self._ping(connection))
+        except Exception:
+            return False
+
+    def _record_borrow(self, wait, waited):
+        """Updates the borrow counters. Must be called without the lock."""
+        with self._condition:
+            self._borrows += 1
+            if waited:
+                self._saturated_borrows += 1
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+            in_use = self._size - len(self._idle)
+            self._peak_in_use = max(self._peak_in_use, in_use)
+
+    def _evict_idle_locked(self):
+        """Closes connections idle for longer than idle_timeout."""
+        if self._idle_timeout is None:
+            return
+        cutoff = time.monotonic() - self._idle_timeout
+        # The oldest connections sit on the left of the deque.
+        while self._idle and self._idle[0][1] < cutoff:
+            connection, _ = self._idle.popleft()
+            self._size -= 1
+            self._evicted_idle += 1
+            _close_quietly(connection)
@@ -0,0 +1,276 @@
+#!/usr/bin/python3
+"""
+This module exports user_data to files for analytics.
+
+Rows are read with stream_users_in_batches, so memory stays bounded by a
+few batches however large the table is, and each batch is written in one
+call instead of row by row:
+- "csv" / "csv.gz": each batch is encoded with csv.writer.writerows().
+  With compression_workers > 1, batches are gzip-compressed in parallel
+  threads (zlib releases the GIL) as independent gzip members. A file of
+  concatenated members is a valid gzip file that gzip, zcat and warehouse
+  loaders read as one stream.
+- "parquet": one Parquet row group per batch (needs pyarrow).
+- "arrow": an Arrow IPC file with one record batch per batch (needs pyarrow).
+
+Usage:
+    python3 export.py users.csv.gz [batch_size] [compression_workers]
+    python3 export.py users.parquet
+    python3 export.py --benchmark
+"""
+import copy
+import csv
+import gzip
+import io
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from query_builder import Query
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional; only Parquet/Arrow need it
+    pa = None
+    pq = None
+
+_batches = __import__('1-batch_processing')
+
+COLUMNS = ("user_id", "name", "email", "age")
+FORMATS = ("csv", "csv.gz", "parquet", "arrow")
+DEFAULT_BATCH_SIZE = 10000
+
+
+def format_for_path(path):
+    """
+    Guesses the export format from a file name.
+
+    Args:
+        path (str): e.g. users.csv.gz, users.parquet, users.arrow.
+
+    Returns:
+        str: One of FORMATS.
+    """
+    for extension, export_format in ((".csv.gz", "csv.gz"), (".csv", "csv"),
+                                     (".parquet", "parquet"),
+                                     (".arrow", "arrow"), (".feather", "arrow")):
+        if path.endswith(extension):
+            return export_format
+    raise ValueError(f"Cannot tell the export format of {path!r}; "
+                     f"pass one of {FORMATS}")
+
+
+def _arrow_schema():
+    """The Arrow schema of an exported user."""
+    return pa.schema([("user_id", pa.string()), ("name", pa.string()),
+                      ("email", pa.string()), ("age", pa.int32())])
+
+
+def _record_batch(columns, schema):
+    """Builds an Arrow record batch from a columnar batch."""
+    arrays = []
+    for field in schema:
+        values = columns[field.name]
+        # array.array columns (no NumPy) are converted; NumPy ones are not.
+        if hasattr(values, "tolist") and not hasattr(values, "dtype"):
+            values = values.tolist()
+        arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _encode_csv(rows, header=False):
+    """Encodes a batch of tuples as UTF-8 CSV bytes."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    if header:
+        writer.writerow(COLUMNS)
+    writer.writerows(rows)
+    return buffer.getvalue().encode('utf-8')
+
+
+def _export_csv(f, batches, compress, compresslevel, workers):
+    """Writes batches of tuples to an open binary file as (gzip) CSV."""
+    first = True
+    if compress and workers > 1:
+        # Each batch becomes an independent gzip member, compressed in a
+        # worker thread. At most 2 * workers batches are in flight, and
+        # members are written in order.
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            for batch in batches:
+                data = _encode_csv(batch, header=first)
+                first = False
+                pending.append(pool.submit(gzip.compress, data, compresslevel,
+                                           mtime=0))
+                if len(pending) >= 2 * workers:
+                    f.write(pending.popleft().result())
+            while pending:
+                f.write(pending.popleft().result())
+        if first:
+            # No rows: still write a valid gzip file with the header, as
+            # the single-stream path does.
+            f.write(gzip.compress(_encode_csv((), header=True),
+                                  compresslevel, mtime=0))
+        return
+
+    out = gzip.GzipFile(fileobj=f, mode='wb', compresslevel=compresslevel,
+                        mtime=0) if compress else f
+    try:
+        for batch in batches:
+            out.write(_encode_csv(batch, header=first))
+            first = False
+        if first:
+            out.write(_encode_csv((), header=True))
+    finally:
+        if compress:
+            out.close()
+
+
+def export_users(path, export_format=None, batch_size=DEFAULT_BATCH_SIZE,
+                 compression_workers=1, compresslevel=6, query=None,
+                 prefetch=1):
+    """
+    Streams user_data into a file.
+
+    Args:
+        path (str): The file to write.
+        export_format (str): One of FORMATS. Defaults to the file extension.
+        batch_size (int): Rows per batch, CSV chunk, row group or record batch.
+        compression_workers (int): Threads compressing csv.gz batches in
+            parallel. 1 writes a single gzip stream.
+        compresslevel (int): gzip level for csv.gz (1 fastest, 9 smallest).
+        query (Query): Filters to push into the database; its column list
+            is replaced by COLUMNS (on a copy; the caller's Query is not
+            changed). Defaults to every user, in table order.
+        prefetch (int): Batches fetched ahead while the previous one is
+            being written (see stream_users_in_batches).
+
+    Returns:
+        dict: rows and batches written, bytes, seconds and rows/sec.
+
+    Raises:
+        ConnectionError, or the driver's error, if the database cannot be
+        reached or fails mid-export. The temporary file is removed and
+        `path` is left as it was.
+    """
+    export_format = export_format or format_for_path(path)
+    if export_format not in FORMATS:
+        raise ValueError(f"Unknown export format {export_format!r}; "
+                         f"expected one of {FORMATS}")
+    if export_format in ("parquet", "arrow") and pa is None:
+        raise ImportError(f"Exporting to {export_format} needs pyarrow "
+                          "(pip install pyarrow)")
+
+    # Work on a copy so the caller's Query keeps its own column list.
+    query = copy.deepcopy(query) if query is not None else Query()
+    query.select(*COLUMNS)
+    row_format = "tuple" if export_format.startswith("csv") else "columnar"
+    counts = {"rows": 0, "batches": 0}
+
+    def counted(batches):
+        """Counts rows and batches as they go by."""
+        for batch in batches:
+            counts["rows"] += (len(batch) if row_format == "tuple"
+                               else len(batch["user_id"]))
+            counts["batches"] += 1
+            yield batch
+
+    # raise_errors: a database error must fail the export, not look like
+    # the end of the table and get a partial file renamed into place.
+    batches = counted(_batches.stream_users_in_batches(
+        batch_size, row_format, query=query, prefetch=prefetch,
+        raise_errors=True
+    ))
+    start = time.perf_counter()
+    # Write to a temporary name so a failed export never leaves a
+    # truncated file where the warehouse expects a complete one.
+    tmp_path = path + ".tmp"
+    try:
+        if export_format == "parquet":
+            schema = _arrow_schema()
+            with pq.ParquetWriter(tmp_path, schema) as writer:
+                for batch in batches:
+                    writer.write_batch(_record_batch(batch, schema))
+        elif export_format == "arrow":
+            schema = _arrow_schema()
+            with pa.OSFile(tmp_path, 'wb') as sink, \
+                    pa.ipc.new_file(sink, schema) as writer:
+                for batch in batches:
+                    writer.write_batch(_record_batch(batch, schema))
+        else:
+            with open(tmp_path, 'wb') as f:
+                _export_csv(f, batches, export_format == "csv.gz",
+                            compresslevel, compression_workers)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    elapsed = time.perf_counter() - start
+    return dict(counts, bytes=os.path.getsize(path), seconds=elapsed,
+                rows_per_sec=counts["rows"] / elapsed if elapsed else 0.0)
+
+
+def export_users_row_by_row(path):
+    """
+    The old way: writes stream_users() one row at a time to a gzip CSV.
+    Kept as the baseline for benchmark_export.
+
+    Args:
+        path (str): The .csv.gz file to write.
+
+    Returns:
+        float: The seconds it took.
+    """
+    stream_users = __import__('0-stream_users').stream_users
+    start = time.perf_counter()
+    with gzip.open(path, 'wt', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(COLUMNS)
+        for user in stream_users():
+            writer.writerow([user[column] for column in COLUMNS])
+    return time.perf_counter() - start
+
+
+def benchmark_export(directory=".", workers=None):
+    """
+    Prints how long each export path takes for the whole table.
+
+    Args:
+        directory (str): Where to write the scratch files.
+        workers (int): Compression threads. Defaults to the CPU count.
+    """
+    workers = workers or os.cpu_count() or 1
+    baseline = export_users_row_by_row(os.path.join(directory, "export_rows.csv.gz"))
+    print(f"{'row by row, csv.gz':<28} {baseline:>8.3f}s")
+    runs = [("batched, csv.gz", "export_batched.csv.gz", 1),
+            (f"batched, csv.gz x{workers}", "export_parallel.csv.gz", workers)]
+    if pa is not None:
+        runs += [("batched, parquet", "export.parquet", 1),
+                 ("batched, arrow", "export.arrow", 1)]
+    for label, name, threads in runs:
+        path = os.path.join(directory, name)
+        report = export_users(path, compression_workers=threads)
+        print(f"{label:<28} {report['seconds']:>8.3f}s "
+              f"{baseline / report['seconds']:>6.1f}x  "
+              f"{report['bytes'] / 2**20:>8.2f} MiB")
+    for name in ("export_rows.csv.gz",) + tuple(name for _, name, _ in runs):
+        os.remove(os.path.join(directory, name))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--benchmark":
+        benchmark_export()
+    elif len(sys.argv) > 1:
+        report = export_users(
+            sys.argv[1],
+            batch_size=int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_BATCH_SIZE,
+            compression_workers=int(sys.argv[3]) if len(sys.argv) > 3 else 1,
+        )
+        print(f"Exported {report['rows']} rows in {report['batches']} batches, "
+              f"{report['bytes']:,} bytes, {report['seconds']:.2f}s, "
+              f"{report['rows_per_sec']:,.0f} rows/sec")
+    else:
+        print(__doc__)
@@ -0,0 +1,215 @@
+#!/usr/bin/python3
+"""
+This module scans user_data in parallel across several worker processes.
+
+The table is split into contiguous key ranges over (name, user_id). Each
+range is streamed by a worker process with its own database connection, and
+the worker applies a per-row function to every row, so CPU-heavy processing
+runs on all cores instead of one.
+
+Results come back either ordered, in (name, user_id) order, or unordered, as
+soon as any range finishes. Because the ranges are contiguous and disjoint,
+the ordered merge of the per-range streams reduces to emitting ranges in key
+order. Ranges are kept small (range_rows) and only a few are in flight at
+a time, so memory stays bounded in the workers and in the parent.
+
+Running this file prints the throughput of a CPU-heavy scan for an
+increasing number of workers.
+"""
+import hashlib
+import os
+import queue
+import time
+from collections import deque
+from multiprocessing import Pool
+import seed  # Import the seed module for database connection
+
+
+def key_ranges(shards, max_rows=None):
+    """
+    Splits user_data into contiguous ranges of about equal size.
+
+    Args:
+        shards (int): The smallest number of ranges wanted.
+        max_rows (int): The most rows a range may hold. More ranges are made
+            if `shards` ranges would be bigger than this.
+
+    Returns:
+        list: (lower, upper) pairs of (name, user_id) keys. lower is
+            inclusive, upper is exclusive, and None means unbounded.
+    """
+    with seed.pooled_connection() as connection:
+        if not connection:
+            raise ConnectionError("Could not connect to ALX_prodev")
+        cursor = connection.cursor()
+        cursor.execute("SELECT COUNT(*) FROM user_data")
+        total, = cursor.fetchone()
+        cursor.close()
+
+        if max_rows:
+            shards = max(shards, -(-total // max_rows))
+        step = -(-total // shards) if shards > 0 else 0
+
+        boundaries = []
+        if 0 < step < total:
+            # One pass over the (name, user_id) index, keeping every step-th
+            # key. OFFSET per boundary would re-walk the index each time,
+            # which adds up once there are hundreds of small ranges.
+            cursor = connection.cursor()
+            cursor.execute("SELECT name, user_id FROM user_data "
+                           "ORDER BY name, user_id")
+            position = 0
+            while True:
+                keys = cursor.fetchmany(10000)
+                if not keys:
+                    break
+                for index in range(-position % step, len(keys), step):
+                    if position + index > 0:
+                        boundaries.append(tuple(keys[index]))
+                position += len(keys)
+            cursor.close()
+
+    edges = [None] + boundaries + [None]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def _scan_range(task):
+    """
+    Streams one key range in a worker process and processes its rows.
+
+    Args:
+        task (tuple): (lower, upper, process_row, batch_size).
+
+    Returns:
+        list: The non-None results of process_row, in key order.
+    """
+    lower, upper, process_row, batch_size = task
+    conditions = []
+    params = []
+    if lower:
+        conditions.append("(name, user_id) >= (%s, %s)")
+        params.extend(lower)
+    if upper:
+        conditions.append("(name, user_id) < (%s, %s)")
+        params.extend(upper)
+    query = "SELECT * FROM user_data"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY name, user_id"
+
+    results = []
+    # seed.get_pool() notices the new process id and opens its own pool,
+    # so no socket is ever shared with the parent.
+    with seed.pooled_connection() as connection:
+        if not connection:
+            raise ConnectionError("Could not connect to ALX_prodev")
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute(query, tuple(params))
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            for row in batch:
+                result = process_row(row)
+                if result is not None:
+                    results.append(result)
+        cursor.close()
+    return results
+
+
+def parallel_scan(process_row, workers=None, shards=None, ordered=False,
+                  batch_size=1000, range_rows=10000):
+    """
+    Applies process_row to every user in parallel and yields the results.
+
+    Args:
+        process_row (callable): Called with each user dictionary in a worker
+            process. It must be picklable (a module-level function), and any
+            None it returns is dropped, so it can also act as a filter.
+        workers (int): Worker processes to use. Defaults to the CPU count.
+        shards (int): The smallest number of key ranges to split the table
+            into. Defaults to four per worker, which balances uneven ranges.
+        range_rows (int): The most rows in one key range. A worker returns
+            a range's results in one piece, so this bounds the memory each
+            worker holds and how long the first result takes to arrive.
+        ordered (bool): Yield results in (name, user_id) order. Otherwise
+            they are yielded range by range as soon as each one finishes.
+        batch_size (int): Rows fetched per round trip inside each worker.
+
+    Yields:
+        The results of process_row.
+    """
+    workers = workers or os.cpu_count() or 1
+    shards = shards or workers * 4
+    tasks = [(lower, upper, process_row, batch_size)
+             for lower, upper in key_ranges(shards, range_rows)]
+
+    # Pool.imap() would queue every range at once and keep the results of
+    # ranges the consumer has not reached yet. Instead at most two ranges
+    # per worker are in flight, so the parent holds a bounded number of
+    # results however large the table is.
+    window = workers * 2
+    with Pool(processes=workers) as pool:
+        if ordered:
+            pending = deque()
+            for task in tasks:
+                pending.append(pool.apply_async(_scan_range, (task,)))
+                if len(pending) >= window:
+                    yield from pending.popleft().get()
+            while pending:
+                yield from pending.popleft().get()
+        else:
+            finished = queue.Queue()
+            in_flight = 0
+            for task in tasks:
+                pool.apply_async(_scan_range, (task,),
+                                 callback=finished.put,
+                                 error_callback=finished.put)
+                in_flight += 1
+                if in_flight >= window:
+                    yield from _next_result(finished)
+                    in_flight -= 1
+            while in_flight:
+                yield from _next_result(finished)
+                in_flight -= 1
+
+
+def _next_result(finished):
+    """Waits for the next finished range and returns or raises its result."""
+    result = finished.get()
+    if isinstance(result, BaseException):
+        raise result
+    return result
+
+
+def _busy_row(row):
+    """A CPU-heavy stand-in for real per-row work, used by the benchmark."""
+    digest = row["email"].encode("utf-8")
+    for _ in range(2000):
+        digest = hashlib.sha256(digest).digest()
+    return digest[0]
+
+
+def benchmark_scaling(max_workers=None):
+    """
+    Prints rows per second of a CPU-heavy scan for 1, 2, 4, ... workers.
+
+    Args:
+        max_workers (int): The largest worker count to try.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    workers = 1
+    baseline = None
+    while workers <= max_workers:
+        start = time.perf_counter()
+        count = sum(1 for _ in parallel_scan(_busy_row, workers=workers))
+        elapsed = time.perf_counter() - start
+        rate = count / elapsed if elapsed else 0
+        baseline = baseline or rate
+        print(f"{workers:>3} workers: {rate:>10.0f} rows/s "
+              f"(x{rate / baseline:.2f})")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    benchmark_scaling()
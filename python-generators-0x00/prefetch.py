@@ -0,0 +1,84 @@
+#!/usr/bin/python3
+"""
+This module overlaps fetching with processing for synchronous generators.
+
+prefetch() runs a generator in a background thread that fills a bounded
+queue, while the caller consumes items from the queue. Network waits in the
+fetching thread release the GIL, so fetching batch k+1 happens while the
+consumer is still processing batch k, and the total time approaches
+max(fetch, process) instead of fetch + process.
+"""
+import queue
+import threading
+
+_DONE = object()
+
+
+class _Failure:
+    """Carries an exception from the fetching thread to the consumer."""
+
+    def __init__(self, error):
+        self.error = error
+
+
+def prefetch(source, depth=1):
+    """
+    Re-yields the items of a generator, fetched up to `depth` items ahead.
+
+    The source generator is started, advanced and closed entirely in the
+    background thread, so a database connection it holds is only ever used
+    by that thread. Closing the returned generator early (break, close(),
+    garbage collection) stops the thread and closes the source.
+
+    Args:
+        source (generator): A generator that has not been started yet.
+        depth (int): The maximum number of items fetched but not consumed.
+
+    Yields:
+        The items of source, in order.
+    """
+    if depth < 1:
+        raise ValueError("depth must be at least 1")
+    items = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item):
+        """Blocks until there is room, unless the consumer has gone away."""
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in source:
+                if not put(item):
+                    return
+            put(_DONE)
+        except BaseException as e:
+            put(_Failure(e))
+        finally:
+            source.close()
+
+    worker = threading.Thread(target=produce, name="prefetch", daemon=True)
+    worker.start()
+    try:
+        while True:
+            item = items.get()
+            if item is _DONE:
+                break
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+        # Free a slot in case the producer is blocked on a full queue.
+        try:
+            while True:
+                items.get_nowait()
+        except queue.Empty:
+            pass
+        worker.join()
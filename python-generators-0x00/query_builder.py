@@ -0,0 +1,231 @@
+#!/usr/bin/python3
+"""
+This module contains a small query builder used to push work into MySQL.
+
+Filtering, projecting and aggregating in SQL means only the rows and columns
+that are actually needed cross the network. The builder only knows the few
+shapes this project needs (SELECT ... WHERE ... ORDER BY ... LIMIT and simple
+aggregates), and it never interpolates values into the SQL: identifiers are
+validated and every value is passed as a parameter.
+
+Running this file compares the pushed-down and the streaming paths of
+batch_processing's filter and calculate_average_age on the current table.
+"""
+import re
+import time
+import seed  # Import the seed module for database connection
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+_OPERATORS = ("=", "!=", "<", "<=", ">", ">=")
+_AGGREGATES = ("COUNT", "AVG", "SUM", "MIN", "MAX")
+
+
+def _identifier(name):
+    """Returns name unchanged if it is a safe column or table name."""
+    if not _IDENTIFIER.match(name):
+        raise ValueError(f"Invalid SQL identifier: {name!r}")
+    return name
+
+
+class Query:
+    """
+    Builds a parameterised SELECT on a single table.
+
+    Every method returns the query itself so calls can be chained:
+        Query().select("name", "age").where("age", ">", 25).order_by("name")
+    """
+
+    def __init__(self, table="user_data"):
+        self.table = _identifier(table)
+        self.columns = ()
+        self.conditions = []
+        self.ordering = ()
+        self.row_limit = None
+
+    def select(self, *columns):
+        """Projects the given columns instead of SELECT *."""
+        self.columns = tuple(_identifier(column) for column in columns)
+        return self
+
+    def where(self, column, op, value):
+        """Adds a `column op value` condition; conditions are ANDed."""
+        if op not in _OPERATORS:
+            raise ValueError(f"Unsupported operator: {op!r}")
+        self.conditions.append((_identifier(column), op, value))
+        return self
+
+    def order_by(self, *columns):
+        """Orders the rows by the given columns."""
+        self.ordering = tuple(_identifier(column) for column in columns)
+        return self
+
+    def limit(self, count):
+        """Returns at most count rows."""
+        self.row_limit = int(count)
+        return self
+
+    def _where_sql(self):
+        """Returns the WHERE clause and its parameters."""
+        if not self.conditions:
+            return "", []
+        clause = " AND ".join(f"{column} {op} %s"
+                              for column, op, _ in self.conditions)
+        return f" WHERE {clause}", [value for _, _, value in self.conditions]
+
+    def build(self):
+        """
+        Renders the row query.
+
+        Returns:
+            tuple: The SQL string and a tuple of parameters.
+        """
+        columns = ", ".join(self.columns) if self.columns else "*"
+        where, params = self._where_sql()
+        sql = f"SELECT {columns} FROM {self.table}{where}"
+        if self.ordering:
+            sql += " ORDER BY " + ", ".join(self.ordering)
+        if self.row_limit is not None:
+            sql += " LIMIT %s"
+            params.append(self.row_limit)
+        return sql, tuple(params)
+
+    def build_aggregate(self, *aggregates):
+        """
+        Renders a single-row aggregate query over the filtered rows.
+
+        Args:
+            *aggregates (tuple): (function, column) pairs such as
+                ("AVG", "age") or ("COUNT", "*").
+
+        Returns:
+            tuple: The SQL string and a tuple of parameters.
+        """
+        parts = []
+        for function, column in aggregates:
+            function = function.upper()
+            if function not in _AGGREGATES:
+                raise ValueError(f"Unsupported aggregate: {function!r}")
+            if column != "*":
+                column = _identifier(column)
+            parts.append(f"{function}({column})")
+        where, params = self._where_sql()
+        return f"SELECT {', '.join(parts)} FROM {self.table}{where}", tuple(params)
+
+    def build_histogram(self, column, bucket_width):
+        """
+        Renders a query that counts rows per fixed-width bucket of column.
+
+        Args:
+            column (str): The numeric column to bucket.
+            bucket_width (int): The width of each bucket.
+
+        Returns:
+            tuple: The SQL string and a tuple of parameters. Each result row
+                is (bucket_start, count), ordered by bucket_start.
+        """
+        column = _identifier(column)
+        where, params = self._where_sql()
+        sql = (f"SELECT FLOOR({column} / %s) * %s AS bucket, COUNT(*) "
+               f"FROM {self.table}{where} GROUP BY bucket ORDER BY bucket")
+        return sql, tuple([bucket_width, bucket_width] + params)
+
+
+def aggregate(query, *aggregates):
+    """
+    Runs an aggregate query and returns its single result row.
+
+    Args:
+        query (Query): The table and filters to aggregate over.
+        *aggregates (tuple): (function, column) pairs, e.g. ("AVG", "age").
+
+    Returns:
+        tuple: One value per aggregate.
+    """
+    sql, params = query.build_aggregate(*aggregates)
+    with seed.pooled_connection() as connection:
+        if not connection:
+            raise ConnectionError("Could not connect to ALX_prodev")
+        cursor = connection.cursor()
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+        cursor.close()
+    return tuple(row)
+
+
+def histogram(query, column, bucket_width):
+    """
+    Counts the rows of query in fixed-width buckets of column.
+
+    Args:
+        query (Query): The table and filters to count over.
+        column (str): The numeric column to bucket.
+        bucket_width (int): The width of each bucket.
+
+    Returns:
+        dict: bucket start mapped to row count, in ascending order.
+    """
+    sql, params = query.build_histogram(column, bucket_width)
+    with seed.pooled_connection() as connection:
+        if not connection:
+            raise ConnectionError("Could not connect to ALX_prodev")
+        cursor = connection.cursor()
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+        cursor.close()
+    return {int(bucket): count for bucket, count in rows}
+
+
+def server_bytes_sent():
+    """
+    Returns MySQL's global Bytes_sent counter (bytes sent to all clients).
+
+    The benchmark reads it before and after a run; on an otherwise idle
+    server the difference is the network cost of that run.
+    """
+    with seed.pooled_connection() as connection:
+        if not connection:
+            raise ConnectionError("Could not connect to ALX_prodev")
+        cursor = connection.cursor()
+        cursor.execute("SHOW GLOBAL STATUS LIKE 'Bytes_sent'")
+        _, value = cursor.fetchone()
+        cursor.close()
+    return int(value)
+
+
+def measure(label, function):
+    """
+    Runs function once and prints its wall time and the bytes MySQL sent.
+
+    Args:
+        label (str): A name for the printed line.
+        function (callable): The work to measure.
+
+    Returns:
+        The function's return value.
+    """
+    bytes_before = server_bytes_sent()
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    sent = server_bytes_sent() - bytes_before
+    print(f"{label:<32} {elapsed:>8.3f}s {sent / 2**20:>10.2f} MiB  -> {result}")
+    return result
+
+
+if __name__ == "__main__":
+    batches = __import__('1-batch_processing')
+    ages = __import__('4-stream_ages')
+
+    def filter_streaming():
+        return sum(1 for batch in batches.stream_users_in_batches(1000)
+                   for user in batch if user['age'] > 25)
+
+    def filter_pushdown():
+        query = Query().where("age", ">", 25).order_by("name")
+        return sum(len(batch) for batch in
+                   batches.stream_users_in_batches(1000, query=query))
+
+    measure("age > 25, filter in Python", filter_streaming)
+    measure("age > 25, filter in MySQL", filter_pushdown)
+    measure("average age, streaming", ages.average_age_streaming)
+    measure("average age, AVG() in MySQL", ages.average_age_pushdown)
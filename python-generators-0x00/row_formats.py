@@ -0,0 +1,221 @@
+#!/usr/bin/python3
+"""
+This module converts database rows into lighter-weight shapes.
+
+A dictionary per row is convenient but costly: each one carries its own hash
+table. The streams in this project can instead yield:
+- "tuple":      the plain tuples the cursor already produces
+- "namedtuple": tuples with attribute access (row.name, row.age)
+- "record":     small objects with __slots__ and attribute access
+- "columnar":   (batches only) one array per column, so a filter such as
+                age > 25 can run over a whole batch at once
+"""
+import operator
+from array import array
+from collections import namedtuple
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; columnar batches fall back to array
+    np = None
+
+ROW_FORMATS = ("dict", "tuple", "namedtuple", "record")
+BATCH_FORMATS = ROW_FORMATS + ("columnar",)
+
+_COMPARISONS = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+
+def check_format(row_format, allowed=ROW_FORMATS):
+    """
+    Validates a row_format argument.
+
+    Args:
+        row_format (str): The requested format.
+        allowed (tuple): The formats the caller supports.
+
+    Raises:
+        ValueError: If the format is not one of the allowed ones.
+    """
+    if row_format not in allowed:
+        raise ValueError(
+            f"Unknown row_format {row_format!r}; expected one of {allowed}"
+        )
+
+
+@lru_cache(maxsize=None)
+def namedtuple_type(column_names):
+    """Returns a (cached) named tuple class for the given column names."""
+    return namedtuple("UserRow", column_names)
+
+
+@lru_cache(maxsize=None)
+def record_type(column_names):
+    """
+    Returns a (cached) __slots__ class for the given column names.
+
+    Instances have no per-object __dict__, so they cost about as much as a
+    tuple while still allowing attribute access and assignment.
+    """
+    def __init__(self, *values):
+        for name, value in zip(column_names, values):
+            setattr(self, name, value)
+
+    def __repr__(self):
+        fields = ", ".join(
+            f"{name}={getattr(self, name)!r}" for name in column_names
+        )
+        return f"UserRecord({fields})"
+
+    def __eq__(self, other):
+        if not isinstance(other, type(self)):
+            return NotImplemented
+        return all(getattr(self, n) == getattr(other, n) for n in column_names)
+
+    return type("UserRecord", (), {
+        "__slots__": column_names,
+        "__init__": __init__,
+        "__repr__": __repr__,
+        "__eq__": __eq__,
+        "__hash__": None,
+    })
+
+
+def row_converter(row_format, column_names):
+    """
+    Returns a function that turns a cursor tuple into the requested format.
+
+    Args:
+        row_format (str): One of ROW_FORMATS other than "dict".
+        column_names (tuple): The cursor's column names.
+
+    Returns:
+        callable: The converter, or None when the tuple can be used as is.
+    """
+    column_names = tuple(column_names)
+    if row_format == "tuple":
+        return None
+    if row_format == "namedtuple":
+        return namedtuple_type(column_names)._make
+    if row_format == "record":
+        cls = record_type(column_names)
+        return lambda row: cls(*row)
+    if row_format == "dict":
+        return lambda row: dict(zip(column_names, row))
+    raise ValueError(f"Unknown row_format {row_format!r}")
+
+
+def convert_batch(rows, row_format, column_names, use_numpy=None):
+    """
+    Converts a list of cursor tuples into a batch in the requested format.
+
+    Args:
+        rows (list): The tuples returned by fetchmany().
+        row_format (str): One of BATCH_FORMATS other than "dict".
+        column_names (tuple): The cursor's column names.
+        use_numpy (bool): For columnar batches, force NumPy on or off.
+            Defaults to using it when it is installed.
+
+    Returns:
+        list or dict: A list of rows, or a dict of column name to array.
+    """
+    if row_format == "columnar":
+        return to_columnar(rows, column_names, use_numpy)
+    convert = row_converter(row_format, column_names)
+    if convert is None:
+        return rows
+    return [convert(row) for row in rows]
+
+
+def to_columnar(rows, column_names, use_numpy=None):
+    """
+    Transposes a list of row tuples into one array per column.
+
+    Integer and float columns become array('q') / array('d') (or NumPy
+    arrays). Other columns stay Python lists (or NumPy object arrays).
+
+    Args:
+        rows (list): The row tuples.
+        column_names (tuple): The name of each column.
+        use_numpy (bool): Force NumPy on or off; defaults to "if installed".
+
+    Returns:
+        dict: Column name mapped to its values, in row order.
+    """
+    if use_numpy is None:
+        use_numpy = np is not None
+    elif use_numpy and np is None:
+        raise ImportError("NumPy is required for use_numpy=True")
+
+    columns = {}
+    for name, values in zip(column_names, zip(*rows)):
+        columns[name] = _column_array(values, use_numpy)
+    if not rows:
+        for name in column_names:
+            columns[name] = np.array([]) if use_numpy else []
+    return columns
+
+
+def _column_array(values, use_numpy):
+    """Packs one column of values into the most compact container."""
+    if all(type(value) is int for value in values):
+        return np.array(values, dtype=np.int64) if use_numpy else array("q", values)
+    if all(type(value) in (int, float) for value in values):
+        return np.array(values, dtype=np.float64) if use_numpy else array("d", values)
+    return np.array(values, dtype=object) if use_numpy else list(values)
+
+
+def columnar_length(batch):
+    """Returns the number of rows in a columnar batch."""
+    for values in batch.values():
+        return len(values)
+    return 0
+
+
+def filter_columnar(batch, column, op, value):
+    """
+    Keeps the rows of a columnar batch where `column op value` holds.
+
+    With NumPy the comparison and the selection are vectorised over the
+    whole batch; without it the matching indices are computed in one pass.
+
+    Args:
+        batch (dict): A columnar batch from to_columnar().
+        column (str): The column to test.
+        op (str): One of >, >=, <, <=, ==, !=.
+        value: The value to compare against.
+
+    Returns:
+        dict: A new columnar batch with only the matching rows.
+    """
+    compare = _COMPARISONS[op]
+    values = batch[column]
+    if np is not None and isinstance(values, np.ndarray):
+        mask = compare(values, value)
+        return {name: np.asarray(col)[mask] for name, col in batch.items()}
+
+    keep = [i for i, item in enumerate(values) if compare(item, value)]
+    filtered = {}
+    for name, col in batch.items():
+        picked = [col[i] for i in keep]
+        filtered[name] = array(col.typecode, picked) if isinstance(col, array) else picked
+    return filtered
+
+
+def iter_columnar_rows(batch):
+    """Yields each row of a columnar batch as a dictionary."""
+    names = list(batch)
+    for values in zip(*(batch[name] for name in names)):
+        yield {name: _python_value(item) for name, item in zip(names, values)}
+
+
+def _python_value(item):
+    """Unwraps NumPy scalars so printed rows look like the dict format."""
+    return item.item() if hasattr(item, "item") else item
@@ -2,93 +2,159 @@
 """
 This script provides functions to set up and seed a MySQL database
 for the ALX ProDev Python Generators project.
+
+Set DB_BACKEND=sqlite to use a local SQLite file instead of a MySQL
+server (see backends.py).
 """
-import mysql.connector
 import os
-import csv
+import backends
+from connection_pool import ConnectionPool
+
+# The database backend every connection is opened through.
+BACKEND = backends.get_backend()
+
+# Number of connections opened through this module, so callers can measure
+# how many TCP and auth handshakes a piece of code costs.
+_connections_opened = 0
+
+def connections_opened():
+    """Returns how many connections this process has opened to the database."""
+    return _connections_opened
 
 def connect_db():
     """Connects to the MySQL database server."""
+    global _connections_opened
     try:
-        connection = mysql.connector.connect(
-            host=os.getenv('DB_HOST', 'localhost'),
-            user=os.getenv('DB_USER'),
-            password=os.getenv('DB_PASSWORD')
-        )
+        connection = BACKEND.connect()
+        _connections_opened += 1
         return connection
-    except mysql.connector.Error as err:
+    except BACKEND.Error as err:
         print(f"Error connecting to MySQL: {err}")
         return None
 
 def create_database(connection):
     """Creates the database ALX_prodev if it does not exist."""
+    if BACKEND.create_database_sql is None:
+        print("Database ALX_prodev created or already exists.")
+        return
     cursor = connection.cursor()
     try:
-        cursor.execute("CREATE DATABASE IF NOT EXISTS ALX_prodev")
+        cursor.execute(BACKEND.create_database_sql)
         print("Database ALX_prodev created or already exists.")
-    except mysql.connector.Error as err:
+    except BACKEND.Error as err:
         print(f"Failed to create database: {err}")
     finally:
         cursor.close()
 
-def connect_to_prodev():
-    """Connects to the ALX_prodev database in MYSQL."""
+def connect_to_prodev(**options):
+    """
+    Connects to the ALX_prodev database in MYSQL.
+
+    Extra keyword arguments (e.g. allow_local_infile=True) are passed
+    on to the backend's connect(), i.e. mysql.connector.connect().
+    """
+    global _connections_opened
     try:
-        connection = mysql.connector.connect(
-            host=os.getenv('DB_HOST', 'localhost'),
-            user=os.getenv('DB_USER'),
-            password=os.getenv('DB_PASSWORD'),
-            database='ALX_prodev'
-        )
+        connection = BACKEND.connect(database='ALX_prodev', **options)
+        _connections_opened += 1
         return connection
-    except mysql.connector.Error as err:
+    except BACKEND.Error as err:
         print(f"Error connecting to ALX_prodev: {err}")
         return None
 
+# The process-wide pool that the generator modules borrow connections from.
+# It is created lazily and re-created after a fork, because a child process
+# must never reuse sockets that belong to its parent.
+_pool = None
+_pool_pid = None
+
+def get_pool():
+    """
+    Returns the shared pool of ALX_prodev connections.
+
+    The size and idle timeout can be tuned with the DB_POOL_SIZE and
+    DB_POOL_IDLE_TIMEOUT environment variables.
+    """
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        _pool = ConnectionPool(
+            connect_to_prodev,
+            max_size=int(os.getenv('DB_POOL_SIZE', '5')),
+            idle_timeout=float(os.getenv('DB_POOL_IDLE_TIMEOUT', '300'))
+        )
+        _pool_pid = os.getpid()
+    return _pool
+
+def pooled_connection():
+    """
+    Context manager that lends a pooled ALX_prodev connection.
+
+    Usage:
+        with seed.pooled_connection() as connection:
+            ...
+    """
+    return get_pool().connection()
+
 def create_table(connection):
     """Creates a table user_data if it does not exist with the required fields."""
     cursor = connection.cursor()
-    # Note: MySQL doesn't have a native UUID type like PostgreSQL. VARCHAR(36) is standard.
-    # DECIMAL for age is unusual; INT is more standard. We will use INT here.
-    create_table_query = """
-    CREATE TABLE IF NOT EXISTS user_data (
-        user_id VARCHAR(36) PRIMARY KEY,
-        name VARCHAR(255) NOT NULL,
-        email VARCHAR(255) NOT NULL,
-        age INT NOT NULL,
-        INDEX(user_id)
-    )
-    """
     try:
-        cursor.execute(create_table_query)
+        # The schema lives in backends.py, since MySQL and SQLite declare
+        # the (name, user_id) index differently.
+        for statement in BACKEND.create_table_sql:
+            cursor.execute(statement)
         print("Table user_data created or already exists.")
-    except mysql.connector.Error as err:
+    except BACKEND.Error as err:
         print(f"Failed to create table: {err}")
     finally:
         cursor.close()
 
-def insert_data(connection, data):
-    """Inserts data from a CSV file into the database if the table is empty."""
+def insert_data(connection, data, chunk_size=None, workers=1, method="insert",
+                mode="skip"):
+    """
+    Inserts data from a CSV file into the database if the table is empty.
+
+    The file is streamed in committed chunks by bulk_loader.load_csv, so
+    memory stays flat and an interrupted load resumes where it stopped.
+    With mode="sync" a non-empty table is refreshed incrementally instead:
+    only rows that were added, changed or removed in the CSV are written.
+
+    Args:
+        connection: An open ALX_prodev connection.
+        data (str): Path to the CSV file.
+        chunk_size (int): Rows per INSERT batch and transaction.
+        workers (int): Chunks loaded in parallel, each on its own connection.
+        method (str): "insert" (multi-row INSERT) or "infile" (LOAD DATA).
+        mode (str): "skip" leaves a non-empty table alone; "sync" applies
+            the differences between the CSV and the table.
+    """
+    # Imported here because bulk_loader itself imports this module.
+    import bulk_loader
+
     cursor = connection.cursor()
     try:
-        # Check if table is empty before inserting to prevent duplicates
+        # Check if table is empty before inserting to prevent duplicates.
+        # A load that failed part way leaves a state file behind; in that
+        # case the table is not empty but the load must be resumed.
         cursor.execute("SELECT COUNT(*) FROM user_data")
-        if cursor.fetchone()[0] > 0:
+        state = bulk_loader.LoadState(data, chunk_size or bulk_loader.DEFAULT_CHUNK_SIZE)
+        if cursor.fetchone()[0] > 0 and not os.path.exists(state.path):
+            if mode == "sync":
+                bulk_loader.sync_csv(data, batch_size=chunk_size or bulk_loader.DEFAULT_CHUNK_SIZE,
+                                     connection=connection)
+                return
             print("Data already exists in user_data. Skipping insertion.")
             return
 
-        with open(data, 'r', newline='', encoding='utf-8') as csvfile:
-            reader = csv.reader(csvfile)
-            header = next(reader)  # Skip the header row
-            sql = "INSERT INTO user_data (user_id, name, email, age) VALUES (%s, %s, %s, %s)"
-            
-            # The csv reader gives strings, so we convert age to int
-            data_to_insert = [(row[0], row[1], row[2], int(row[3])) for row in reader]
-            
-            cursor.executemany(sql, data_to_insert)
-            connection.commit()
-            print(f"{cursor.rowcount} records inserted successfully.")
-    except mysql.connector.Error as err:
+        report = bulk_loader.load_csv(
+            data,
+            chunk_size=chunk_size or bulk_loader.DEFAULT_CHUNK_SIZE,
+            method=method,
+            workers=workers,
+            connection=connection if workers == 1 and method == "insert" else None
+        )
+        print(f"{report['rows']} records inserted successfully.")
+    except BACKEND.Error as err:
         print(f"Error inserting data: {err}")
         connection.rollback()
     except FileNotFoundError:
@@ -0,0 +1,279 @@
+#!/usr/bin/python3
+"""
+This module computes descriptive statistics over a stream in a single pass.
+
+Every statistic keeps a small, bounded state instead of the values
+themselves, so it works on a generator of any length:
+- RunningStats: count, mean, variance (Welford's algorithm), min and max
+- KLLSketch:    approximate quantiles in O(k log(n / k)) memory
+- Histogram:    counts per fixed-width bucket
+
+Each state can be merged with another of the same kind, so shards of a
+table can be summarised in parallel and combined afterwards.
+StreamSummary bundles all three behind one add()/merge()/result() API.
+"""
+import math
+import random
+
+
+class RunningStats:
+    """Count, mean, variance, min and max in O(1) memory."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0  # Sum of squared distances from the mean
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        """Adds one value (Welford's online update)."""
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """Folds another RunningStats into this one (Chan et al.)."""
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.mean, self._m2 = other.count, other.mean, other._m2
+            self.min, self.max = other.min, other.max
+            return self
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / total
+        self._m2 += other._m2 + delta * delta * self.count * other.count / total
+        self.count = total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def variance(self):
+        """The population variance, or 0.0 for fewer than two values."""
+        return self._m2 / self.count if self.count > 1 else 0.0
+
+    @property
+    def sample_variance(self):
+        """The sample (n - 1) variance, or 0.0 for fewer than two values."""
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def stddev(self):
+        """The population standard deviation."""
+        return math.sqrt(self.variance)
+
+
+class KLLSketch:
+    """
+    Approximate quantiles with the KLL sketch (Karnin, Lang, Liberty).
+
+    Values are kept in a stack of compactors. When a level fills up it is
+    sorted and every other value is promoted to the next level with twice
+    the weight, so memory grows only logarithmically with the stream.
+
+    Args:
+        k (int): Accuracy parameter. The rank error is roughly 1.7 / k.
+        seed (int): Seed for the coin flips, for reproducible sketches.
+    """
+
+    _SHRINK = 2 / 3
+
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.count = 0
+        self._rng = random.Random(seed)
+        self._levels = []
+        self._size = 0
+        self._max_size = 0
+        self._grow()
+
+    def _capacity(self, level):
+        """How many values a level may hold before it is compacted."""
+        depth = len(self._levels) - level - 1
+        return int(math.ceil(self.k * self._SHRINK ** depth)) + 1
+
+    def _grow(self):
+        """Adds a level on top and recomputes the total capacity."""
+        self._levels.append([])
+        self._max_size = sum(self._capacity(h) for h in range(len(self._levels)))
+
+    def _compress(self):
+        """Compacts the lowest full level into the one above it."""
+        for level, values in enumerate(self._levels):
+            if len(values) >= self._capacity(level):
+                if level + 1 >= len(self._levels):
+                    self._grow()
+                values.sort()
+                # An odd leftover stays behind so no weight is lost.
+                leftover = [values.pop()] if len(values) % 2 else []
+                offset = self._rng.randint(0, 1)
+                self._levels[level + 1].extend(values[offset::2])
+                self._levels[level] = leftover
+                break
+        self._size = sum(len(values) for values in self._levels)
+
+    def add(self, value):
+        """Adds one value to the sketch."""
+        self._levels[0].append(value)
+        self._size += 1
+        self.count += 1
+        if self._size >= self._max_size:
+            self._compress()
+
+    def merge(self, other):
+        """Folds another sketch into this one."""
+        while len(self._levels) < len(other._levels):
+            self._grow()
+        for level, values in enumerate(other._levels):
+            self._levels[level].extend(values)
+        self.count += other.count
+        self._size = sum(len(values) for values in self._levels)
+        while self._size >= self._max_size:
+            self._compress()
+        return self
+
+    def _weighted(self):
+        """Returns (value, weight) pairs sorted by value."""
+        pairs = [(value, 1 << level)
+                 for level, values in enumerate(self._levels)
+                 for value in values]
+        pairs.sort(key=lambda pair: pair[0])
+        return pairs
+
+    def quantiles(self, fractions):
+        """
+        Estimates several quantiles at once.
+
+        Args:
+            fractions (iterable): Values between 0 and 1, e.g. (0.5, 0.99).
+
+        Returns:
+            dict: fraction mapped to its estimated value (None if empty).
+        """
+        pairs = self._weighted()
+        total = sum(weight for _, weight in pairs)
+        results = {}
+        for fraction in fractions:
+            if not pairs:
+                results[fraction] = None
+                continue
+            target = fraction * total
+            seen = 0
+            results[fraction] = pairs[-1][0]
+            for value, weight in pairs:
+                seen += weight
+                if seen >= target:
+                    results[fraction] = value
+                    break
+        return results
+
+    def quantile(self, fraction):
+        """Estimates a single quantile, e.g. quantile(0.5) for the median."""
+        return self.quantiles((fraction,))[fraction]
+
+
+class Histogram:
+    """
+    Counts values per fixed-width bucket.
+
+    Args:
+        bucket_width (float): The width of each bucket.
+    """
+
+    def __init__(self, bucket_width=10):
+        self.bucket_width = bucket_width
+        self.counts = {}
+
+    def add(self, value):
+        """Counts one value in its bucket."""
+        bucket = math.floor(value / self.bucket_width) * self.bucket_width
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+
+    def merge(self, other):
+        """Folds another histogram with the same bucket width into this one."""
+        if other.bucket_width != self.bucket_width:
+            raise ValueError("Cannot merge histograms with different bucket widths")
+        for bucket, count in other.counts.items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + count
+        return self
+
+    def buckets(self):
+        """Returns bucket start mapped to count, in ascending order."""
+        return dict(sorted(self.counts.items()))
+
+
+class StreamSummary:
+    """
+    Every statistic of this module, updated together in one pass.
+
+    Args:
+        bucket_width (float): Histogram bucket width.
+        k (int): KLL sketch accuracy parameter.
+        quantiles (tuple): The quantiles result() reports.
+    """
+
+    def __init__(self, bucket_width=10, k=200, quantiles=(0.25, 0.5, 0.75, 0.9, 0.99)):
+        self.stats = RunningStats()
+        self.sketch = KLLSketch(k)
+        self.histogram = Histogram(bucket_width)
+        self.reported_quantiles = quantiles
+
+    def add(self, value):
+        """Adds one value to every statistic."""
+        self.stats.add(value)
+        self.sketch.add(value)
+        self.histogram.add(value)
+
+    def update(self, values):
+        """Adds every value from an iterable, e.g. a generator."""
+        for value in values:
+            self.add(value)
+        return self
+
+    def merge(self, other):
+        """Folds another summary (e.g. from another shard) into this one."""
+        self.stats.merge(other.stats)
+        self.sketch.merge(other.sketch)
+        self.histogram.merge(other.histogram)
+        return self
+
+    def result(self):
+        """
+        Returns the summary as a plain dictionary.
+
+        Returns:
+            dict: count, mean, variance, stddev, min, max, quantiles and
+                histogram.
+        """
+        return {
+            "count": self.stats.count,
+            "mean": self.stats.mean,
+            "variance": self.stats.variance,
+            "stddev": self.stats.stddev,
+            "min": self.stats.min,
+            "max": self.stats.max,
+            "quantiles": self.sketch.quantiles(self.reported_quantiles),
+            "histogram": self.histogram.buckets(),
+        }
+
+
+def summarize(values, bucket_width=10, k=200):
+    """
+    Summarises any stream of numbers in a single pass.
+
+    Args:
+        values (iterable): The numbers, e.g. stream_user_ages().
+        bucket_width (float): Histogram bucket width.
+        k (int): KLL sketch accuracy parameter.
+
+    Returns:
+        dict: See StreamSummary.result().
+    """
+    return StreamSummary(bucket_width, k).update(values).result()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""Unit tests for the async_streams module"""
+
+import asyncio
+import os
+import tempfile
+import types
+import unittest
+from unittest.mock import patch
+
+# async_streams imports 2-lazy_paginate, which imports seed; use SQLite so no
+# MySQL driver is needed. The async connections are fakes.
+os.environ.setdefault("DB_BACKEND", "sqlite")
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.gettempdir(),
+                                              "test_async_streams.db"))
+
+import async_streams  # noqa: E402
+
+ROWS = 1000
+
+# Stand-ins for the aiomysql cursor classes the module asks for.
+FAKE_AIOMYSQL = types.SimpleNamespace(SSDictCursor="SSDictCursor",
+                                      SSCursor="SSCursor",
+                                      DictCursor="DictCursor")
+
+
+class FakeCursor:
+    """An unbuffered cursor over ROWS users; closing it drains like aiomysql"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.position = 0
+
+    async def execute(self, query, params=None):
+        self.position = 0
+
+    async def fetchmany(self, size):
+        start = self.position
+        self.position = min(ROWS, start + size)
+        self.connection.rows_read += self.position - start
+        await asyncio.sleep(0)
+        return [{"user_id": str(i), "name": f"user{i}", "age": i % 90}
+                for i in range(start, self.position)]
+
+    async def close(self):
+        self.connection.rows_read += ROWS - self.position
+        self.position = ROWS
+
+
+class FakeConnection:
+    """Counts the rows read off its socket"""
+
+    def __init__(self):
+        self.rows_read = 0
+        self.closed = False
+
+    async def cursor(self, cursor_class=None):
+        return FakeCursor(self)
+
+    def close(self):
+        self.closed = True
+
+
+class FakePool:
+    """Lends one FakeConnection at a time and keeps released open ones"""
+
+    def __init__(self):
+        self.opened = []
+        self.free = []
+
+    async def acquire(self):
+        if self.free:
+            return self.free.pop()
+        connection = FakeConnection()
+        self.opened.append(connection)
+        return connection
+
+    async def release(self, connection):
+        if not connection.closed:
+            self.free.append(connection)
+
+
+class TestAsyncStreams(unittest.TestCase):
+    """Test case for early closing of the async streams"""
+
+    def run_with_pool(self, body):
+        """Runs body(pool) on a new loop with a FakePool installed"""
+        pool = FakePool()
+
+        async def main():
+            async_streams._pools[asyncio.get_running_loop()] = pool
+            try:
+                await body()
+            finally:
+                async_streams._pools.pop(asyncio.get_running_loop(), None)
+
+        with patch.object(async_streams, "aiomysql", FAKE_AIOMYSQL):
+            asyncio.run(main())
+        return pool
+
+    def test_full_stream_keeps_connection(self):
+        """Test a stream read to the end returns its connection for reuse"""
+        rows = []
+
+        async def body():
+            async for user in async_streams.async_stream_users(100, prefetch=1):
+                rows.append(user)
+
+        pool = self.run_with_pool(body)
+        self.assertEqual(len(rows), ROWS)
+        connection, = pool.opened
+        self.assertFalse(connection.closed)
+        self.assertEqual(pool.free, [connection])
+
+    def test_closed_early_drops_connection_without_draining(self):
+        """Test a stream closed after a few rows closes its connection"""
+        for prefetch in (0, 1, 3):
+            with self.subTest(prefetch=prefetch):
+                async def body():
+                    users = async_streams.async_stream_users(10, prefetch)
+                    for _ in range(5):
+                        await users.__anext__()
+                    await users.aclose()
+
+                pool = self.run_with_pool(body)
+                connection, = pool.opened
+                self.assertTrue(connection.closed)
+                self.assertEqual(pool.free, [])
+                # Only what was fetched (plus the read-ahead), not the rest.
+                self.assertLessEqual(connection.rows_read, 10 * (prefetch + 2))
+
+    def test_pool_needs_aiomysql(self):
+        """Test a clear error when aiomysql is missing and no pool exists"""
+        async def body():
+            await async_streams.get_async_pool()
+
+        with patch.object(async_streams, "aiomysql", None):
+            with self.assertRaises(ImportError):
+                asyncio.run(body())
+
+
+if __name__ == "__main__":
+    unittest.main()
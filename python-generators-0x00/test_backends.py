@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""Unit tests for the backends module"""
+
+import unittest
+from backends import SQLiteConnection, _to_qmark
+
+
+class TestToQmark(unittest.TestCase):
+    """Test case for rewriting %s placeholders for sqlite3"""
+
+    def test_placeholders(self):
+        """Test %s becomes ? and %% becomes %"""
+        self.assertEqual(_to_qmark("SELECT * FROM t WHERE a = %s AND b > %s"),
+                         "SELECT * FROM t WHERE a = ? AND b > ?")
+        self.assertEqual(_to_qmark("SELECT a %% 2 FROM t"),
+                         "SELECT a % 2 FROM t")
+
+    def test_string_literals_are_skipped(self):
+        """Test a %s inside a quoted literal is left as text"""
+        self.assertEqual(_to_qmark("SELECT '%s', \"%s\" WHERE a = %s"),
+                         "SELECT '%s', \"%s\" WHERE a = ?")
+        self.assertEqual(_to_qmark("WHERE name LIKE '50%%' AND id = %s"),
+                         "WHERE name LIKE '50%' AND id = ?")
+
+    def test_escaped_quotes(self):
+        """Test a doubled quote does not end the literal"""
+        self.assertEqual(_to_qmark("SELECT 'it''s %s' WHERE a = %s"),
+                         "SELECT 'it''s %s' WHERE a = ?")
+
+    def test_runs_on_sqlite(self):
+        """Test the rewritten statement binds only the real placeholders"""
+        connection = SQLiteConnection(":memory:")
+        cursor = connection.cursor(prepared=True)
+        cursor.execute("SELECT '%s', %s", (7,))
+        self.assertEqual(cursor.fetchone(), ("%s", 7))
+        connection.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Unit tests for the connection_pool module"""
+
+import unittest
+from connection_pool import ConnectionPool
+
+
+class FakeConnection:
+    """A stand-in connection that records how it was given back"""
+
+    def __init__(self):
+        self.rollbacks = 0
+        self.closed = False
+
+    def is_connected(self):
+        return not self.closed
+
+    def rollback(self):
+        # mysql.connector reads every unread row here before rolling back
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+class TestConnectionPool(unittest.TestCase):
+    """Test case for how ConnectionPool.connection gives connections back"""
+
+    def setUp(self):
+        """Create a pool of fake connections"""
+        self.opened = []
+
+        def factory():
+            connection = FakeConnection()
+            self.opened.append(connection)
+            return connection
+
+        self.pool = ConnectionPool(factory, max_size=2)
+
+    def test_normal_exit_resets_and_keeps(self):
+        """Test a connection returned normally is rolled back and reused"""
+        with self.pool.connection() as connection:
+            pass
+        self.assertEqual(connection.rollbacks, 1)
+        self.assertFalse(connection.closed)
+        with self.pool.connection() as again:
+            self.assertIs(again, connection)
+
+    def test_error_discards(self):
+        """Test a connection is closed, not reused, after an error"""
+        with self.assertRaises(ValueError):
+            with self.pool.connection() as connection:
+                raise ValueError("boom")
+        self.assertTrue(connection.closed)
+        self.assertEqual(self.pool.stats()["size"], 0)
+
+    def test_generator_closed_early_discards_without_rollback(self):
+        """Test closing a generator early closes its connection unreset"""
+        def stream():
+            with self.pool.connection() as connection:
+                while True:
+                    yield connection
+
+        rows = stream()
+        connection = next(rows)
+        rows.close()
+        self.assertEqual(connection.rollbacks, 0)
+        self.assertTrue(connection.closed)
+        self.assertEqual(self.pool.stats()["idle"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Unit tests for stream_users in 0-stream_users.py"""
+
+import os
+import tempfile
+import unittest
+
+# seed picks its backend on import; use SQLite so no MySQL driver is needed.
+# The connections themselves are fakes installed in seed's pool below.
+os.environ.setdefault("DB_BACKEND", "sqlite")
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.gettempdir(),
+                                              "test_stream_users.db"))
+
+import seed  # noqa: E402
+from connection_pool import ConnectionPool  # noqa: E402
+
+stream_users = __import__('0-stream_users').stream_users
+
+ROWS = 1000
+
+
+class FakeCursor:
+    """An unbuffered cursor over ROWS users; counts the rows it reads"""
+
+    column_names = ("user_id", "name", "email", "age")
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.closed = False
+
+    def execute(self, query, params=None):
+        self.position = 0
+
+    def fetchmany(self, size):
+        start = self.position
+        self.position = min(ROWS, start + size)
+        self.connection.rows_read += self.position - start
+        return [{"user_id": str(i), "name": f"user{i}",
+                 "email": f"user{i}@example.com", "age": i % 90}
+                for i in range(start, self.position)]
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnection:
+    """A connection whose rollback() drains the unread rows like mysql.connector"""
+
+    def __init__(self):
+        self.rows_read = 0
+        self.rollbacks = 0
+        self.closed = False
+        self.cursors = []
+
+    def cursor(self, dictionary=False, buffered=False):
+        cursor = FakeCursor(self)
+        self.cursors.append(cursor)
+        return cursor
+
+    def is_connected(self):
+        return not self.closed
+
+    def rollback(self):
+        self.rollbacks += 1
+        for cursor in self.cursors:
+            self.rows_read += ROWS - cursor.position
+            cursor.position = ROWS
+
+    def close(self):
+        self.closed = True
+
+
+class TestStreamUsers(unittest.TestCase):
+    """Test case for stream_users and the pooled connection it borrows"""
+
+    def setUp(self):
+        """Install a pool of fake connections in seed"""
+        self.opened = []
+
+        def factory():
+            connection = FakeConnection()
+            self.opened.append(connection)
+            return connection
+
+        self.saved_pool = seed._pool, seed._pool_pid
+        seed._pool = ConnectionPool(factory, max_size=1)
+        seed._pool_pid = os.getpid()
+
+    def tearDown(self):
+        """Put seed's own pool back"""
+        seed._pool, seed._pool_pid = self.saved_pool
+
+    def test_streams_every_row(self):
+        """Test a full stream yields every row and closes its cursor"""
+        users = list(stream_users(read_ahead=64))
+        self.assertEqual(len(users), ROWS)
+        connection, = self.opened
+        self.assertTrue(connection.cursors[0].closed)
+        self.assertFalse(connection.closed)
+        self.assertEqual(seed.get_pool().stats()["idle"], 1)
+
+    def test_stopping_early_discards_without_draining(self):
+        """Test a stream stopped after a few rows drops its connection"""
+        users = stream_users(read_ahead=10)
+        for _ in range(5):
+            next(users)
+        users.close()
+        connection, = self.opened
+        self.assertEqual(connection.rollbacks, 0)
+        self.assertEqual(connection.rows_read, 10)
+        self.assertTrue(connection.closed)
+        self.assertEqual(seed.get_pool().stats()["idle"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
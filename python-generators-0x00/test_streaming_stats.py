@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""Unit tests for the streaming_stats module"""
+
+import bisect
+import random
+import statistics
+import unittest
+from streaming_stats import Histogram, KLLSketch, RunningStats, summarize
+
+FRACTIONS = (0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99)
+
+
+def sample(count, seed):
+    """Reproducible, skewed test data"""
+    rng = random.Random(seed)
+    return [rng.lognormvariate(3, 0.8) for _ in range(count)]
+
+
+def shards(values, sizes):
+    """Splits values into consecutive pieces of the given sizes"""
+    pieces, start = [], 0
+    for size in sizes:
+        pieces.append(values[start:start + size])
+        start += size
+    pieces.append(values[start:])
+    return pieces
+
+
+def rank_error(sorted_values, estimate, fraction):
+    """How far, as a fraction of n, estimate's rank is from fraction * n"""
+    n = len(sorted_values)
+    low = bisect.bisect_left(sorted_values, estimate)
+    high = bisect.bisect_right(sorted_values, estimate)
+    return max(0, low - fraction * n, fraction * n - high) / n
+
+
+class TestRunningStats(unittest.TestCase):
+    """Test case for RunningStats (Welford and Chan's merge)"""
+
+    def assert_matches(self, stats, values):
+        """Compare stats against the statistics module"""
+        self.assertEqual(stats.count, len(values))
+        self.assertAlmostEqual(stats.mean, statistics.mean(values), places=9)
+        self.assertAlmostEqual(stats.variance, statistics.pvariance(values),
+                               places=6)
+        self.assertAlmostEqual(stats.sample_variance,
+                               statistics.variance(values), places=6)
+        self.assertEqual(stats.min, min(values))
+        self.assertEqual(stats.max, max(values))
+
+    def test_unmerged(self):
+        """Test a single pass matches mean and pvariance"""
+        values = sample(10000, 1)
+        stats = RunningStats()
+        for value in values:
+            stats.add(value)
+        self.assert_matches(stats, values)
+
+    def test_merged(self):
+        """Test merging uneven shards, including an empty one, matches"""
+        values = sample(10000, 2)
+        merged = RunningStats()
+        for piece in shards(values, (1, 3000, 0, 4999)):
+            stats = RunningStats()
+            for value in piece:
+                stats.add(value)
+            merged.merge(stats)
+        self.assert_matches(merged, values)
+
+    def test_large_offset(self):
+        """Test the variance stays accurate far from zero"""
+        values = [1e9 + value for value in sample(5000, 3)]
+        stats = RunningStats()
+        for value in values:
+            stats.add(value)
+        self.assertAlmostEqual(stats.variance, statistics.pvariance(values),
+                               delta=1e-6 * statistics.pvariance(values))
+
+
+class TestKLLSketch(unittest.TestCase):
+    """Test case for KLLSketch quantiles within the rank error bound"""
+
+    K = 200
+    BOUND = 1.7 / K
+
+    def assert_within_bound(self, sketch, values):
+        """Every reported quantile is within BOUND in rank"""
+        exact = sorted(values)
+        self.assertEqual(sketch.count, len(values))
+        for fraction, estimate in sketch.quantiles(FRACTIONS).items():
+            self.assertLessEqual(rank_error(exact, estimate, fraction),
+                                 self.BOUND, f"quantile {fraction}")
+
+    def test_unmerged(self):
+        """Test a single sketch's quantiles are within the bound"""
+        for seed in range(5):
+            values = sample(20000, seed)
+            sketch = KLLSketch(self.K, seed=seed)
+            for value in values:
+                sketch.add(value)
+            self.assert_within_bound(sketch, values)
+
+    def test_merged(self):
+        """Test merged sketches' quantiles are within the bound"""
+        for seed in range(5):
+            values = sample(20000, seed)
+            merged = KLLSketch(self.K, seed=seed)
+            for index, piece in enumerate(shards(values, (7000, 500, 9000))):
+                sketch = KLLSketch(self.K, seed=seed * 10 + index)
+                for value in piece:
+                    sketch.add(value)
+                merged.merge(sketch)
+            self.assert_within_bound(merged, values)
+
+    def test_small_stream_is_exact(self):
+        """Test a stream smaller than the sketch gives exact quantiles"""
+        sketch = KLLSketch(self.K)
+        for value in range(1, 101):
+            sketch.add(value)
+        self.assertEqual(sketch.quantile(0.5), 50)
+        self.assertEqual(sketch.quantile(1.0), 100)
+
+    def test_memory_is_bounded(self):
+        """Test the sketch keeps far fewer values than it has seen"""
+        sketch = KLLSketch(self.K, seed=0)
+        for value in range(100000):
+            sketch.add(value)
+        self.assertLess(sum(map(len, sketch._levels)), 3 * self.K + 100)
+
+    def test_empty(self):
+        """Test an empty sketch reports None"""
+        self.assertIsNone(KLLSketch().quantile(0.5))
+
+
+class TestHistogram(unittest.TestCase):
+    """Test case for the mergeable Histogram"""
+
+    def test_merged_equals_unmerged(self):
+        """Test merged shard histograms equal one histogram of everything"""
+        values = sample(5000, 4)
+        whole = Histogram(bucket_width=5)
+        for value in values:
+            whole.add(value)
+        merged = Histogram(bucket_width=5)
+        for piece in shards(values, (2000, 1000)):
+            part = Histogram(bucket_width=5)
+            for value in piece:
+                part.add(value)
+            merged.merge(part)
+        self.assertEqual(merged.buckets(), whole.buckets())
+        self.assertEqual(sum(whole.counts.values()), len(values))
+
+    def test_bucket_edges(self):
+        """Test values land in the bucket that starts at or below them"""
+        histogram = Histogram(bucket_width=10)
+        for value in (0, 9.99, 10, -0.5):
+            histogram.add(value)
+        self.assertEqual(histogram.buckets(), {-10: 1, 0: 2, 10: 1})
+
+    def test_width_mismatch(self):
+        """Test merging different bucket widths is refused"""
+        with self.assertRaises(ValueError):
+            Histogram(10).merge(Histogram(5))
+
+
+class TestSummarize(unittest.TestCase):
+    """Test case for summarize over a generator"""
+
+    def test_generator(self):
+        """Test a generator is summarised in one pass"""
+        values = sample(3000, 5)
+        result = summarize(value for value in values)
+        self.assertEqual(result["count"], 3000)
+        self.assertAlmostEqual(result["mean"], statistics.mean(values))
+        self.assertEqual(sum(result["histogram"].values()), 3000)
+
+
+if __name__ == "__main__":
+    unittest.main()